@@ -5,11 +5,14 @@ __copyright__ = "Copyright (C) 2014 Ivan D Vasin"
 __docformat__ = "restructuredtext"
 
 from binascii import hexlify as _bytes2hexstr, unhexlify as _hexstr2bytes
-from datetime import timedelta as _timedelta
+from datetime import date as _date, datetime as _datetime, time as _time, \
+                     timedelta as _timedelta
+from decimal import Decimal as _Decimal
+import importlib as _importlib
+from types import ModuleType as _ModuleType
 from urllib import quote as _pct_encoded
 
 import rdflib as _rdf
-import spruce.datetime as _sdt
 import sqlalchemy as _sqla
 
 
@@ -22,7 +25,97 @@ def canon_rdf_datatype_from_sql(sql_type):
 
 
 def iri_safe(string):
-    return _pct_encoded(unicode(string).encode('utf8'))
+    # "/" is encoded too, since it separates a row node's table from its key
+    return _pct_encoded(unicode(string).encode('utf8'), safe='')
+
+
+def lazy_import(name):
+
+    """A module that is imported when its attributes are first accessed
+
+    This defers the cost of importing heavy modules, such as
+    :mod:`sqlalchemy.orm`, from the import of this package to the first use
+    of the module.
+
+    :param str name:
+        The absolute name of the module.
+
+    :rtype: :class:`types.ModuleType`
+
+    """
+
+    return _LazyModule(name)
+
+
+def load_dialect_sql_types(dialect_name):
+
+    """Register the conversions of a database dialect's own SQL types
+
+    The Oracle and PostgreSQL dialects define ``INTERVAL`` types that are
+    converted to and from RDF durations.  Their conversions are registered
+    when a store is opened on such a database or when a conversion of one
+    of their types is first requested, so that importing this package does
+    not load the dialects.  Loading a dialect that has no such types, or
+    that was loaded already, does nothing.
+
+    :param str dialect_name:
+        The name of a SQLAlchemy dialect, such as ``'postgresql'``.
+
+    """
+
+    if dialect_name in _LOADED_DIALECTS:
+        return
+    _LOADED_DIALECTS.add(dialect_name)
+
+    if dialect_name not in _INTERVAL_TYPE_DIALECTS:
+        return
+    try:
+        _sqla.dialects.registry.load(dialect_name)
+    except _sqla.exc.NoSuchModuleError:
+        return
+    interval_type = getattr(_sqla.dialects, dialect_name).INTERVAL
+
+    _RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE[interval_type] = \
+        _rdf_duration_from_timedelta
+    _RDF_LITERAL_SQL_TYPES.add(interval_type)
+    for rdf_datatype in (_rdf.XSD.dayTimeDuration, _rdf.XSD.duration,
+                         _rdf.XSD.yearMonthDuration):
+        _SQL_LITERAL_TYPES_BY_RDF_DATATYPE[rdf_datatype].append(interval_type)
+        _RDF_DATATYPES_BY_SQL_TYPE.setdefault(interval_type, [])\
+         .append(rdf_datatype)
+
+
+def ntriples_literal(literal):
+
+    """The N-Triples representation of an RDF literal
+
+    Characters outside ASCII are not escaped.
+
+    """
+
+    quoted = u'"{}"'.format(_ntriples_escaped(literal))
+    if literal.language:
+        return u'{}@{}'.format(quoted, literal.language)
+    elif literal.datatype:
+        return u'{}^^<{}>'.format(quoted, literal.datatype)
+    else:
+        return quoted
+
+
+def ntriples_literal_from_sql_func(sql_type):
+
+    """A function that formats SQL values as N-Triples literals
+
+    The function is equivalent to formatting the results of
+    :func:`rdf_literal_from_sql` with :func:`ntriples_literal`, but for
+    most types it does not construct the RDF literals.
+
+    """
+
+    if not isinstance(sql_type, type):
+        sql_type = sql_type.__class__
+
+    return _ntriples_literal_from_sql_func(sql_type)
 
 
 def rdf_datatypes_from_sql(sql_type):
@@ -33,6 +126,22 @@ def rdf_datatypes_from_sql(sql_type):
     return tuple(_rdf_datatypes_from_sql(sql_type))
 
 
+def rdf_lexical_from_sql_func(sql_type):
+
+    """A function that maps SQL values to RDF lexical forms
+
+    The function is equivalent to converting the results of
+    :func:`rdf_literal_from_sql` to strings, but for most types it does not
+    construct the RDF literals.
+
+    """
+
+    if not isinstance(sql_type, type):
+        sql_type = sql_type.__class__
+
+    return _rdf_lexical_from_sql_func(sql_type)
+
+
 def rdf_literal_from_sql(literal, sql_type):
 
     if not isinstance(sql_type, type):
@@ -41,6 +150,14 @@ def rdf_literal_from_sql(literal, sql_type):
     return _rdf_literal_from_sql_func(sql_type)(literal)
 
 
+def rdf_literal_from_sql_func(sql_type):
+
+    if not isinstance(sql_type, type):
+        sql_type = sql_type.__class__
+
+    return _rdf_literal_from_sql_func(sql_type)
+
+
 def sql_literal_from_rdf(literal):
     try:
         sql_literal_from_rdf_ = \
@@ -76,19 +193,108 @@ def _canon_rdf_datatype_from_sql(sql_type):
         return datatype
 
 
+def _is_plain_rdf_literal_sql_type(sql_type):
+    # whether the type's values are converted by passing them to
+    # :class:`rdflib.Literal`, whose lexical form and datatype depend only on
+    # the type of the value
+    for class_ in sql_type.__mro__:
+        if class_ in _PLAIN_RDF_LITERAL_SQL_TYPES:
+            return True
+        elif class_ in _RDF_LITERAL_SQL_TYPES:
+            return False
+    return False
+
+
+def _load_sql_type_dialect(sql_type):
+
+    # loads the conversions of the dialect that defines a type, if they were
+    # not loaded yet; returns whether they were
+    module_path = sql_type.__module__.split('.')
+    if module_path[:2] != ['sqlalchemy', 'dialects'] or len(module_path) < 3 \
+           or module_path[2] in _LOADED_DIALECTS:
+        return False
+    load_dialect_sql_types(module_path[2])
+    return True
+
+
+def _ntriples_escaped(string):
+    return string.replace(u'\\', u'\\\\')\
+                 .replace(u'\n', u'\\n')\
+                 .replace(u'"', u'\\"')\
+                 .replace(u'\r', u'\\r')
+
+
+def _ntriples_literal_from_sql_func(sql_type):
+
+    try:
+        return _NTRIPLES_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE[sql_type]
+    except KeyError:
+        pass
+
+    if _is_plain_rdf_literal_sql_type(sql_type):
+        def ntriples_literal_from_sql(literal):
+            try:
+                lexical_func, escaped, suffix = \
+                    _NTRIPLES_LITERAL_PARTS_BY_PY_TYPE[type(literal)]
+            except KeyError:
+                return ntriples_literal(_rdf.Literal(literal))
+            lexical = lexical_func(literal)
+            if escaped:
+                lexical = _ntriples_escaped(lexical)
+            return u'"' + lexical + suffix
+    else:
+        rdf_literal_from_sql = _rdf_literal_from_sql_func(sql_type)
+
+        def ntriples_literal_from_sql(literal):
+            return ntriples_literal(rdf_literal_from_sql(literal))
+
+    _NTRIPLES_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE[sql_type] = \
+        ntriples_literal_from_sql
+    return ntriples_literal_from_sql
+
+
 def _rdf_datatypes_from_sql(sql_type):
     try:
         return _RDF_DATATYPES_BY_SQL_TYPE[sql_type]
     except KeyError:
+        if _load_sql_type_dialect(sql_type):
+            return _rdf_datatypes_from_sql(sql_type)
         datatype = _rdf_datatypes_from_sql(sql_type.__mro__[1])
         _RDF_DATATYPES_BY_SQL_TYPE[sql_type] = datatype
         return datatype
 
 
+def _rdf_lexical_from_sql_func(sql_type):
+
+    try:
+        return _RDF_LEXICAL_FROM_SQL_FUNC_BY_SQL_TYPE[sql_type]
+    except KeyError:
+        pass
+
+    if _is_plain_rdf_literal_sql_type(sql_type):
+        def rdf_lexical_from_sql(literal):
+            try:
+                lexical_func = \
+                    _RDF_LEXICAL_FUNC_AND_DATATYPE_BY_PY_TYPE[type(literal)][0]
+            except KeyError:
+                return unicode(_rdf.Literal(literal))
+            return lexical_func(literal)
+    else:
+        rdf_literal_from_sql = _rdf_literal_from_sql_func(sql_type)
+
+        def rdf_lexical_from_sql(literal):
+            return unicode(rdf_literal_from_sql(literal))
+
+    _RDF_LEXICAL_FROM_SQL_FUNC_BY_SQL_TYPE[sql_type] = rdf_lexical_from_sql
+    return rdf_lexical_from_sql
+
+
 def _rdf_literal_from_sql_func(sql_type):
     try:
         return _RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE[sql_type]
     except KeyError:
+        if _load_sql_type_dialect(sql_type):
+            return _rdf_literal_from_sql_func(sql_type)
         rdf_literal_from_sql = \
             _rdf_literal_from_sql_func(sql_type.__mro__[1])
         _RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE[sql_type] = \
@@ -167,21 +373,41 @@ _RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE = \
          lambda literal: _rdf.Literal(unicode(literal)),
      }
 
-try:
-    _sqla.dialects.registry.load('oracle')
-except _sqla.exc.NoSuchModuleError:
-    pass
-else:
-    _RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE\
-     [_sqla.dialects.oracle.INTERVAL] = _rdf_duration_from_timedelta
+_RDF_LITERAL_SQL_TYPES = set(_RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE)
+
+# the types among :data:`_RDF_LITERAL_SQL_TYPES` whose values are converted by
+# :class:`rdflib.Literal` alone
+_PLAIN_RDF_LITERAL_SQL_TYPES = \
+    frozenset((_sqla.Boolean, _sqla.Date, _sqla.DateTime, _sqla.Float,
+               _sqla.Integer, _sqla.Numeric, _sqla.String, _sqla.Time))
+
+# the lexical forms and datatypes that :class:`rdflib.Literal` gives to values
+# of these Python types
+_RDF_LEXICAL_FUNC_AND_DATATYPE_BY_PY_TYPE = \
+    {bool: (lambda literal: u'true' if literal else u'false',
+            _rdf.XSD.boolean),
+     _date: (lambda literal: unicode(literal.isoformat()), _rdf.XSD.date),
+     _datetime: (lambda literal: unicode(literal.isoformat()),
+                 _rdf.XSD.dateTime),
+     _Decimal: (unicode, _rdf.XSD.decimal),
+     float: (unicode, _rdf.XSD.double),
+     int: (unicode, _rdf.XSD.integer),
+     long: (unicode, _rdf.XSD.integer),
+     str: (lambda literal: literal.decode('utf8'), None),
+     _time: (lambda literal: unicode(literal.isoformat()), _rdf.XSD.time),
+     unicode: (lambda literal: literal, None),
+     }
 
-try:
-    _sqla.dialects.registry.load('postgresql')
-except _sqla.exc.NoSuchModuleError:
-    pass
-else:
-    _RDF_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE\
-     [_sqla.dialects.postgresql.INTERVAL] = _rdf_duration_from_timedelta
+_RDF_LEXICAL_FROM_SQL_FUNC_BY_SQL_TYPE = {}
+
+_NTRIPLES_LITERAL_PARTS_BY_PY_TYPE = \
+    {py_type: (lexical_func,
+               datatype is None,
+               u'"^^<{}>'.format(datatype) if datatype is not None else u'"')
+     for py_type, (lexical_func, datatype)
+     in _RDF_LEXICAL_FUNC_AND_DATATYPE_BY_PY_TYPE.items()}
+
+_NTRIPLES_LITERAL_FROM_SQL_FUNC_BY_SQL_TYPE = {}
 
 
 _SQL_LITERAL_TYPES_BY_RDF_DATATYPE = \
@@ -190,7 +416,8 @@ _SQL_LITERAL_TYPES_BY_RDF_DATATYPE = \
      _rdf.XSD.date: [_sqla.Date],
      _rdf.XSD.dateTime: [_sqla.DateTime],
      _rdf.XSD.dayTimeDuration: [_sqla.Interval],
-     _rdf.XSD.decimal: [_sqla.Numeric],
+     _rdf.XSD.decimal: [_sqla.Numeric, _sqla.Float],
+     _rdf.XSD.double: [_sqla.Float],
      _rdf.XSD.duration: [_sqla.Interval],
      _rdf.XSD.hexBinary: [_sqla.sql.sqltypes._Binary],
      _rdf.XSD.integer: [_sqla.Integer],
@@ -199,28 +426,6 @@ _SQL_LITERAL_TYPES_BY_RDF_DATATYPE = \
      _rdf.XSD.yearMonthDuration: [_sqla.Interval],
      }
 
-try:
-    _sqla.dialects.registry.load('oracle')
-except _sqla.exc.NoSuchModuleError:
-    pass
-else:
-    for rdf_datatype in (_rdf.XSD.dayTimeDuration, _rdf.XSD.duration,
-                         _rdf.XSD.yearMonthDuration):
-        _SQL_LITERAL_TYPES_BY_RDF_DATATYPE[rdf_datatype]\
-         .append(_sqla.dialects.oracle.INTERVAL)
-    del rdf_datatype
-
-try:
-    _sqla.dialects.registry.load('postgresql')
-except _sqla.exc.NoSuchModuleError:
-    pass
-else:
-    for rdf_datatype in (_rdf.XSD.dayTimeDuration, _rdf.XSD.duration,
-                         _rdf.XSD.yearMonthDuration):
-        _SQL_LITERAL_TYPES_BY_RDF_DATATYPE[rdf_datatype]\
-         .append(_sqla.dialects.postgresql.INTERVAL)
-    del rdf_datatype
-
 
 _RDF_DATATYPES_BY_SQL_TYPE = {}
 for rdf_datatype, sql_types in _SQL_LITERAL_TYPES_BY_RDF_DATATYPE.items():
@@ -267,18 +472,25 @@ _SQL_LITERAL_FROM_RDF_FUNC_BY_RDF_DATATYPE = \
      _rdf.XSD.time: lambda literal: literal.toPython(),
      }
 
-try:
-    _sqla.dialects.registry.load('oracle')
-except _sqla.exc.NoSuchModuleError:
-    pass
-else:
-    _SQL_LITERAL_FROM_RDF_FUNC_BY_RDF_DATATYPE[_sqla.dialects.oracle.INTERVAL] = \
-        _timedelta_from_rdf_duration
-
-try:
-    _sqla.dialects.registry.load('postgresql')
-except _sqla.exc.NoSuchModuleError:
-    pass
-else:
-    _SQL_LITERAL_FROM_RDF_FUNC_BY_RDF_DATATYPE\
-     [_sqla.dialects.postgresql.INTERVAL] = _timedelta_from_rdf_duration
+# the dialects whose ``INTERVAL`` types are registered by
+# :func:`load_dialect_sql_types`
+_INTERVAL_TYPE_DIALECTS = frozenset(('oracle', 'postgresql'))
+
+_LOADED_DIALECTS = set()
+
+
+class _LazyModule(_ModuleType):
+
+    """A module that is imported on the first access to its attributes
+
+    .. seealso:: :func:`lazy_import`
+
+    """
+
+    def __getattr__(self, name):
+        module = _importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+_sdt = lazy_import('spruce.datetime')
@@ -59,16 +59,7 @@ def orm_automap_base(name='Base', base_iri=None, mapper=None,
         pseudo_pkey_tables_names = set()
         for table in cls.metadata.tables.values():
             if not table.primary_key:
-                if table.indexes:
-                    pseudo_pkey_index = \
-                        min((index for index in table.indexes if index.unique),
-                            key=(lambda index: len(index.columns)))
-                    pseudo_pkey_cols = pseudo_pkey_index.columns
-                else:
-                    pseudo_pkey_cols = table.columns
-
-                table.primary_key = \
-                    PseudoPrimaryKeyConstraint(*pseudo_pkey_cols)
+                _set_pseudo_primary_key(table)
                 pseudo_pkey_tables_names.add(table.key)
 
         prepare_base(engine=engine, reflect=False, **kwargs)
@@ -93,6 +84,85 @@ def orm_declarative_base(name='OrmBase', base_iri=None, mapper=None,
     return DeclarativeBase
 
 
+def orm_map_tables(base, tables, classes_by_table,
+                   use_pseudo_primary_keys=True):
+
+    """Map tables onto new classes of a declarative base.
+
+    The tables are mapped as by the ``prepare()`` of
+    :func:`orm_automap_base`, but incrementally: this can be called again
+    as more tables are reflected, and the tables in *classes_by_table* are
+    not mapped again.  Each foreign key gets a many-to-one relationship to
+    the referenced table's class, named after that class unless the name is
+    taken, but no one-to-many backreference.  The association tables of
+    many-to-many relationships are not mapped.
+
+    :param base:
+        A declarative base, such as one made by :func:`orm_declarative_base`.
+    :type base: :obj:`type`
+
+    :param tables:
+        The tables.  The tables referenced by their foreign keys must also
+        be given or be mapped already.
+    :type tables: ~[:class:`sqlalchemy.Table`]
+
+    :param classes_by_table:
+        The classes of the tables that are mapped already.  The new classes
+        are added to it.
+    :type classes_by_table: {:class:`sqlalchemy.Table`: :obj:`type`}
+
+    :param bool use_pseudo_primary_keys:
+        Whether tables without primary keys are mapped with pseudo primary
+        keys, as by :func:`orm_automap_base`, instead of being skipped.
+
+    :return:
+        The new classes.
+    :rtype: [:obj:`type`]
+
+    """
+
+    classes = []
+    for table in tables:
+        if table in classes_by_table \
+               or _sqla_automap._is_many_to_many(base, table)[0] is not None:
+            continue
+
+        if not table.primary_key:
+            if not use_pseudo_primary_keys:
+                continue
+            _set_pseudo_primary_key(table)
+
+        class_ = type(str(table.name), (base,), {'__table__': table})
+        class_.__mapper__.has_pseudo_primary_key = \
+            isinstance(table.primary_key, PseudoPrimaryKeyConstraint)
+        classes_by_table[table] = class_
+        classes.append(class_)
+
+    for class_ in classes:
+        rels_names = set()
+        for constraint in class_.__table__.constraints:
+            if not isinstance(constraint, _sqla.ForeignKeyConstraint):
+                continue
+
+            fkeys = constraint.elements
+            referred_class = classes_by_table.get(fkeys[0].column.table)
+            if referred_class is None:
+                continue
+
+            rel_name = referred_class.__name__.lower()
+            if rel_name in rels_names:
+                continue
+            setattr(class_, rel_name,
+                    _sqla_orm.relationship(referred_class,
+                                           foreign_keys=[fkey.parent
+                                                         for fkey in fkeys],
+                                           remote_side=[fkey.column
+                                                        for fkey in fkeys]))
+            rels_names.add(rel_name)
+
+    return classes
+
+
 class OrmDeclarativeMetaMixin(type):
     def __new__(cls, name, bases, attrs):
 
@@ -228,8 +298,32 @@ class OrmRdfMapper(object):
 
 
 class PseudoPrimaryKeyConstraint(_sqla.PrimaryKeyConstraint):
-    pass
+
+    """A primary key constraint that stands in for a missing primary key
+
+    Like any primary key constraint, this marks its columns as not nullable.
+    The names of the columns that were nullable beforehand are kept in
+    :attr:`nullable_columns_names`.
+
+    """
+
+    def __init__(self, *columns, **kwargs):
+        self.nullable_columns_names = \
+            frozenset(col.name for col in columns
+                      if isinstance(col, _sqla.Column) and col.nullable)
+        super(PseudoPrimaryKeyConstraint, self).__init__(*columns, **kwargs)
 
 
 def _orm_object_str(self):
     return u'<{}>'.format(self.rdf_id)
+
+
+def _set_pseudo_primary_key(table):
+    if table.indexes:
+        pseudo_pkey_index = \
+            min((index for index in table.indexes if index.unique),
+                key=(lambda index: len(index.columns)))
+        pseudo_pkey_cols = pseudo_pkey_index.columns
+    else:
+        pseudo_pkey_cols = table.columns
+    table.primary_key = PseudoPrimaryKeyConstraint(*pseudo_pkey_cols)
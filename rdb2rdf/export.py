@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Bulk export
+
+.. _N-Triples: http://www.w3.org/TR/n-triples/
+
+"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import io as _io
+import multiprocessing as _mp
+
+# registers the '_rdflib_nt_escape' codec error handler
+import rdflib.plugins.serializers.nt as _rdf_nt_serializer
+import sqlalchemy as _sqla
+
+from . import stores as _stores
+
+
+def export_ntriples(store, file_, tables_iris=None, sql_rendering=False):
+
+    """Export a store's triples as `N-Triples`_.
+
+    The statements are formatted directly from the rows' values (see
+    :meth:`rdb2rdf.stores.DirectMapping.table_ntriples`) and streamed to
+    *file_* table by table.  The output is the same as that of
+    :mod:`rdflib`'s N-Triples serializer.
+
+    :param store:
+        An open store.
+    :type store: :class:`~rdb2rdf.stores.DirectMapping`
+
+    :param file_:
+        A binary file-like object.
+    :type file_: :class:`file`
+
+    :param tables_iris:
+        The IRIs of the tables to export.  The default is all of the store's
+        mapped tables.
+    :type tables_iris: ~[:class:`rdflib.URIRef`] or null
+
+    :param bool sql_rendering:
+        Whether the database concatenates the statements as far as it can
+        format their terms.  See
+        :meth:`~rdb2rdf.stores.DirectMapping.table_ntriples`.
+
+    :return:
+        The number of triples written.
+    :rtype: :obj:`int`
+
+    """
+
+    if tables_iris is None:
+        tables_iris = store.orm_classes.keys()
+
+    ntriples = 0
+    for table_iri in tables_iris:
+        ntriples += \
+            _write_ntriples(file_,
+                            store.table_ntriples(table_iri,
+                                                 sql_rendering=sql_rendering))
+    return ntriples
+
+
+def export_table_partitions(configuration, table_iri, paths, id=None,
+                            base_iri=None, processes=None,
+                            stream_batch_size=1000):
+
+    """Export a table as `N-Triples`_ in parallel partitions.
+
+    The table's rows are split into as many ranges of keys as there are
+    *paths* (see :meth:`rdb2rdf.stores.DirectMapping.table_key_ranges`).
+    Each range is exported by a separate process, with its own
+    :class:`~rdb2rdf.stores.DirectMapping` and database connection, to the
+    corresponding path.  Concatenating the written files in order yields
+    the export of the whole table.
+
+    :param configuration:
+        The database.  See the *configuration* parameter of
+        :class:`~rdb2rdf.stores.DirectMapping`.  A connectable is passed to
+        the worker processes as its URL only, from which each worker creates
+        an engine with the default options: its ``connect_args``,
+        ``poolclass``, ``execution_options``, and other options of
+        :func:`sqlalchemy.create_engine` are not carried over.  To give the
+        workers such options, pass the positional and keyword arguments of
+        :func:`~sqlalchemy.create_engine` instead, from which every engine
+        is created.
+    :type configuration:
+        :class:`sqlalchemy.engine.interfaces.Connectable`
+        or (~[object], ~{:obj:`str`: :obj:`object`})
+
+    :param table_iri:
+        The IRI of the table.
+    :type table_iri: :class:`rdflib.URIRef`
+
+    :param paths:
+        The paths of the files to write, one per partition.  Trailing paths
+        are written empty if the table has fewer distinct keys than paths.
+    :type paths: ~[:obj:`str`]
+
+    :param id:
+        The IRI of the store.
+    :type id: ~~\ :class:`spruce.uri.duck.Uri` or null
+
+    :param base_iri:
+        The base IRI of the store's resources.
+    :type base_iri: ~~\ :class:`spruce.uri.duck.Uri` or null
+
+    :param processes:
+        The number of worker processes.  The default is the number of
+        *paths*.
+    :type processes: :obj:`int` or null
+
+    :param int stream_batch_size:
+        The number of rows fetched per batch by each worker.
+
+    :return:
+        The number of triples written to each path.
+    :rtype: [:obj:`int`]
+
+    """
+
+    paths = list(paths)
+    if not paths:
+        raise ValueError('invalid paths {!r}: expecting at least one path'
+                          .format(paths))
+
+    if isinstance(configuration, _sqla.engine.interfaces.Connectable):
+        configuration = ((str(configuration.engine.url),), {})
+
+    store_kwargs = {'id': id, 'base_iri': base_iri}
+    store = _stores.DirectMapping(**store_kwargs)
+    store.open(configuration)
+    try:
+        key_ranges = store.table_key_ranges(table_iri, len(paths))
+    finally:
+        store.close()
+    key_ranges += [()] * (len(paths) - len(key_ranges))
+
+    pool = _mp.Pool(processes or len(paths))
+    try:
+        return pool.map(_export_table_partition,
+                        [(configuration, store_kwargs, stream_batch_size,
+                          table_iri, key_range, path)
+                         for key_range, path in zip(key_ranges, paths)],
+                        chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _export_table_partition((configuration, store_kwargs, stream_batch_size,
+                             table_iri, key_range, path)):
+
+    ntriples = 0
+
+    with _io.open(path, 'wb') as file_:
+        if not key_range:
+            return ntriples
+
+        store = _stores.DirectMapping(**store_kwargs)
+        store.open(configuration, stream_results=True,
+                   stream_batch_size=stream_batch_size)
+        try:
+            ntriples = \
+                _write_ntriples(file_,
+                                store.table_ntriples(table_iri,
+                                                     key_range=key_range))
+        finally:
+            store.close()
+
+    return ntriples
+
+
+def _write_ntriples(file_, texts):
+    ntriples = 0
+    for text in texts:
+        file_.write(text.encode('ascii', '_rdflib_nt_escape'))
+        ntriples += text.count(u'\n')
+    return ntriples
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""Bulk loading
+
+.. _N-Triples: http://www.w3.org/TR/n-triples/
+
+"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import binascii as _binascii
+import cPickle as _pickle
+import datetime as _datetime
+from itertools import islice as _islice
+import os as _os
+import re as _re
+import shutil as _shutil
+import tempfile as _tempfile
+
+import rdflib as _rdf
+import sqlalchemy as _sqla
+from sqlalchemy.schema import \
+    sort_tables_and_constraints as _sort_tables_and_constraints
+
+
+def load_ntriples(store, file_, batch_size=10000, spool_dir=None):
+
+    """Load `N-Triples`_ into a store's empty tables.
+
+    This is the inverse of :func:`rdb2rdf.export.export_ntriples`.  The
+    statements are parsed line by line, and each run of consecutive
+    statements about a subject is mapped onto the values of its row by
+    :meth:`rdb2rdf.stores.DirectMapping.row_values`.  The rows are buffered
+    per table and spooled to temporary files every *batch_size* rows, so
+    the memory used does not grow with the input.
+
+    Once the input is read, the tables are loaded in the order of their
+    foreign keys, in one transaction on a connection of their own, with
+    the fastest path of the database's dialect:
+
+      PostgreSQL with psycopg2
+        One ``COPY ... FROM STDIN`` per table.
+
+      SQLite
+        Multi-row ``INSERT``\ s of *batch_size* rows, with the rollback
+        journal kept in memory and the writes not synced to disk.  A
+        database whose load is interrupted by a crash must be recreated.
+
+      Other dialects
+        Multi-row ``INSERT``\ s of *batch_size* rows.
+
+    The statements about each row should be adjacent, as they are in the
+    output of :func:`~rdb2rdf.export.export_ntriples` and
+    ``rdb2rdf-dump``.  A second ``rdf:type`` statement about a subject
+    starts another row, as the duplicate rows of a table without a primary
+    key do.  Statements about a row that are further apart than
+    *batch_size* rows are loaded as separate rows, which fails on the
+    table's primary key.  Likewise, the rows must not be in the database
+    already.
+
+    :param store:
+        An open store of the database.  Its tables must exist.
+    :type store: :class:`~rdb2rdf.stores.DirectMapping`
+
+    :param file_:
+        A binary file-like object of UTF-8 N-Triples.
+    :type file_: :class:`file`
+
+    :param int batch_size:
+        The number of rows buffered in memory, and inserted per statement.
+
+    :param spool_dir:
+        The directory of the temporary spool files.  The default is the
+        system's temporary directory.
+    :type spool_dir: :obj:`str` or null
+
+    :return:
+        The numbers of rows and triples loaded.
+    :rtype: (:obj:`int`, :obj:`int`)
+
+    :raise ValueError:
+        Raised if a line is not an N-Triples statement, or if a row's
+        statements are not in the direct mapping of its table.
+
+    """
+
+    if batch_size < 1:
+        raise ValueError('invalid batch size {!r}: expecting a positive'
+                          ' integer'
+                          .format(batch_size))
+
+    tmpdir = _tempfile.mkdtemp(prefix='rdb2rdf-load-', dir=spool_dir)
+    try:
+        parser = _NTriplesParser()
+        spool = _RowsSpool(store, batch_size, tmpdir)
+        ntriples = 0
+        subject = None
+        subject_lineno = None
+        subject_typed = False
+        predicates_objects = []
+        for lineno, line in enumerate(file_, 1):
+            triple = parser.statement(line, lineno)
+            if triple is None:
+                continue
+            ntriples += 1
+
+            # the duplicate rows of a table without a primary key have the
+            # same node, but each is described by its own class statement
+            is_type = triple[1] == _RDF_TYPE
+            if triple[0] is not subject or (is_type and subject_typed):
+                if subject is not None:
+                    spool.add(subject, predicates_objects, subject_lineno)
+                subject = triple[0]
+                subject_lineno = lineno
+                subject_typed = False
+                predicates_objects = []
+            subject_typed = subject_typed or is_type
+            predicates_objects.append(triple[1:])
+        if subject is not None:
+            spool.add(subject, predicates_objects, subject_lineno)
+        spool.flush()
+
+        connection = store.rdb.connect()
+        try:
+            _load_spooled_tables(connection, spool.paths, batch_size)
+        finally:
+            connection.close()
+
+        return spool.nrows, ntriples
+    finally:
+        _shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _insert_rows(connection, table, rows, batch_size):
+    insert = table.insert()
+    colkeys = [col.key for col in table.columns]
+    while True:
+        batch = [dict(zip(colkeys, row))
+                 for row in _islice(rows, batch_size)]
+        if not batch:
+            return
+        connection.execute(insert, batch)
+
+
+def _load_spooled_tables(connection, paths_by_table, batch_size):
+
+    dialect = connection.dialect
+    if dialect.name == 'postgresql' and dialect.driver == 'psycopg2':
+        load_rows = _postgresql_copy_rows
+    else:
+        load_rows = _insert_rows
+
+    if dialect.name == 'sqlite':
+        # these are connection settings, which are restored for the
+        # connection's next user
+        pragmas_values = \
+            [(name, connection.execute('PRAGMA {}'.format(name)).scalar())
+             for name, _ in _SQLITE_LOAD_PRAGMAS]
+        for name, value in _SQLITE_LOAD_PRAGMAS:
+            connection.execute('PRAGMA {} = {}'.format(name, value))
+    else:
+        pragmas_values = ()
+
+    try:
+        transaction = connection.begin()
+        try:
+            # the tables that form cycles of foreign keys are loaded last
+            for table, _ \
+                    in _sort_tables_and_constraints(paths_by_table.keys()):
+                if table is not None:
+                    load_rows(connection, table,
+                              _spooled_rows(paths_by_table[table]),
+                              batch_size)
+        except:
+            transaction.rollback()
+            raise
+        else:
+            transaction.commit()
+    finally:
+        for name, value in pragmas_values:
+            connection.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def _nt_unescaped(text):
+    if u'\\' not in text:
+        return text
+    return _NTRIPLES_ESCAPE_RE.sub(_nt_unescaped_char, text)
+
+
+def _nt_unescaped_char(match):
+    codepoint_hex, codepoint_long_hex, char = match.groups()
+    if char is None:
+        # unichr() is limited to the BMP on narrow builds
+        return '\\U{:0>8}'.format(codepoint_hex or codepoint_long_hex)\
+                .decode('unicode-escape')
+    try:
+        return _NTRIPLES_ESCAPES[char]
+    except KeyError:
+        raise ValueError('invalid escape {!r}'.format(match.group()))
+
+
+def _postgresql_copy_rows(connection, table, rows, batch_size):
+
+    preparer = connection.dialect.identifier_preparer
+    copy_sql = \
+        'COPY {} ({}) FROM STDIN WITH (ENCODING \'UTF8\')'\
+         .format(preparer.format_table(table),
+                 ', '.join(preparer.quote(col.name) for col in table.columns))
+    copy_text_funcs = [_postgresql_copy_text_func(col.type)
+                       for col in table.columns]
+    lines = ('\t'.join(copy_text(value)
+                       for copy_text, value in zip(copy_text_funcs, row))
+              + '\n'
+             for row in rows)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(copy_sql, _IterFile(lines))
+    finally:
+        cursor.close()
+
+
+def _postgresql_copy_bytes_text(value):
+    if value is None:
+        return _POSTGRESQL_COPY_NULL
+    # the hex format of bytea, with its backslash escaped
+    return '\\\\x' + _binascii.hexlify(value)
+
+
+def _postgresql_copy_text(value):
+
+    if value is None:
+        return _POSTGRESQL_COPY_NULL
+
+    if isinstance(value, bool):
+        text = 't' if value else 'f'
+    elif isinstance(value, float):
+        text = repr(value)
+    elif isinstance(value, _datetime.timedelta):
+        text = '{} days {} seconds {} microseconds'\
+                .format(value.days, value.seconds, value.microseconds)
+    elif isinstance(value, (_datetime.date, _datetime.time)):
+        text = value.isoformat()
+    elif isinstance(value, unicode):
+        text = value.encode('utf-8')
+    else:
+        text = str(value)
+
+    for char, escape in _POSTGRESQL_COPY_ESCAPES:
+        text = text.replace(char, escape)
+    return text
+
+
+def _postgresql_copy_text_func(sql_type):
+    if isinstance(sql_type, _sqla.LargeBinary):
+        return _postgresql_copy_bytes_text
+    return _postgresql_copy_text
+
+
+def _spooled_rows(path):
+    with open(path, 'rb') as file_:
+        while True:
+            try:
+                rows = _pickle.load(file_)
+            except EOFError:
+                return
+            for row in rows:
+                yield row
+
+
+_NTRIPLES_ESCAPE_RE = \
+    _re.compile(ur'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+
+_NTRIPLES_ESCAPES = {u't': u'\t', u'b': u'\b', u'n': u'\n', u'r': u'\r',
+                     u'f': u'\f', u'"': u'"', u"'": u"'", u'\\': u'\\'}
+
+_NTRIPLES_IRIS_CACHE_SIZE = 10000
+
+_NTRIPLES_STATEMENT_RE = \
+    _re.compile(ur'(?:<([^>]*)>|_:(\S+))\s+<([^>]*)>\s+'
+                ur'(?:<([^>]*)>|_:(\S+)'
+                ur'|"((?:[^"\\]|\\.)*)"'
+                ur'(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^<([^>]*)>)?)'
+                ur'\s*\.(?:\s*#.*)?$')
+
+_POSTGRESQL_COPY_ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'),
+                            ('\r', '\\r'))
+
+_POSTGRESQL_COPY_NULL = '\\N'
+
+_RDF_TYPE = _rdf.RDF.type
+
+_SQLITE_LOAD_PRAGMAS = (('synchronous', 'OFF'), ('journal_mode', 'MEMORY'),
+                        ('temp_store', 'MEMORY'))
+
+
+class _IterFile(object):
+
+    """A file-like object that reads the strings of an iterable"""
+
+    def __init__(self, strings):
+        self._strings = iter(strings)
+        self._buffer = ''
+
+    def read(self, size=-1):
+
+        chunks = [self._buffer]
+        chunks_len = len(self._buffer)
+        for string in self._strings:
+            chunks.append(string)
+            chunks_len += len(string)
+            if 0 <= size <= chunks_len:
+                break
+        data = ''.join(chunks)
+
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+class _NTriplesParser(object):
+
+    """A parser of N-Triples statements
+
+    The terms of the predicates and datatypes are cached, as is that of the
+    last subject, since they recur from line to line.
+
+    """
+
+    def __init__(self):
+        self._iris = {}
+        self._subject = None
+        self._subject_text = None
+
+    def statement(self, line, lineno):
+
+        """Parse a line of N-Triples
+
+        :return:
+            The line's triple, or :obj:`None` if the line is blank or a
+            comment.
+
+        """
+
+        line = line.decode('utf-8').strip()
+        if not line or line.startswith(u'#'):
+            return None
+
+        match = _NTRIPLES_STATEMENT_RE.match(line)
+        if not match:
+            raise ValueError('invalid N-Triples statement at line {}: {!r}'
+                              .format(lineno, line))
+
+        try:
+            return self._terms(*match.groups())
+        except ValueError as exc:
+            raise ValueError('invalid N-Triples statement at line {}: {}'
+                              .format(lineno, exc))
+
+    def _iri(self, text):
+        try:
+            return self._iris[text]
+        except KeyError:
+            if len(self._iris) >= _NTRIPLES_IRIS_CACHE_SIZE:
+                self._iris.clear()
+            iri = self._iris[text] = _rdf.URIRef(_nt_unescaped(text))
+            return iri
+
+    def _terms(self, subject_iri, subject_bnode, predicate_iri, object_iri,
+               object_bnode, object_lexical, object_lang, object_datatype):
+
+        subject_text = subject_iri or subject_bnode
+        if subject_text == self._subject_text:
+            subject = self._subject
+        else:
+            if subject_iri is not None:
+                subject = _rdf.URIRef(_nt_unescaped(subject_iri))
+            else:
+                subject = _rdf.BNode(subject_bnode)
+            self._subject = subject
+            self._subject_text = subject_text
+
+        if object_iri is not None:
+            object = _rdf.URIRef(_nt_unescaped(object_iri))
+        elif object_bnode is not None:
+            object = _rdf.BNode(object_bnode)
+        elif object_datatype is not None:
+            object = _rdf.Literal(_nt_unescaped(object_lexical),
+                                  datatype=self._iri(object_datatype))
+        else:
+            object = _rdf.Literal(_nt_unescaped(object_lexical),
+                                  lang=object_lang)
+
+        return subject, self._iri(predicate_iri), object
+
+
+class _RowsSpool(object):
+
+    """Rows buffered per table and spooled to temporary files"""
+
+    def __init__(self, store, batch_size, dir):
+        self.nrows = 0
+        self.paths = {}
+        self._batch_size = batch_size
+        self._dir = dir
+        self._rows = {}
+        self._rows_len = 0
+        self._store = store
+        self._tables = {}
+
+    def add(self, subject, predicates_objects, lineno):
+
+        try:
+            table_iri, values = self._store.row_values(subject,
+                                                       predicates_objects)
+        except ValueError as exc:
+            raise ValueError('invalid row at line {}: {}'.format(lineno, exc))
+
+        try:
+            table, pkey_colkeys = self._tables[table_iri]
+        except KeyError:
+            class_ = self._store.orm_classes[table_iri]
+            table = class_.__table__
+            mapper = _sqla.inspect(class_)
+            # the rows of a table without a primary key may be duplicates,
+            # so they are not merged by key
+            pkey_colkeys = \
+                None if mapper.has_pseudo_primary_key \
+                     else [col.key for col in mapper.primary_key]
+            self._tables[table_iri] = table, pkey_colkeys
+
+        table_rows = self._rows.setdefault(table, {})
+        if pkey_colkeys is None:
+            key = len(table_rows)
+        else:
+            key = tuple(values[colkey] for colkey in pkey_colkeys)
+        try:
+            table_rows[key].update(values)
+        except KeyError:
+            table_rows[key] = values
+            self._rows_len += 1
+
+        if self._rows_len >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+
+        for table, rows_by_key in self._rows.items():
+            try:
+                path = self.paths[table]
+            except KeyError:
+                path = self.paths[table] = \
+                    _os.path.join(self._dir, str(len(self.paths)))
+
+            colkeys = [col.key for col in table.columns]
+            with open(path, 'ab') as file_:
+                _pickle.dump([tuple(row.get(colkey) for colkey in colkeys)
+                              for row in rows_by_key.values()],
+                             file_, _pickle.HIGHEST_PROTOCOL)
+            self.nrows += len(rows_by_key)
+
+        self._rows = {}
+        self._rows_len = 0
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""Scripts"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""Dump a database's direct mapping as RDF
+
+This module provides the ``rdb2rdf-dump`` command::
+
+    rdb2rdf-dump postgresql://localhost/db --base-iri http://example.com/db/ \
+        --exclude 'audit_*' --jobs 4 -o db.nt.gz
+
+`N-Triples`_ are streamed table by table through
+:meth:`rdb2rdf.stores.DirectMapping.table_ntriples`.  With
+``--sql-rendering``, the statements are rendered in SQL where the database
+supports it.  With ``--jobs`` greater than 1, each table is split into
+as many ranges of keys, which are exported by separate processes and
+appended to the output in order.  The other formats are serialized by
+:mod:`rdflib` from an in-memory graph.
+
+Progress is reported to standard error in rows and triples per second.
+
+.. _N-Triples: http://www.w3.org/TR/n-triples/
+
+"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import argparse as _argparse
+import bz2 as _bz2
+from fnmatch import fnmatchcase as _fnmatchcase
+import gzip as _gzip
+import multiprocessing as _mp
+import os as _os
+import shutil as _shutil
+import sys as _sys
+import tempfile as _tempfile
+import time as _time
+
+import rdflib as _rdf
+# registers the '_rdflib_nt_escape' codec error handler
+import rdflib.plugins.serializers.nt as _rdf_nt_serializer
+import sqlalchemy as _sqla
+
+from .. import stores as _stores
+
+
+def main(argv=None):
+
+    """Run the ``rdb2rdf-dump`` command.
+
+    :param argv:
+        The command-line arguments.  The default is :data:`sys.argv`.
+    :type argv: [:obj:`str`] or null
+
+    :return:
+        The exit status.
+    :rtype: :obj:`int`
+
+    """
+
+    parser = _parser()
+    args = parser.parse_args((argv or _sys.argv)[1:])
+
+    if args.jobs < 1:
+        parser.error('invalid jobs {!r}: expecting a positive number'
+                      .format(args.jobs))
+    if args.jobs > 1 and args.format != 'nt':
+        parser.error('parallel dumps are only supported in the nt format')
+
+    compression = args.compression
+    if compression is None:
+        compression = _COMPRESSION_BY_EXT.get(_os.path.splitext(args.output)
+                                                                [1],
+                                               'none')
+    if args.output == '-' and compression == 'bz2':
+        parser.error('cannot write bz2 to standard output')
+
+    store_kwargs = {'base_iri': args.base_iri}
+    store = _stores.DirectMapping(**store_kwargs)
+    store.open(_sqla.create_engine(args.url), stream_results=True,
+               stream_batch_size=args.batch_size)
+
+    try:
+        tables_iris = _tables_iris(store, args.include, args.exclude)
+        if not tables_iris:
+            parser.error('no tables match the include and exclude filters')
+
+        progress = _Progress(None if args.quiet else _sys.stderr,
+                             args.progress_interval)
+        with _output_file(args.output, compression) as file_:
+            if args.format != 'nt':
+                _dump_graph(store, tables_iris, file_, args.format, progress)
+            else:
+                sql_rendering = \
+                    args.sql_rendering \
+                    and store.supports_sql_rendering
+                if args.jobs > 1:
+                    _dump_ntriples_parallel(store, ((args.url,), {}),
+                                            store_kwargs, tables_iris, file_,
+                                            jobs=args.jobs,
+                                            batch_size=args.batch_size,
+                                            sql_rendering=sql_rendering,
+                                            progress=progress)
+                else:
+                    _dump_ntriples(store, tables_iris, file_,
+                                   sql_rendering=sql_rendering,
+                                   progress=progress)
+        progress.finish()
+    finally:
+        store.close()
+
+    return 0
+
+
+def _dump_graph(store, tables_iris, file_, format, progress):
+    graph = _rdf.Graph()
+    for table_iri in tables_iris:
+        progress.table = table_iri
+        for triple in store.table_triples(table_iri):
+            graph.add(triple)
+            # each row is described by one class statement
+            progress.update(1 if triple[1] == _rdf.RDF.type else 0, 1)
+    graph.serialize(destination=file_, format=format)
+
+
+def _dump_ntriples(store, tables_iris, file_, sql_rendering, progress):
+    for table_iri in tables_iris:
+        progress.table = table_iri
+        _write_table_ntriples(store, table_iri, file_,
+                              sql_rendering=sql_rendering,
+                              progress=progress)
+
+
+def _dump_ntriples_parallel(store, configuration, store_kwargs, tables_iris,
+                            file_, jobs, batch_size, sql_rendering,
+                            progress):
+
+    tasks = []
+    tmpdir = _tempfile.mkdtemp(prefix='rdb2rdf-dump-')
+    try:
+        for table_iri in tables_iris:
+            for key_range in store.table_key_ranges(table_iri, jobs):
+                tasks.append((table_iri, key_range,
+                              _os.path.join(tmpdir, str(len(tasks)))))
+
+        pool = _mp.Pool(jobs, initializer=_init_worker,
+                        initargs=(configuration, store_kwargs, batch_size,
+                                  sql_rendering))
+        try:
+            # the partitions are appended in order as they are completed
+            for (table_iri, _, path), (nrows, ntriples) \
+                    in zip(tasks, pool.imap(_dump_partition, tasks)):
+                progress.table = table_iri
+                with open(path, 'rb') as partition_file:
+                    _shutil.copyfileobj(partition_file, file_)
+                _os.remove(path)
+                progress.update(nrows, ntriples)
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+    finally:
+        _shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _dump_partition((table_iri, key_range, path)):
+    with open(path, 'wb') as file_:
+        return _write_table_ntriples(_worker_store, table_iri, file_,
+                                     key_range=key_range,
+                                     sql_rendering=_worker_sql_rendering)
+
+
+def _init_worker(configuration, store_kwargs, batch_size, sql_rendering):
+    global _worker_store, _worker_sql_rendering
+    _worker_store = _stores.DirectMapping(**store_kwargs)
+    _worker_store.open(configuration, stream_results=True,
+                       stream_batch_size=batch_size)
+    _worker_sql_rendering = sql_rendering
+
+
+def _output_file(path, compression):
+    if path == '-':
+        file_ = _sys.stdout
+        if compression == 'gzip':
+            return _gzip.GzipFile(fileobj=file_, mode='wb',
+                                  compresslevel=_GZIP_COMPRESSLEVEL)
+        return _UnclosedFile(file_)
+    elif compression == 'gzip':
+        return _gzip.open(path, 'wb', compresslevel=_GZIP_COMPRESSLEVEL)
+    elif compression == 'bz2':
+        return _bz2.BZ2File(path, 'wb')
+    else:
+        return open(path, 'wb')
+
+
+def _parser():
+
+    parser = _argparse.ArgumentParser(prog='rdb2rdf-dump',
+                                      description=
+                                          'Dump the direct mapping of a'
+                                           ' relational database as RDF.')
+    parser.add_argument('url', help='the SQLAlchemy URL of the database')
+    parser.add_argument('--base-iri', '-b',
+                        help='the base IRI of the mapped resources')
+    parser.add_argument('--include', '-i', action='append', default=[],
+                        metavar='PATTERN',
+                        help='dump only the tables whose names match this'
+                              ' shell-style pattern; may be repeated')
+    parser.add_argument('--exclude', '-x', action='append', default=[],
+                        metavar='PATTERN',
+                        help='skip the tables whose names match this'
+                              ' shell-style pattern; may be repeated')
+    parser.add_argument('--output', '-o', default='-',
+                        help='the output file (default: standard output)')
+    parser.add_argument('--format', '-f', default='nt', choices=_FORMATS,
+                        help='the output format (default: %(default)s);'
+                              ' only nt is streamed')
+    parser.add_argument('--compression', '-z', choices=_COMPRESSIONS,
+                        help='the output compression (default: by the'
+                              ' output file extension)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='the number of export processes (default:'
+                              ' %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='the number of rows fetched per batch'
+                              ' (default: %(default)s)')
+    parser.add_argument('--sql-rendering', action='store_true',
+                        help='render the nt statements in SQL where the'
+                              ' database supports it instead of formatting'
+                              ' them all in Python')
+    parser.add_argument('--progress-interval', type=float, default=5.,
+                        metavar='SECONDS',
+                        help='the interval between progress reports'
+                              ' (default: %(default)s)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='do not report progress')
+    return parser
+
+
+def _tables_iris(store, includes, excludes):
+    tables_iris_by_name = {class_.__table__.name: table_iri
+                           for table_iri, class_
+                           in store.orm_classes.items()}
+    return [tables_iris_by_name[name]
+            for name in sorted(tables_iris_by_name)
+            if (not includes
+                or any(_fnmatchcase(name, pattern) for pattern in includes))
+               and not any(_fnmatchcase(name, pattern)
+                           for pattern in excludes)]
+
+
+def _write_table_ntriples(store, table_iri, file_, key_range=None,
+                          sql_rendering=False, progress=None):
+
+    nrows = 0
+    ntriples = 0
+    for text in store.table_ntriples(table_iri, key_range=key_range,
+                                     sql_rendering=sql_rendering):
+        file_.write(text.encode('ascii', '_rdflib_nt_escape'))
+        text_ntriples = text.count(u'\n')
+        nrows += 1
+        ntriples += text_ntriples
+        if progress is not None:
+            progress.update(1, text_ntriples)
+    return nrows, ntriples
+
+
+_COMPRESSION_BY_EXT = {'.bz2': 'bz2', '.gz': 'gzip'}
+
+_COMPRESSIONS = ('none', 'gzip', 'bz2')
+
+_FORMATS = ('nt', 'n3', 'turtle', 'xml', 'pretty-xml', 'trix')
+
+# the default of gzip(1), which compresses much faster than zlib's default
+_GZIP_COMPRESSLEVEL = 6
+
+
+class _Progress(object):
+
+    """Reports of the rows and triples written, and their rates"""
+
+    def __init__(self, file_, interval):
+        self.table = None
+        self._file = file_
+        self._interval = interval
+        self._nrows = 0
+        self._ntriples = 0
+        self._start_time = self._report_time = _time.time()
+
+    def finish(self):
+        self._report(u'done')
+
+    def update(self, nrows, ntriples):
+        self._nrows += nrows
+        self._ntriples += ntriples
+        if self._file is not None \
+               and _time.time() - self._report_time >= self._interval:
+            self._report(self.table)
+
+    def _report(self, label):
+
+        if self._file is None:
+            return
+
+        now = self._report_time = _time.time()
+        elapsed = max(now - self._start_time, 1e-6)
+        self._file.write('{}: {} rows ({:.0f}/s), {} triples ({:.0f}/s),'
+                          ' {:.1f}s\n'
+                          .format(label, self._nrows, self._nrows / elapsed,
+                                  self._ntriples, self._ntriples / elapsed,
+                                  elapsed))
+        self._file.flush()
+
+
+class _UnclosedFile(object):
+
+    """A context manager of a file that is not closed on exit"""
+
+    def __init__(self, file_):
+        self._file = file_
+
+    def __enter__(self):
+        return self._file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.flush()
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
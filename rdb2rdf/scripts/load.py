@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Load a direct mapping's RDF into a database
+
+This module provides the ``rdb2rdf-load`` command::
+
+    rdb2rdf-load postgresql://localhost/db --base-iri http://example.com/db/ \
+        db.nt.gz
+
+The `N-Triples`_ written by ``rdb2rdf-dump`` are loaded back into the
+database's empty tables by :func:`rdb2rdf.load.load_ntriples`.  The tables
+must exist; their rows are written in one transaction.
+
+The numbers of rows and triples loaded, and their rates, are reported to
+standard error.
+
+.. _N-Triples: http://www.w3.org/TR/n-triples/
+
+"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import argparse as _argparse
+import bz2 as _bz2
+import gzip as _gzip
+import os as _os
+import sys as _sys
+import time as _time
+
+import sqlalchemy as _sqla
+
+from .. import load as _load
+from .. import stores as _stores
+
+
+def main(argv=None):
+
+    """Run the ``rdb2rdf-load`` command.
+
+    :param argv:
+        The command-line arguments.  The default is :data:`sys.argv`.
+    :type argv: [:obj:`str`] or null
+
+    :return:
+        The exit status.
+    :rtype: :obj:`int`
+
+    """
+
+    parser = _parser()
+    args = parser.parse_args((argv or _sys.argv)[1:])
+
+    if args.batch_size < 1:
+        parser.error('invalid batch size {!r}: expecting a positive number'
+                      .format(args.batch_size))
+
+    compression = args.compression
+    if compression is None:
+        compression = _COMPRESSION_BY_EXT.get(_os.path.splitext(args.input)
+                                                                [1],
+                                               'none')
+    if args.input == '-' and compression == 'bz2':
+        parser.error('cannot read bz2 from standard input')
+
+    store = _stores.DirectMapping(base_iri=args.base_iri)
+    store.open(_sqla.create_engine(args.url))
+
+    try:
+        start_time = _time.time()
+        with _input_file(args.input, compression) as file_:
+            nrows, ntriples = _load.load_ntriples(store, file_,
+                                                  batch_size=args.batch_size,
+                                                  spool_dir=args.spool_dir)
+        elapsed = max(_time.time() - start_time, 1e-6)
+    finally:
+        store.close()
+
+    if not args.quiet:
+        _sys.stderr.write('done: {} rows ({:.0f}/s), {} triples ({:.0f}/s),'
+                           ' {:.1f}s\n'
+                           .format(nrows, nrows / elapsed, ntriples,
+                                   ntriples / elapsed, elapsed))
+    return 0
+
+
+def _input_file(path, compression):
+    if path == '-':
+        file_ = _sys.stdin
+        if compression == 'gzip':
+            return _gzip.GzipFile(fileobj=file_, mode='rb')
+        return _UnclosedFile(file_)
+    elif compression == 'gzip':
+        return _gzip.open(path, 'rb')
+    elif compression == 'bz2':
+        return _bz2.BZ2File(path, 'rb')
+    else:
+        return open(path, 'rb')
+
+
+def _parser():
+
+    parser = _argparse.ArgumentParser(prog='rdb2rdf-load',
+                                      description=
+                                          'Load the direct mapping of a'
+                                           ' relational database from'
+                                           ' N-Triples.')
+    parser.add_argument('url', help='the SQLAlchemy URL of the database')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='the input file (default: standard input)')
+    parser.add_argument('--base-iri', '-b',
+                        help='the base IRI of the mapped resources')
+    parser.add_argument('--compression', '-z', choices=_COMPRESSIONS,
+                        help='the input compression (default: by the input'
+                              ' file extension)')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='the number of rows buffered and inserted per'
+                              ' batch (default: %(default)s)')
+    parser.add_argument('--spool-dir', metavar='DIR',
+                        help='the directory of the temporary spool files'
+                              ' (default: the system\'s temporary'
+                              ' directory)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='do not report the numbers of rows and triples'
+                              ' loaded')
+    return parser
+
+
+_COMPRESSION_BY_EXT = {'.bz2': 'bz2', '.gz': 'gzip'}
+
+_COMPRESSIONS = ('none', 'gzip', 'bz2')
+
+
+class _UnclosedFile(object):
+
+    """A context manager of a file that is not closed on exit"""
+
+    def __init__(self, file_):
+        self._file = file_
+
+    def __enter__(self):
+        return self._file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""SPARQL evaluation
+
+This module provides a custom SPARQL evaluation function for RDFLib that
+answers each basic graph pattern over a
+:class:`~rdb2rdf.stores.DirectMapping` store with a single SQL query,
+so that the database performs the joins between its triple patterns.
+
+The function is registered as the ``rdb2rdf_dm`` plugin of the
+``rdf.plugins.sparqleval`` entry point group.  Without the entry point, it
+can be registered manually::
+
+    import rdflib.plugins.sparql
+    import rdb2rdf.sparql
+
+    rdflib.plugins.sparql.CUSTOM_EVALS['rdb2rdf_dm'] = rdb2rdf.sparql.evaluate
+
+.. seealso:: :mod:`rdflib.plugins.sparql`
+
+"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import rdflib as _rdf
+
+from . import stores as _stores
+
+
+def evaluate(ctx, part):
+
+    """Evaluate a part of a SPARQL query's algebra.
+
+    :param ctx:
+        The query context.
+    :type ctx: :class:`rdflib.plugins.sparql.sparql.QueryContext`
+
+    :param part:
+        The part.
+    :type part: :class:`rdflib.plugins.sparql.parserutils.CompValue`
+
+    :return:
+        The solutions.
+    :rtype: ~[:class:`rdflib.plugins.sparql.sparql.FrozenBindings`]
+
+    :raise NotImplementedError:
+        Raised if *part* is not a basic graph pattern over a
+        :class:`~rdb2rdf.stores.DirectMapping` store or if the store cannot
+        compile it.
+
+    """
+
+    if part.name != 'BGP':
+        raise NotImplementedError
+
+    store = getattr(ctx.graph, 'store', None)
+    if not isinstance(store, _stores.DirectMapping):
+        raise NotImplementedError
+
+    # the query's blank nodes are variables, but the store treats every term
+    # other than a variable as a constant
+    terms_by_var = {}
+
+    def pattern_term(term):
+        if type(term) not in (_rdf.BNode, _rdf.Variable):
+            return term
+        value = ctx[term]
+        if value is not None:
+            return value
+        if isinstance(term, _rdf.Variable):
+            var = term
+        else:
+            var = _rdf.Variable(u'__rdb2rdf_bnode_{}'.format(term))
+        terms_by_var[var] = term
+        return var
+
+    patterns = [tuple(pattern_term(term) for term in triple)
+                for triple in part.triples]
+
+    return _solutions(ctx, store.bgp_solutions(patterns), terms_by_var)
+
+
+def _solutions(ctx, solutions, terms_by_var):
+    for solution in solutions:
+        solution_ctx = ctx.push()
+        for var, value in solution.items():
+            solution_ctx[terms_by_var[var]] = value
+        yield solution_ctx.solution()
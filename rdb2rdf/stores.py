@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """RDFLib stores
 
+.. _N-Triples: http://www.w3.org/TR/n-triples/
+
 .. seealso:: :mod:`rdflib.store`, :mod:`rdflib.plugins.stores`
 
 """
@@ -8,23 +10,38 @@
 __copyright__ = "Copyright (C) 2014 Ivan D Vasin"
 __docformat__ = "restructuredtext"
 
-from collections import deque as _deque
+from collections import deque as _deque, Mapping as _Mapping, \
+                        namedtuple as _namedtuple, \
+                        OrderedDict as _OrderedDict, Set as _Set
 from functools import partial as _partial, reduce as _reduce
+import cPickle as _pickle
+import hashlib as _hashlib
 import json as _json
+import logging as _log
 from operator import add as _add
+import Queue as _queue
+import os as _os
 import re as _re
+import sys as _sys
+from sys import getsizeof as _getsizeof
+import tempfile as _tempfile
+import threading as _threading
 from urllib import unquote as _pct_decoded
 
 import rdflib as _rdf
 from spruce.collections import frozendict as _frozendict
 from spruce.types import require_isinstance as _require_isinstance
-import spruce.iri.goose as _iri_goose
 import sqlalchemy as _sqla
 _sqlaf = _sqla.func
-import sqlalchemy.orm as _sqla_orm
+from sqlalchemy.schema import \
+    sort_tables_and_constraints as _sort_tables_and_constraints
 
 from . import _common
-from . import dm as _dm
+
+# these are imported when a store is created or opened
+_dm = _common.lazy_import('rdb2rdf.dm')
+_iri_goose = _common.lazy_import('spruce.iri.goose')
+_sqla_orm = _common.lazy_import('sqlalchemy.orm')
 
 
 class DirectMapping(_rdf.store.Store):
@@ -59,7 +76,8 @@ class DirectMapping(_rdf.store.Store):
 
     :param orm:
         An ORM session.
-    :type orm: :class:`sqlalchemy.orm.Session` or null
+    :type orm: :class:`sqlalchemy.orm.Session` or
+        :class:`sqlalchemy.orm.scoping.scoped_session` or null
 
     .. _direct mapping: http://www.w3.org/TR/rdb-direct-mapping/
 
@@ -81,6 +99,8 @@ class DirectMapping(_rdf.store.Store):
         self._rdb = configuration
         self._rdb_metadata = rdb_metadata
         self._rdb_transaction = None
+        self._opened = False
+        self._thread_safe = False
 
         self._orm = orm
         self.OrmBase = None
@@ -90,67 +110,105 @@ class DirectMapping(_rdf.store.Store):
         self._orm_columns_rdf_datatypes = None
         self._orm_relationships = None
         self._orm_bnode_tables = None
+        self._orm_predicates = None
+        self._orm_row_node_funcs = None
+        self._orm_row_ntriples_funcs = None
+        self._orm_projectors = None
+        self._orm_inbound_refs = None
+        self._orm_unmapped_tables = {}
+        self._orm_classes_by_table = None
+        self._orm_inbound_refs_stale = False
+        self._orm_mapping_lock = _threading.RLock()
+
+        self._stream_results = False
+        self._stream_batch_size = None
+        self._keyset_page_size = None
+        self._table_workers = 1
+        self._table_queue_size = None
+        self._len_mode = 'exact'
+        self._cache_len = False
+        self._write_batch_size = None
+        self._session_state = _SessionState()
 
         if configuration:
             self.open(configuration)
 
     def __len__(self, context=None):
 
-        if context is not None:
+        if not self._is_default_context(context):
             return 0
 
-        len_ = 0
-
-        for subject_table_iri, subject_class in self._orm_classes.items():
-            subject_cols_props = self._orm_columns_properties[subject_table_iri]
-            subject_rels = self._orm_relationships[subject_table_iri]
-
-            # sum:
-            #   * 1 for each class statement (1 for each row)
-            #   * 1 for each literal property statement (1 for each non-null
-            #     attribute of each row)
-            #   * 1 for each reference property statement (1 for each totally
-            #     non-null foreign key value tuple of each row)
-            len_ += \
-                self._orm.query\
-                 (_sqla.func.count(subject_class.__mapper__.primary_key[0])
-                   + _reduce
-                      (_add,
-                       (_sqlaf.sum
-                         (_sqla.case(((prop.class_attribute == None,
-                                       _sqla.literal(0)),),
-                                     else_=_sqla.literal(1)))
-                        for prop in subject_cols_props.values()),
-                       _sqla.literal(0))
-                   + _reduce
-                      (_add,
-                       (_sqlaf.sum
-                         (_sqla.case
-                           (((_reduce
-                               (_sqla.and_,
-                                (subject_cols_props[colname].class_attribute
-                                  != None
-                                 for colname in colnames),
-                                _sqla.literal(True)),
-                              _sqla.literal(1)),
-                             ),
-                            else_=_sqla.literal(0)))
-                        for colnames in subject_rels.keys()),
-                       _sqla.literal(0)))\
-                 .scalar()
+        self.flush()
 
+        state = self._session_state
+        if state.len is not None:
+            return state.len
+
+        if self._len_mode == 'approximate':
+            len_ = self._approximate_len()
+        else:
+            len_ = self._tables_len(self._orm_mappers.keys())
+
+        if self._cache_len:
+            state.len = len_
         return len_
 
     def add(self, (subject, predicate, object), context=None, quoted=False):
 
-        # FIXME
+        """Add a triple.
+
+        The triple is mapped back onto a value of its subject's row, which is
+        buffered with the other values of the row until :meth:`flush`.
+        Buffered rows are flushed when there are *write_batch_size* of them,
+        before triples are matched or counted, and on :meth:`commit`; each
+        table's new rows are inserted and its existing rows updated by
+        batched statements.
+
+        The triple must be one that this store's direct mapping could
+        produce:
+
+          :samp:`({row}, rdf:type, {table})`
+            The row is inserted if it does not exist.
+
+          :samp:`({row}, {table}#{column}, {literal})`
+            The column's value is set to the literal's value.  The literal's
+            datatype must be compatible with the column's type.
+
+          :samp:`({row}, {table}#ref-{columns}, {referenced row})`
+            The columns' values are set to the referenced row's key.  The
+            reference must be to the referenced table's primary key.
+
+        Setting a column that is already set in the buffer replaces its
+        value.
+
+        :raise ValueError:
+            Raised if the triple is not in the direct mapping of this
+            store's tables, or if *context* is not the default context.
+
+        """
+
+        if not self._is_default_context(context):
+            raise ValueError('cannot add triples to context {!r}'
+                              .format(context))
 
-        super(DirectMapping, self).add((subject, predicate, object),
-                                       context=context, quoted=quoted)
+        self._add_pending_value(subject, predicate, object)
+        self._invalidate_caches()
 
     def addN(self, quads):
+
+        """Add triples to contexts.
+
+        This is equivalent to :meth:`add`\ ing each quad's triple, but the
+        caches are invalidated once.
+
+        """
+
         for subject, predicate, object, context in quads:
-            self.add((subject, predicate, object), context=context)
+            if not self._is_default_context(context):
+                raise ValueError('cannot add triples to context {!r}'
+                                  .format(context))
+            self._add_pending_value(subject, predicate, object)
+        self._invalidate_caches()
 
     def add_graph(self, graph):
         # FIXME
@@ -175,6 +233,37 @@ class DirectMapping(_rdf.store.Store):
         _require_isinstance(value, _iri_goose.UriReference)
         self._base_iri = value
 
+    def bgp_solutions(self, patterns):
+
+        """Match a basic graph pattern with a single query.
+
+        The pattern is compiled into one SQL query that joins a table alias
+        for each node.  Predicates must be this store's class, literal
+        property, or reference property IRIs.
+
+        :param patterns:
+            The triple patterns.  Terms of type :class:`rdflib.Variable` are
+            variables; other terms are constants.
+        :type patterns: ~[(object, object, object)]
+
+        :return:
+            The solutions, as mappings from variables to terms.
+        :rtype: ~[{:class:`rdflib.Variable`: :class:`rdflib.term.Node`}]
+
+        :raise NotImplementedError:
+            Raised if the pattern cannot be compiled: if it is empty, or
+            if any of its predicates or :obj:`rdflib.RDF.type` objects are
+            variables.
+
+        """
+
+        self.flush()
+        compiled = self._compile_bgp(patterns)
+        if compiled is None:
+            return iter(())
+        query, solution_from_row = compiled
+        return (solution_from_row(row) for row in self._query_rows(query))
+
     def bind(self, prefix, namespace):
         self._namespaces[prefix] = namespace
         self._prefix_by_namespace[namespace] = prefix
@@ -188,10 +277,17 @@ class DirectMapping(_rdf.store.Store):
                 self.rollback()
 
         self._orm.close_all()
+        if self._thread_safe:
+            self._orm.remove()
+        self._opened = False
 
     def commit(self):
-        self._rdb_transaction.commit()
-        self._rdb_transaction = self._rdb.begin().transaction
+        self.flush()
+        self._orm.commit()
+        if self._rdb_transaction is not None:
+            self._rdb_transaction.commit()
+            self._rdb_transaction = self._rdb.begin().transaction
+        self._invalidate_caches()
 
     context_aware = False
 
@@ -202,6 +298,46 @@ class DirectMapping(_rdf.store.Store):
         rdb = self._rdb_from_configuration(configuration)
         self._rdb_metadata.create_all(bind=rdb, checkfirst=True)
 
+    def describe_many(self, subjects, chunk_size=500):
+
+        """The triples that describe the given subjects.
+
+        This is equivalent to matching :samp:`({subject}, None, None)` for
+        each of the *subjects*, but the subjects are grouped by table and
+        each group is described in chunks of *chunk_size* subjects per
+        query.
+
+        :param subjects:
+            The subjects.  Subjects that are not row nodes of this store are
+            ignored.
+        :type subjects:
+            ~[:class:`rdflib.URIRef` or :class:`rdflib.BNode`]
+
+        :param int chunk_size:
+            The maximum number of subjects described per query.
+
+        :return:
+            The triples, grouped by subject table.
+        :rtype: ~[(:class:`rdflib.URIRef` or :class:`rdflib.BNode`,
+                   :class:`rdflib.URIRef`,
+                   :class:`rdflib.URIRef` or :class:`rdflib.BNode`
+                     or :class:`rdflib.Literal`)]
+
+        """
+
+        if chunk_size < 1:
+            raise ValueError('invalid chunk size {!r}: expecting a positive'
+                              ' integer'
+                              .format(chunk_size))
+
+        self.flush()
+
+        for table_iri, criteria in self._subjects_criteria(subjects,
+                                                           chunk_size):
+            for triple in self._table_allpredicates_triples\
+                           (table_iri, None, criteria=criteria):
+                yield triple
+
     def destroy(self, config):
         # FIXME
         pass
@@ -214,8 +350,40 @@ class DirectMapping(_rdf.store.Store):
     def id(self):
         return self._id
 
+    def flush(self):
+
+        """Write the buffered rows of :meth:`add`\ ed triples.
+
+        The rows are written in this store's session, so they are seen by
+        its queries but not by those of other sessions, such as the pages
+        of keyset pagination and the *table_workers*, until
+        :meth:`commit`.  If this store was opened with *thread_safe*, only
+        the current thread's rows are written, in its session.  The tables
+        are written in the order of their foreign keys.  For each table,
+        the existing rows are looked up by key in chunks; then the new rows
+        are inserted and the existing ones updated with one
+        ``executemany`` statement for each set of columns.
+
+        """
+
+        state = self._session_state
+        if not state.pending_rows:
+            return
+
+        pending_rows = state.pending_rows
+        state.clear_pending()
+
+        tables_iris_by_table = \
+            {self._orm_mappers[table_iri].local_table: table_iri
+             for table_iri in pending_rows}
+        for table in _sorted_tables(tables_iris_by_table.keys()):
+            table_iri = tables_iris_by_table[table]
+            self._flush_table_rows(table_iri, pending_rows[table_iri])
+
     @property
     def is_open(self):
+        if self._rdb_transaction is None:
+            return self._opened
         return self._rdb_transaction.is_active
 
     def namespace(self, prefix):
@@ -227,61 +395,309 @@ class DirectMapping(_rdf.store.Store):
     def namespaces(self):
         return self._namespaces.items()
 
-    def open(self, configuration, create=False, reflect=True):
+    def open(self, configuration, create=False, reflect=True,
+             stream_results=False, stream_batch_size=1000,
+             keyset_page_size=None, table_workers=1, table_queue_size=64,
+             len_mode='exact', cache_len=False, schema_cache=None,
+             lazy=False, cache_patterns=False, pattern_cache_size=1024,
+             pattern_cache_bytes=(64 << 20), write_batch_size=1000,
+             thread_safe=False):
+
+        """Open this store.
+
+        :param configuration:
+            The database.  See the *configuration* parameter of
+            :class:`DirectMapping`.
+        :type configuration:
+            :class:`sqlalchemy.engine.interfaces.Connectable`
+            or (~[object], ~{:obj:`str`: :obj:`object`} or null)
+
+        :param bool create:
+            Whether to create this store's tables if they do not exist.
+
+        :param bool reflect:
+            Whether to reflect the database's tables.
+
+        :param bool stream_results:
+            Whether to fetch the rows of table scans in batches from a
+            server-side cursor (where the database driver supports it)
+            instead of loading all of them before yielding the first
+            triple.
+
+            .. note::
+                Some drivers (such as MySQLdb with server-side cursors)
+                cannot execute other queries on the same connection while
+                a streamed result is pending.
+
+        :param int stream_batch_size:
+            The number of rows fetched per batch when *stream_results* is
+            true.
+
+        :param keyset_page_size:
+            If non-null, table scans walk each table in primary key order
+            in pages of this many rows.  Each page is fetched by a separate
+            short query that seeks past the last key of the previous page,
+            in its own session, so no connection or transaction is held
+            between pages and an interrupted scan leaves nothing open.  In
+            tables without a primary key whose rows may be duplicates, a
+            page seeks to the last key and skips the rows with that key
+            that were already scanned.
+            This takes precedence over *stream_results* for table scans.
+        :type keyset_page_size: :obj:`int` or null
+
+        :param int table_workers:
+            The number of tables that are scanned concurrently when matching
+            triples across all tables.  If greater than 1, each table is
+            scanned by one of a pool of worker threads, each with its own
+            session and connection, and their triples are merged into one
+            result in no particular order.  The engine's connection pool
+            must allow at least this many connections.
+
+        :param int table_queue_size:
+            The maximum number of batches of triples that the *table_workers*
+            may buffer before they wait for the result to be consumed.
+
+        :param str len_mode:
+            How the number of triples in this store is computed.  If
+            ``'exact'``, the triples of all tables are counted by one
+            ``UNION ALL`` query.  If ``'approximate'``, they are estimated
+            from the database's table statistics (``pg_class`` and
+            ``pg_stats`` in PostgreSQL, ``sqlite_stat1`` in SQLite,
+            assuming no nulls), and only the tables for which there are no
+            statistics are counted.
+
+        :param bool cache_len:
+            Whether to keep the number of triples in this store once it is
+            computed, until the next :meth:`commit` or :meth:`rollback`.
+            Changes made to the database by other connections are not
+            seen while it is kept.
+
+        :param schema_cache:
+            If non-null, the path of a file in which the reflected schema is
+            kept between processes.  The file is keyed by a fingerprint of
+            the database's catalog (``pg_catalog`` in PostgreSQL,
+            ``sqlite_master`` in SQLite), which is computed by a few cheap
+            queries.  If the fingerprint matches, the schema is loaded from
+            the file instead of being reflected; otherwise, it is reflected
+            and the file is rewritten.  The cache is not used for other
+            dialects or if this store was given *rdb_metadata*.
+        :type schema_cache: :obj:`str` or null
+
+        :param bool lazy:
+            Whether the tables are reflected and mapped on demand instead of
+            all at once.  If true, only the names of the tables are read
+            from the database's catalog (or from the *schema_cache*, which
+            then holds the whole schema); each table is reflected and
+            mapped, along with the tables that its foreign keys reference,
+            when a triple pattern, node, or predicate first refers to it.
+            Matching that spans all tables, such as a pattern whose subject
+            is unbound, maps all remaining tables first.  This is ignored if
+            this store was given *orm_classes* or if *reflect* is false.
+
+        :param bool cache_patterns:
+            Whether to keep the results of :meth:`triples` in a
+            least-recently-used cache keyed by their patterns, until the
+            next :meth:`commit`, :meth:`rollback`, or write through this
+            store.  A result is cached only once it has been consumed
+            completely.  Changes made to the database by other connections
+            are not seen while a result is kept.  The cache's effectiveness
+            is reported by :attr:`pattern_cache_stats`.
+
+        :param int pattern_cache_size:
+            The maximum number of results in the pattern cache.
+
+        :param int pattern_cache_bytes:
+            The maximum approximate size of the results in the pattern
+            cache, in bytes.  Larger results are not cached.
+
+        :param int write_batch_size:
+            The number of rows of :meth:`add`\ ed triples that are buffered
+            before they are flushed.
+
+        :param bool thread_safe:
+            Whether this store may be used by many threads at once.  If
+            true, each thread queries and writes in its own session, which
+            checks out a connection from the engine's pool when it is first
+            needed and returns it when the thread calls :meth:`commit` or
+            :meth:`rollback`; no other connection is held.  Each thread
+            also has its own buffer of :meth:`add`\ ed rows, cached length,
+            and pattern cache.  The mapping of the tables is shared; in
+            *lazy* mode, the tables are mapped by one thread at a time.  The
+            engine's connection pool must allow as many connections as
+            there are threads with open transactions.  This store must have
+            been given no *orm* or a
+            :class:`~sqlalchemy.orm.scoping.scoped_session`.
+
+        """
+
+        if stream_results and stream_batch_size < 1:
+            raise ValueError('invalid stream batch size {!r}: expecting a'
+                              ' positive integer'
+                              .format(stream_batch_size))
+
+        if keyset_page_size is not None and keyset_page_size < 1:
+            raise ValueError('invalid keyset page size {!r}: expecting a'
+                              ' positive integer'
+                              .format(keyset_page_size))
+
+        if table_workers < 1:
+            raise ValueError('invalid number of table workers {!r}:'
+                              ' expecting a positive integer'
+                              .format(table_workers))
+
+        if table_queue_size < 1:
+            raise ValueError('invalid table queue size {!r}: expecting a'
+                              ' positive integer'
+                              .format(table_queue_size))
+
+        if len_mode not in _LEN_MODES:
+            raise ValueError('invalid length mode {!r}: expecting one of {}'
+                              .format(len_mode, _LEN_MODES))
+
+        if cache_patterns and pattern_cache_size < 1:
+            raise ValueError('invalid pattern cache size {!r}: expecting a'
+                              ' positive integer'
+                              .format(pattern_cache_size))
+
+        if cache_patterns and pattern_cache_bytes < 1:
+            raise ValueError('invalid pattern cache bytes {!r}: expecting a'
+                              ' positive integer'
+                              .format(pattern_cache_bytes))
+
+        if write_batch_size < 1:
+            raise ValueError('invalid write batch size {!r}: expecting a'
+                              ' positive integer'
+                              .format(write_batch_size))
+
+        if thread_safe and self._orm is not None \
+               and not isinstance(self._orm, _sqla_orm.scoped_session):
+            raise ValueError('invalid ORM session {!r} for thread-safe mode:'
+                              ' expecting a scoped session'
+                              .format(self._orm))
 
         self._rdb = self._rdb_from_configuration(configuration)
+        _common.load_dialect_sql_types(self._rdb.dialect.name)
 
         if create and self._rdb_metadata:
             self.create(self._rdb)
 
+        lazy = lazy and reflect and self._orm_classes is None
+
         if self._orm_classes is None:
-            self.OrmBase = _dm.orm_automap_base(name='OrmBase',
-                                                base_iri=self.base_iri,
-                                                bind=self._rdb,
-                                                metadata=self._rdb_metadata)
-            self.OrmBase.prepare(reflect=reflect)
-            self._rdb_metadata = self.OrmBase.metadata
-            self._orm_classes = \
-                _frozendict((self._table_iri(class_.__table__.name), class_)
-                            for class_ in self.OrmBase.classes)
+            if reflect and schema_cache is not None \
+                   and self._rdb_metadata is None:
+                self._rdb_metadata = self._cached_rdb_metadata(schema_cache)
+                tablesnames = self._rdb_metadata.tables.keys()
+                reflect = False
+            elif lazy:
+                tablesnames = _sqla.inspect(self._rdb).get_table_names()
+
+            if lazy:
+                self.OrmBase = _dm.orm_declarative_base(name='OrmBase',
+                                                        base_iri=self.base_iri,
+                                                        bind=self._rdb,
+                                                        metadata=
+                                                            self._rdb_metadata)
+                self._rdb_metadata = self.OrmBase.metadata
+                self._orm_unmapped_tables = \
+                    {self._table_iri(tablename): tablename
+                     for tablename in tablesnames}
+                self._orm_classes_by_table = {}
+                self._orm_classes = self._lazy_tables_index()
+            else:
+                self.OrmBase = \
+                    _dm.orm_automap_base(name='OrmBase',
+                                         base_iri=self.base_iri,
+                                         bind=self._rdb,
+                                         metadata=self._rdb_metadata)
+                self.OrmBase.prepare(reflect=reflect)
+                self._rdb_metadata = self.OrmBase.metadata
+                self._orm_classes = \
+                    _frozendict((self._table_iri(class_.__table__.name),
+                                 class_)
+                                for class_ in self.OrmBase.classes)
 
         if self._orm_mappers is None:
-            mappers_items = []
-            colprops_items = []
-            cols_datatypes_items = []
-            rels_items = []
-            bnode_tables = set()
-            for table_iri, class_ in self._orm_classes.items():
-                class_mapper = _sqla.inspect(class_)
-                props = _orm_column_property_by_name(mapper=class_mapper)
-
-                mappers_items.append((table_iri, class_mapper))
-                colprops_items.append((table_iri, props))
-                cols_datatypes_items\
-                 .append((table_iri,
-                          {colname: _common.canon_rdf_datatype_from_sql
-                                     (prop.columns[0].type)
-                           for colname, prop in props.items()}))
-                rels_items\
-                 .append((table_iri,
-                          _orm_relationship_by_local_column_names
-                           (mapper=class_mapper)))
-                if class_mapper.has_pseudo_primary_key:
-                    bnode_tables.add(table_iri)
-            self._orm_mappers = _frozendict(mappers_items)
-            self._orm_columns_properties = _frozendict(colprops_items)
-            self._orm_columns_rdf_datatypes = _frozendict(cols_datatypes_items)
-            self._orm_relationships = _frozendict(rels_items)
-            self._orm_bnode_tables = frozenset(bnode_tables)
+            if lazy:
+                self._orm_mappers = self._lazy_tables_index()
+                self._orm_columns_properties = self._lazy_tables_index()
+                self._orm_columns_rdf_datatypes = self._lazy_tables_index()
+                self._orm_relationships = self._lazy_tables_index()
+                self._orm_bnode_tables = \
+                    _LazySet(self._map_table, self._map_all_tables)
+                self._orm_predicates = \
+                    _LazyIndex(self._map_predicate_table,
+                               self._map_all_tables)
+                self._orm_row_node_funcs = self._lazy_tables_index()
+                self._orm_row_ntriples_funcs = self._lazy_tables_index()
+                self._orm_projectors = self._lazy_tables_index()
+                # the references into a table can be in any table
+                self._orm_inbound_refs = \
+                    _LazyIndex(lambda table_iri: self._map_all_tables(),
+                               self._map_all_tables)
+                self._orm_inbound_refs_stale = True
+            else:
+                self._orm_mappers = {}
+                self._orm_columns_properties = {}
+                self._orm_columns_rdf_datatypes = {}
+                self._orm_relationships = {}
+                self._orm_bnode_tables = set()
+                self._orm_predicates = {}
+                self._orm_row_node_funcs = {}
+                self._orm_row_ntriples_funcs = {}
+                self._orm_projectors = {}
+                self._map_orm_classes(self._orm_classes.items())
+                self._orm_inbound_refs = self._compile_inbound_refs()
 
         if self._orm is None:
-            self._orm = _sqla_orm.sessionmaker(bind=self._rdb)()
-        self._rdb_transaction = self._rdb.begin().transaction
+            orm_factory = _sqla_orm.sessionmaker(bind=self._rdb)
+            self._orm = _sqla_orm.scoped_session(orm_factory) \
+                            if thread_safe else orm_factory()
+        # in thread-safe mode, no connection is held outside the threads'
+        # sessions
+        self._rdb_transaction = \
+            None if thread_safe else self._rdb.begin().transaction
+        self._opened = True
+        self._thread_safe = thread_safe
+
+        self._stream_results = stream_results
+        self._stream_batch_size = stream_batch_size
+        self._keyset_page_size = keyset_page_size
+        self._table_workers = table_workers
+        self._table_queue_size = table_queue_size
+        self._len_mode = len_mode
+        self._cache_len = cache_len
+        self._write_batch_size = write_batch_size
+        session_state_class = \
+            _ThreadSessionState if thread_safe else _SessionState
+        self._session_state = \
+            session_state_class(cache_patterns=cache_patterns,
+                                pattern_cache_size=pattern_cache_size,
+                                pattern_cache_bytes=pattern_cache_bytes)
 
     @property
     def orm_classes(self):
         return self._orm_classes
 
+    @property
+    def pattern_cache_stats(self):
+
+        """The statistics of this store's pattern cache
+
+        The counts of hits, misses, and evictions accumulate from the time
+        this store is opened.  If it was opened with *thread_safe*, these
+        are the statistics of the current thread's pattern cache.
+
+        :type: :class:`PatternCacheStats` or null if this store was not
+            opened with *cache_patterns*
+
+        """
+
+        pattern_cache = self._session_state.pattern_cache
+        if pattern_cache is None:
+            return None
+        return pattern_cache.stats()
+
     def prefix(self, namespace):
         try:
             return self._prefix_by_namespace[namespace]
@@ -290,13 +706,334 @@ class DirectMapping(_rdf.store.Store):
 
     def remove(self, (subject, predicate, object), context=None):
 
-        # FIXME
+        """Remove the triples that match a pattern.
+
+        The pattern is mapped onto statements that remove its triples from
+        each table at once, without matching them first:
+
+          :samp:`({row}, rdf:type, {table})`
+            The row is deleted.
+
+          :samp:`({row}, {table}#{column}, {literal})`
+            The column is set to null if it holds the literal's value.
+
+          :samp:`({row}, {table}#ref-{columns}, {referenced row})`
+            The columns are set to null if they reference the referenced
+            row.
+
+        Any term can be :obj:`None`.  A null subject matches the rows of
+        all tables, or of the predicate's table, with one statement per
+        table.  A null predicate with a null object deletes the rows, and
+        with an object, removes it from each column or reference that can
+        hold it.  The rows of several tables are deleted in the reverse
+        order of their foreign keys.  References to deleted rows from rows
+        that are not deleted are left to the database's foreign key
+        constraints.
+
+        Since the mapping is of whole rows and columns, a removal can
+        remove other triples too: deleting a row removes all of its
+        triples, and setting a reference's columns to null removes their
+        literal property triples along with the reference triple, and vice
+        versa.  In a table without a primary key, the nodes of rows are
+        formed from their values, so setting a value to null also changes
+        the subject of the row's other triples.
+
+        Rows buffered by :meth:`add` are flushed first.
 
-        super(DirectMapping, self).remove((subject, predicate, object),
-                                          context=context)
+        :raise ValueError:
+            Raised if *context* is not the default context, or if a
+            matching value is in a primary key or ``NOT NULL`` column,
+            which cannot be set to null.  No statements are executed then.
+
+        """
+
+        if not self._is_default_context(context):
+            raise ValueError('cannot remove triples from context {!r}'
+                              .format(context))
+
+        self.flush()
+
+        criteria = ()
+        if subject is None:
+            if predicate is None:
+                if object is None or isinstance(object, _rdf.Literal):
+                    tables_iris = self._orm_mappers.keys()
+                elif object in self._orm_mappers:
+                    tables_iris = (object,)
+                else:
+                    try:
+                        object_table_iri, _ = self._parse_row_node(object)
+                    except (TypeError, ValueError, KeyError):
+                        return
+                    # only the tables that reference the object's table can
+                    # hold it
+                    tables_iris = \
+                        self._orm_inbound_refs.get(object_table_iri, {})\
+                                              .keys()
+
+            elif predicate == _RDF_TYPE:
+                if object is None:
+                    tables_iris = self._orm_mappers.keys()
+                elif object in self._orm_mappers:
+                    tables_iris = (object,)
+                else:
+                    return
+
+            else:
+                try:
+                    tables_iris = (self._predicate_info(predicate).table_iri,)
+                except (TypeError, ValueError):
+                    return
+
+        elif isinstance(subject, (_rdf.URIRef, _rdf.BNode)):
+            try:
+                table_iri, pkey = self._parse_row_node(subject)
+            except (TypeError, ValueError, KeyError):
+                return
+            tables_iris = (table_iri,)
+            criteria = tuple(attr == value for attr, value in pkey.items())
+
+        else:
+            return
+
+        tables_iris_by_table = \
+            {self._orm_mappers[table_iri].local_table: table_iri
+             for table_iri in tables_iris}
+        statements = []
+        for table in reversed(_sorted_tables(tables_iris_by_table
+                                                  .keys())):
+            statements.extend(self._table_removal_statements
+                               (tables_iris_by_table[table], predicate,
+                                object, criteria=criteria))
+
+        for statement in statements:
+            self._orm.execute(statement)
+        self._invalidate_caches()
+
+    @property
+    def rdb(self):
+        """The database of this store
+
+        :type: :class:`sqlalchemy.engine.interfaces.Connectable`
+
+        """
+        return self._rdb
 
     def rollback(self):
-        self._rdb_transaction.rollback()
+        self._session_state.clear_pending()
+        self._orm.rollback()
+        if self._rdb_transaction is not None:
+            self._rdb_transaction.rollback()
+        self._invalidate_caches()
+
+    def row_values(self, subject, predicates_objects):
+
+        """Map a row's triples onto the row's values.
+
+        This maps the triples as :meth:`add` does, but returns the row's
+        values instead of buffering them.
+
+        :param subject:
+            The row node.
+        :type subject: :class:`rdflib.URIRef` or :class:`rdflib.BNode`
+
+        :param predicates_objects:
+            The predicates and objects of the row's triples.
+        :type predicates_objects:
+            ~[(:class:`rdflib.URIRef`, :class:`rdflib.term.Node`)]
+
+        :return:
+            The IRI of the row's table and a mapping of the keys of its
+            columns to their values.  It has the values of the key columns
+            and of the columns of the given triples' properties.  In a table
+            without a primary key, the key columns' values are those of the
+            literal property triples, or null if there are none, since the
+            node does not tell nulls from the string ``'None'``.
+        :rtype: (:class:`rdflib.URIRef`, {:obj:`str`: object})
+
+        :raise ValueError:
+            Raised if the triples are not in the direct mapping of the
+            subject's table.
+
+        """
+
+        table_iri, values = self._row_node_key_values(subject)
+        mapper = self._orm_mappers[table_iri]
+        if mapper.has_pseudo_primary_key:
+            values = {}
+
+        for predicate, object in predicates_objects:
+            self._update_row_values(table_iri, values, subject, predicate,
+                                    object, self._row_node_key_values)
+
+        if mapper.has_pseudo_primary_key:
+            for col in mapper.primary_key:
+                values.setdefault(col.key, None)
+        return table_iri, values
+
+    @property
+    def supports_sql_rendering(self):
+        """Whether :meth:`table_ntriples` can render statements in SQL"""
+        return self._rdb.dialect.name in _SQL_RENDERING_DIALECTS
+
+    def table_key_ranges(self, table_iri, count):
+
+        """Partition a table's rows into ranges of keys.
+
+        The rows are ordered by key as in a keyset scan (see the
+        *keyset_page_size* parameter of :meth:`open`).  If the key is a single
+        integer column, its span between the minimum and maximum values is
+        split evenly.  Otherwise the table is split at evenly spaced row
+        offsets.
+
+        :param table_iri:
+            The IRI of a mapped table.
+        :type table_iri: :class:`rdflib.URIRef`
+
+        :param int count:
+            The number of ranges.  Fewer ranges may be returned if the table
+            has too few distinct keys.
+
+        :return:
+            The key ranges, in key order, as pairs of the form
+            :samp:`({lower}, {upper})`, where *lower* is the least key in the
+            range and *upper* is the least key beyond the range, or either is
+            null if the range is unbounded on that side.
+        :rtype: [(~(object) or null, ~(object) or null)]
+
+        :raise KeyError:
+            Raised if *table_iri* is not the IRI of a mapped table.
+
+        """
+
+        if count < 1:
+            raise ValueError('invalid key range count {!r}: expecting a'
+                              ' positive integer'
+                              .format(count))
+
+        self.flush()
+
+        key_cols, key_nullables = self._table_keyset_columns(table_iri)
+
+        bounds = []
+        if len(key_cols) == 1 and not key_nullables[0] \
+               and isinstance(key_cols[0].type, _sqla.Integer):
+            key_col, = key_cols
+            key_min, key_max = \
+                self._orm.query(_sqlaf.min(key_col), _sqlaf.max(key_col))\
+                         .one()
+            if key_min is not None:
+                span = key_max - key_min + 1
+                for i in range(1, count):
+                    bound = (key_min + span * i // count,)
+                    if bound[0] > key_min and bound not in bounds:
+                        bounds.append(bound)
+
+        else:
+            nrows = self._orm.query(_sqlaf.count())\
+                             .select_from(self._orm_mappers[table_iri]
+                                           .local_table)\
+                             .scalar()
+            query = \
+                self._orm.query(*key_cols)\
+                         .order_by(*_keyset_order_by(key_cols, key_nullables))
+            for i in range(1, count):
+                offset = nrows * i // count
+                if not offset:
+                    continue
+                bound = tuple(query.offset(offset).limit(1).one())
+                if not bounds or bound != bounds[-1]:
+                    bounds.append(bound)
+
+        lower_bounds = [None] + bounds
+        upper_bounds = bounds + [None]
+        return zip(lower_bounds, upper_bounds)
+
+    def table_ntriples(self, table_iri, key_range=None, sql_rendering=False):
+
+        """The `N-Triples`_ statements that describe a table's rows.
+
+        The statements are those of the triples of :meth:`table_triples`,
+        formatted directly from the rows' values without constructing
+        :mod:`rdflib` terms.  Characters outside ASCII are not escaped; to
+        match :mod:`rdflib`'s N-Triples serializer, encode the text with
+        ``text.encode('ascii', '_rdflib_nt_escape')``.
+
+        :param table_iri:
+            The IRI of a mapped table.
+        :type table_iri: :class:`rdflib.URIRef`
+
+        :param key_range:
+            If non-null, only the rows in this range of keys are described.
+            See :meth:`table_key_ranges`.
+        :type key_range: (~(object) or null, ~(object) or null) or null
+
+        :param bool sql_rendering:
+            Whether the statements are concatenated by the database as far
+            as it can format their terms.  This is supported for PostgreSQL
+            and SQLite.
+
+        :return:
+            The statements, as one newline-terminated text per row.
+        :rtype: ~[:obj:`unicode`]
+
+        :raise KeyError:
+            Raised if *table_iri* is not the IRI of a mapped table.
+
+        :raise ValueError:
+            Raised if *sql_rendering* is requested for a database whose
+            dialect is not supported.
+
+        """
+
+        if table_iri not in self._orm_mappers:
+            raise KeyError(table_iri)
+
+        self.flush()
+
+        criteria = self._table_key_range_criteria(table_iri, key_range)
+        if sql_rendering:
+            if not self.supports_sql_rendering:
+                raise ValueError('cannot render N-Triples in SQL for dialect'
+                                  ' {!r}'.format(self._rdb.dialect.name))
+            return self._table_sql_ntriples(table_iri, criteria=criteria)
+        else:
+            return self._table_python_ntriples(table_iri, criteria=criteria)
+
+    def table_triples(self, table_iri, key_range=None):
+
+        """The triples that describe a table's rows.
+
+        :param table_iri:
+            The IRI of a mapped table.
+        :type table_iri: :class:`rdflib.URIRef`
+
+        :param key_range:
+            If non-null, only the rows in this range of keys are described.
+            See :meth:`table_key_ranges`.
+        :type key_range: (~(object) or null, ~(object) or null) or null
+
+        :return:
+            The triples.
+        :rtype: ~[(:class:`rdflib.URIRef` or :class:`rdflib.BNode`,
+                   :class:`rdflib.URIRef`,
+                   :class:`rdflib.URIRef` or :class:`rdflib.BNode`
+                     or :class:`rdflib.Literal`)]
+
+        :raise KeyError:
+            Raised if *table_iri* is not the IRI of a mapped table.
+
+        """
+
+        if table_iri not in self._orm_mappers:
+            raise KeyError(table_iri)
+
+        self.flush()
+
+        return self._table_allpredicates_triples(
+                   table_iri, None,
+                   criteria=self._table_key_range_criteria(table_iri,
+                                                           key_range))
 
     transaction_aware = True
 
@@ -369,115 +1106,1242 @@ class DirectMapping(_rdf.store.Store):
                      or :class:`rdflib.Literal` or :class:`rdflib.Date`
                      or :class:`rdflib.DateRange`)]
 
+        If this store was opened with *cache_patterns*, the results are
+        kept in the pattern cache.
+
         """
 
-        if context is not None \
-               and not (isinstance(context, _rdf.Graph)
-                        and isinstance(context.identifier, _rdf.BNode)):
-            return
+        if not self._is_default_context(context):
+            return iter(())
 
-        if subject_pattern is None:
-            if predicate_pattern is None:
-                for subject_table_iri in self._orm_classes.keys():
-                    for triple \
-                            in self._table_allpredicates_triples\
-                                (subject_table_iri, object_pattern):
-                        yield triple, None
+        self.flush()
 
-            elif predicate_pattern == _rdf.RDF.type:
-                if object_pattern is None:
-                    for subject_table_iri in self._orm_classes.keys():
-                        for triple \
-                                in self._table_type_triples(subject_table_iri):
-                            yield triple, None
-                elif isinstance(object_pattern, _rdf.URIRef):
-                    for triple in self._table_type_triples(object_pattern):
-                        yield triple, None
-                else:
-                    return
+        pattern = (subject_pattern, predicate_pattern, object_pattern)
+        pattern_cache = self._session_state.pattern_cache
+        if pattern_cache is None:
+            return self._pattern_triples(pattern)
 
-            elif isinstance(predicate_pattern, _rdf.URIRef):
-                try:
-                    predicate_attr = \
-                        self._predicate_orm_attr(predicate_pattern)
-                except ValueError:
-                    return
-                predicate_prop = predicate_attr.property
-                subject_table_iri = \
-                    self._table_iri(predicate_prop.parent.mapped_table)
+        triples = pattern_cache.get(pattern)
+        if triples is not None:
+            return ((triple, None) for triple in triples)
+        return pattern_cache.fill(pattern,
+                                  self._pattern_triples(pattern))
 
-                for triple in self._table_predicate_triples(subject_table_iri,
-                                                            predicate_pattern,
-                                                            object_pattern):
-                    yield triple, None
+    def triples_choices(self, (subject_pattern, predicate_pattern,
+                               object_pattern),
+                        context=None):
 
-            else:
-                return
+        """Match triples with alternatives.
 
-        elif isinstance(subject_pattern, (_rdf.URIRef, _rdf.BNode)):
-            for triple in self._subject_triples(subject_pattern,
-                                                predicate_pattern,
-                                                object_pattern):
-                yield triple, None
+        This is like :meth:`triples`, except that one of the patterns may be
+        a list of alternatives.  An empty list matches anything.  Rather
+        than matching each alternative separately, the alternatives are
+        grouped by table and matched with ``IN`` clauses:
 
-        else:
+          list of subjects
+            The subjects are grouped by table, and each table's pattern is
+            matched for a chunk of subjects per query.
+
+          list of predicates with a null object pattern
+            The predicates are grouped by table, and each table's rows are
+            described with the predicates' properties in one query.
+
+          list of objects with a literal or reference property predicate
+            The objects are matched with one query per chunk of objects.
+
+        Other combinations are matched for each alternative separately.
+
+        """
+
+        if not self._is_default_context(context):
             return
 
+        self.flush()
+
+        if isinstance(subject_pattern, list) and subject_pattern:
+            triples = self._subjects_choices_triples(subject_pattern,
+                                                     predicate_pattern,
+                                                     object_pattern)
+        elif isinstance(predicate_pattern, list) and predicate_pattern:
+            triples = self._predicates_choices_triples(subject_pattern,
+                                                       predicate_pattern,
+                                                       object_pattern)
+        elif isinstance(object_pattern, list) and object_pattern:
+            triples = self._objects_choices_triples(subject_pattern,
+                                                    predicate_pattern,
+                                                    object_pattern)
+        else:
+            triples = (triple
+                       for triple, _
+                       in self.triples(tuple(None
+                                             if isinstance(pattern, list)
+                                             else pattern
+                                             for pattern
+                                             in (subject_pattern,
+                                                 predicate_pattern,
+                                                 object_pattern))))
+
+        for triple in triples:
+            yield triple, None
+
     transaction_aware = True
 
-    def _literal_property_iri(self, table_iri, colname):
-        return _rdf.URIRef(u'{}#{}'.format(table_iri,
-                                           _common.iri_safe(colname)))
+    def _add_pending_value(self, subject, predicate, object):
 
-    def _parse_row_node(self, node):
+        """Buffer the row value of a triple
+
+        .. seealso:: :meth:`add`
+
+        """
 
+        table_iri, values = self._pending_node_key_values(subject)
+        self._update_row_values(table_iri, values, subject, predicate,
+                                object, self._pending_node_key_values)
+
+        state = self._session_state
+        pkey_cols = self._orm_mappers[table_iri].primary_key
+        key = tuple(values[col.key] for col in pkey_cols)
+        table_rows = state.pending_rows.setdefault(table_iri, {})
         try:
-            table_iri_str, _, pkeyspec = node.rpartition('/')
-        except AttributeError:
-            raise TypeError(u'invalid row node {!r}: not a string'
-                             .format(node))
+            row = table_rows[key]
+        except KeyError:
+            table_rows[key] = values
+            state.pending_rows_len += 1
+        else:
+            row.update(values)
 
-        if not table_iri_str or '=' not in pkeyspec:
-            raise ValueError\
-                   (u'invalid row node {!r}: does not match format {!r}'
-                     .format(node, 'table/colname=value[;colname=value]...'))
+        if state.pending_rows_len >= self._write_batch_size:
+            self.flush()
 
-        table_iri = _rdf.URIRef(table_iri_str)
+    def _approximate_len(self):
 
-        if table_iri in self._orm_bnode_tables:
-            if not isinstance(node, _rdf.BNode):
-                raise ValueError('invalid node type {!r} for blank node table'
-                                  ' {!r}: not blank node'
-                                  .format(node.__class__, table_iri))
+        dialect_name = self._rdb.dialect.name
+        if dialect_name == 'postgresql':
+            estimates = self._postgresql_tables_len_estimates()
+        elif dialect_name == 'sqlite':
+            estimates = self._sqlite_tables_len_estimates()
         else:
-            if not isinstance(node, _rdf.URIRef):
-                raise ValueError('invalid node type {!r} for IRI node table'
-                                  ' {!r}: not IRI node'
-                                  .format(node.__class__, table_iri))
+            estimates = {}
 
-        pkey = {}
-        cols_props = self._orm_columns_properties[table_iri]
-        cols_datatypes = self._orm_columns_rdf_datatypes[table_iri]
-        for name_irisafe, value_irisafe in (item.split('=')
-                                            for item in pkeyspec.split(';')):
-            colname = _pct_decoded(name_irisafe)
-            value_rdf = _rdf.Literal(_pct_decoded(value_irisafe),
-                                     datatype=cols_datatypes[colname])
-            pkey[cols_props[colname].class_attribute] = \
-                _common.sql_literal_from_rdf(value_rdf)
+        return int(round(sum(estimates.values()))) \
+               + self._tables_len(table_iri for table_iri in self._orm_mappers
+                                  if table_iri not in estimates)
 
-        return table_iri, pkey
+    def _cached_rdb_metadata(self, path):
 
-    def _predicate_orm_attr(self, iri):
+        """The database's reflected schema, kept in a file at *path*
 
-        try:
-            table_iri_str, _, colspec = iri.partition('#')
-        except AttributeError:
-            raise TypeError(u'invalid predicate IRI {!r}: not a string'
-                             .format(iri))
+        The metadata is cached as reflected, before the pseudo primary keys
+        of :func:`rdb2rdf.dm.orm_automap_base` are added to it.
 
-        if not table_iri_str or not colspec:
-            raise ValueError(u'invalid predicate IRI {!r}:'
+        """
+
+        fingerprint = self._schema_fingerprint()
+        if fingerprint is not None:
+            metadata = _load_schema_cache(path, fingerprint)
+            if metadata is not None:
+                return metadata
+
+        metadata = _sqla.MetaData()
+        metadata.reflect(bind=self._rdb)
+        if fingerprint is not None:
+            _dump_schema_cache(path, fingerprint, metadata)
+        return metadata
+
+    def _choices_triples(self, patterns, choices_index, choices):
+        """Match triples for each alternative separately."""
+        patterns = list(patterns)
+        for choice in set(choices):
+            patterns[choices_index] = choice
+            for triple, _ in self.triples(tuple(patterns)):
+                yield triple
+
+    def _compile_bgp(self, patterns):
+
+        if not patterns:
+            raise NotImplementedError('empty basic graph pattern')
+
+        # determine the table of each node term and collect the literal
+        # property constraints and the reference property joins; return
+        # null as soon as the pattern is found to have no solutions
+
+        node_table_iris = {}
+        node_pkeys = {}
+        literal_props_by_var = {}
+        literal_constraints = []
+        refs = []
+
+        def add_node(node, table_iri):
+
+            if node in node_table_iris:
+                return node_table_iris[node] == table_iri
+
+            if isinstance(node, _rdf.Variable):
+                node_table_iris[node] = table_iri
+                return True
+
+            try:
+                node_table_iri, node_pkey = self._parse_row_node(node)
+            except (TypeError, ValueError, KeyError):
+                return False
+            if node_table_iri != table_iri:
+                return False
+            node_table_iris[node] = table_iri
+            node_pkeys[node] = node_pkey
+            return True
+
+        for subject, predicate, object_ in patterns:
+            if isinstance(predicate, _rdf.Variable):
+                raise NotImplementedError('variable predicate {!r}'
+                                           .format(predicate))
+
+            if not isinstance(subject,
+                              (_rdf.Variable, _rdf.URIRef, _rdf.BNode)) \
+                   or not isinstance(predicate, _rdf.URIRef):
+                return None
+
+            if predicate == _rdf.RDF.type:
+                if isinstance(object_, _rdf.Variable):
+                    raise NotImplementedError('variable class {!r}'
+                                               .format(object_))
+                if object_ not in self._orm_mappers \
+                       or not add_node(subject, object_):
+                    return None
+                continue
+
+            try:
+                predicate_info = self._predicate_info(predicate)
+            except ValueError:
+                return None
+            predicate_prop = predicate_info.attr.property
+            if not add_node(subject, predicate_info.table_iri):
+                return None
+
+            if predicate_info.object_table_iri is not None:
+                if not isinstance(object_,
+                                  (_rdf.Variable, _rdf.URIRef, _rdf.BNode)) \
+                       or not add_node(object_,
+                                       predicate_info.object_table_iri):
+                    return None
+                refs.append((subject, predicate_prop, object_))
+
+            elif isinstance(object_, _rdf.Variable):
+                literal_props_by_var.setdefault(object_, [])\
+                 .append((subject, predicate_prop))
+
+            elif isinstance(object_, _rdf.Literal):
+                if object_.datatype not in predicate_info.rdf_datatypes:
+                    return None
+                literal_constraints\
+                 .append((subject, predicate_prop,
+                          _common.sql_literal_from_rdf(object_)))
+
+            else:
+                return None
+
+        if any(var in node_table_iris for var in literal_props_by_var):
+            # a literal is never a node
+            return None
+
+        # build the query
+
+        aliases = {node: _sqla_orm.aliased(self._orm_classes[table_iri])
+                   for node, table_iri in node_table_iris.items()}
+
+        def alias_attr(node, prop):
+            return getattr(aliases[node], prop.key)
+
+        def alias_col_attr(node, col):
+            mapper = self._orm_mappers[node_table_iris[node]]
+            return alias_attr(node, mapper.get_property_by_column(col))
+
+        criteria = []
+
+        for node, node_pkey in node_pkeys.items():
+            criteria.extend(getattr(aliases[node], attr.key) == value
+                            for attr, value in node_pkey.items())
+
+        for subject, predicate_prop, value in literal_constraints:
+            criteria.append(alias_attr(subject, predicate_prop) == value)
+
+        for var, subject_props in literal_props_by_var.items():
+            (subject, predicate_prop), others = \
+                subject_props[0], subject_props[1:]
+            datatype = \
+                _common.canon_rdf_datatype_from_sql(predicate_prop.columns[0]
+                                                     .type)
+            var_attr = alias_attr(subject, predicate_prop)
+            criteria.append(var_attr != None)
+            for other_subject, other_prop in others:
+                if _common.canon_rdf_datatype_from_sql(other_prop.columns[0]
+                                                        .type) \
+                       != datatype:
+                    return None
+                criteria.append(alias_attr(other_subject, other_prop)
+                                 == var_attr)
+
+        for subject, predicate_prop, object_ in refs:
+            criteria.extend(alias_col_attr(subject, local_col)
+                             == alias_col_attr(object_, remote_col)
+                            for local_col, remote_col
+                            in predicate_prop.local_remote_pairs)
+
+        # select the columns from which the variables' values are rendered
+
+        entities = []
+        solution_items_funcs = []
+
+        for node, table_iri in node_table_iris.items():
+            if not isinstance(node, _rdf.Variable):
+                continue
+            pkey_cols = self._orm_mappers[table_iri].primary_key
+            solution_items_funcs\
+             .append((node, len(entities), len(pkey_cols),
+                      _partial(lambda node_from_sql, pkey_cols, values:
+                                   node_from_sql(zip(pkey_cols, values)),
+                               self._row_node_from_sql_func(table_iri),
+                               pkey_cols)))
+            entities.extend(alias_col_attr(node, col) for col in pkey_cols)
+
+        for var, subject_props in literal_props_by_var.items():
+            subject, predicate_prop = subject_props[0]
+            predicate_col, = predicate_prop.columns
+            solution_items_funcs\
+             .append((var, len(entities), 1,
+                      _partial(lambda sql_type, values:
+                                   _common.rdf_literal_from_sql
+                                    (values[0], sql_type=sql_type),
+                               predicate_col.type)))
+            entities.append(alias_attr(subject, predicate_prop))
+
+        if entities:
+            query = self._orm.query(*entities).filter(*criteria)
+            if any(table_iri in self._orm_bnode_tables
+                   for table_iri in node_table_iris.values()):
+                query = query.distinct()
+        else:
+            query = self._orm.query(_sqla.literal(1))\
+                             .select_from(*aliases.values())\
+                             .filter(*criteria)\
+                             .limit(1)
+
+        def solution_from_row(row):
+            return {var: value_from_sql(row[start:start + length])
+                    for var, start, length, value_from_sql
+                    in solution_items_funcs}
+
+        return query, solution_from_row
+
+    def _compile_inbound_refs(self):
+
+        """Compile the index of the references into each table
+
+        The index maps the IRI of each referenced table to a mapping of the
+        IRI of each referencing table to the :class:`_InboundRef`\ s of its
+        references.
+
+        """
+
+        refs = {}
+        for table_iri, rels in self._orm_relationships.items():
+            cols_props = self._orm_columns_properties[table_iri]
+            for rel in rels.values():
+                object_table = rel.target
+                object_key_attrs = \
+                    _orm_relationship_object_key_attrs(rel, cols_props)
+                if object_key_attrs is not None:
+                    local_attr_by_remote_colname = \
+                        dict(zip((col.name
+                                  for col in object_table.primary_key.columns),
+                                 object_key_attrs))
+                else:
+                    # the referenced columns are not the referenced table's
+                    # key, so they are matched by joining it
+                    local_attr_by_remote_colname = None
+                refs.setdefault(self._table_iri(object_table.name), {})\
+                    .setdefault(table_iri, [])\
+                    .append(_InboundRef
+                             (attr=rel.class_attribute,
+                              predicate_iri=
+                                  self._ref_property_iri
+                                   (table_iri,
+                                    _orm_relationship_local_column_names
+                                     (rel)),
+                              local_attr_by_remote_colname=
+                                  local_attr_by_remote_colname))
+
+        return _frozendict((object_table_iri,
+                            _frozendict((table_iri, tuple(table_refs))
+                                        for table_iri, table_refs
+                                        in tables_refs.items()))
+                           for object_table_iri, tables_refs in refs.items())
+
+    def _compile_row_str_func(self, table_iri):
+
+        """Compile a function that maps a row's key values to its node's string
+
+        The function is equivalent to :meth:`_row_str_from_sql`, but it
+        takes the key values alone, formats only their parts of the string,
+        and does not construct RDF literals from them.
+
+        """
+
+        prefix = u'{}/'.format(table_iri)
+        key_items = [(u'{}='.format(_common.iri_safe(col.name)),
+                      _common.rdf_lexical_from_sql_func(col.type))
+                     for col in self._orm_mappers[table_iri].primary_key]
+        iri_safe = _common.iri_safe
+
+        def row_str_from_sql(values):
+            return prefix + u';'.join(key + iri_safe(rdf_lexical_from_sql
+                                                      (value))
+                                      for (key, rdf_lexical_from_sql), value
+                                      in zip(key_items, values))
+
+        return row_str_from_sql
+
+    def _compile_table_projector(self, table_iri, literal_props=None,
+                                 ref_props=None):
+
+        """Compile a projector of a table's rows onto triples
+
+        The projector selects the table's key columns, the columns of the
+        *literal_props*, and the keys of the rows referenced by the
+        *ref_props*, in that order.  The defaults are all of the table's
+        columns and references.  A referenced row's key is read from the
+        foreign key columns if they reference the primary key, or else from
+        the outer-joined referenced table.
+
+        :rtype: :class:`_TableProjector`
+
+        """
+
+        mapper = self._orm_mappers[table_iri]
+        pkey_cols = tuple(mapper.primary_key)
+
+        if literal_props is None:
+            cols_props = self._orm_columns_properties[table_iri]
+            literal_props = [cols_props[col.name] for col in mapper.columns]
+        if ref_props is None:
+            ref_props = self._orm_relationships[table_iri].values()
+
+        literal_attrs = []
+        literal_items = []
+        ntriples_literal_items = []
+        i = len(pkey_cols)
+        for prop in literal_props:
+            col = prop.columns[0]
+            predicate_iri = self._literal_property_iri(table_iri, col.name)
+            literal_attrs.append(prop.class_attribute)
+            literal_items.append((i, predicate_iri,
+                                  _common.rdf_literal_from_sql_func(col.type)))
+            ntriples_literal_items\
+             .append((i, u'<{}> '.format(predicate_iri),
+                      _common.ntriples_literal_from_sql_func(col.type)))
+            i += 1
+
+        cols_props = self._orm_columns_properties[table_iri]
+        refs = []
+        ref_items = []
+        ntriples_ref_items = []
+        for prop in ref_props:
+            object_table = prop.target
+            object_table_iri = self._table_iri(object_table.name)
+            object_pkey_attrs = \
+                _orm_relationship_object_key_attrs(prop, cols_props)
+            if object_pkey_attrs is not None:
+                # the foreign key holds the referenced row's key, so the
+                # referenced table is not joined
+                refs.append((None, object_pkey_attrs))
+            else:
+                object_cols_props = \
+                    self._orm_columns_properties[object_table_iri]
+                object_pkey_attrs = \
+                    tuple(object_cols_props[col.name].class_attribute
+                          for col in object_table.primary_key.columns)
+                refs.append((prop.class_attribute, object_pkey_attrs))
+            predicate_iri = \
+                self._ref_property_iri(table_iri,
+                                       _orm_relationship_local_column_names
+                                        (prop))
+            ref_items.append((i, i + len(object_pkey_attrs), predicate_iri,
+                              self._orm_row_node_funcs[object_table_iri]))
+            ntriples_ref_items\
+             .append((i, i + len(object_pkey_attrs),
+                      u'<{}> '.format(predicate_iri),
+                      self._orm_row_ntriples_funcs[object_table_iri]))
+            i += len(object_pkey_attrs)
+
+        return _TableProjector(table_iri=table_iri,
+                               pkey_cols=pkey_cols,
+                               literal_attrs=literal_attrs,
+                               refs=refs,
+                               subject_node_from_sql=
+                                   self._orm_row_node_funcs[table_iri],
+                               literal_items=literal_items,
+                               ref_items=ref_items,
+                               subject_ntriples_from_sql=
+                                   self._orm_row_ntriples_funcs[table_iri],
+                               ntriples_literal_items=ntriples_literal_items,
+                               ntriples_ref_items=ntriples_ref_items)
+
+    def _flush_table_rows(self, table_iri, rows_by_key):
+
+        table = self._orm_mappers[table_iri].local_table
+        pkey_cols = self._orm_mappers[table_iri].primary_key
+
+        keys = rows_by_key.keys()
+        existing_keys = set()
+        for i in range(0, len(keys), _KEYS_CHUNK_SIZE):
+            query = _sqla.select(pkey_cols)\
+                         .where(_keys_in(pkey_cols,
+                                         keys[i:i + _KEYS_CHUNK_SIZE]))
+            existing_keys.update(tuple(row)
+                                 for row in self._orm.execute(query))
+
+        # executemany needs the same columns in each row
+        inserts_by_colkeys = {}
+        updates_by_colkeys = {}
+        pkey_colkeys = frozenset(col.key for col in pkey_cols)
+        for key, row in rows_by_key.items():
+            colkeys = frozenset(row)
+            if key not in existing_keys:
+                inserts_by_colkeys.setdefault(colkeys, []).append(row)
+            elif colkeys - pkey_colkeys:
+                updates_by_colkeys.setdefault(colkeys, []).append(row)
+
+        for rows in inserts_by_colkeys.values():
+            self._orm.execute(table.insert(), rows)
+
+        update = \
+            table.update()\
+                 .where(_sqla.and_(*(col
+                                     == _sqla.bindparam
+                                         (_KEY_BINDPARAM_FORMAT.format(i))
+                                     for i, col in enumerate(pkey_cols))))
+        for colkeys, rows in updates_by_colkeys.items():
+            params = []
+            for row in rows:
+                row_params = {colkey: value
+                              for colkey, value in row.items()
+                              if colkey not in pkey_colkeys}
+                row_params.update((_KEY_BINDPARAM_FORMAT.format(i),
+                                   row[col.key])
+                                  for i, col in enumerate(pkey_cols))
+                params.append(row_params)
+            self._orm.execute(update, params)
+
+    def _invalidate_caches(self):
+        state = self._session_state
+        state.len = None
+        if state.pattern_cache is not None:
+            state.pattern_cache.clear()
+
+    def _is_default_context(self, context):
+        return context is None \
+               or (isinstance(context, _rdf.Graph)
+                   and isinstance(context.identifier, _rdf.BNode))
+
+    def _keyset_rows(self, table_iri, query):
+
+        page_size = self._keyset_page_size
+        key_cols, key_nullables = self._table_keyset_columns(table_iri)
+        key_len = len(key_cols)
+        key_unique = self._table_key_unique(table_iri)
+
+        query = query.add_columns(*key_cols)\
+                     .order_by(*_keyset_order_by(key_cols, key_nullables))
+
+        key_values = None
+        # the number of rows with the last key that were yielded
+        key_nrows = 0
+        while True:
+            if key_values is None:
+                page_query = query
+            elif key_unique:
+                page_query = query.filter(_keyset_after(key_cols,
+                                                        key_nullables,
+                                                        key_values))
+            else:
+                # duplicate rows share a key, so the page starts at the last
+                # key and skips its rows that were yielded
+                page_query = query.filter(_keyset_after(key_cols,
+                                                        key_nullables,
+                                                        key_values,
+                                                        inclusive=True))\
+                                  .offset(key_nrows)
+
+            page_orm = _sqla_orm.Session(bind=self._rdb)
+            try:
+                page_rows = page_query.with_session(page_orm)\
+                                      .limit(page_size)\
+                                      .all()
+            finally:
+                page_orm.close()
+
+            for row in page_rows:
+                yield row[:-key_len]
+
+            if len(page_rows) < page_size:
+                return
+
+            page_key_values = page_rows[-1][-key_len:]
+            if not key_unique:
+                page_key_nrows = 0
+                for row in reversed(page_rows):
+                    if row[-key_len:] != page_key_values:
+                        break
+                    page_key_nrows += 1
+                if page_key_values == key_values:
+                    key_nrows += page_key_nrows
+                else:
+                    key_nrows = page_key_nrows
+            elif all(value is None for value in page_key_values):
+                # nulls sort last, so no key follows this one
+                return
+            key_values = page_key_values
+
+    def _lazy_tables_index(self):
+        return _LazyIndex(self._map_table, self._map_all_tables)
+
+    def _literal_object_triples(self, object_pattern):
+
+        """The triples across all tables whose object is a literal
+
+        Each column whose type is compatible with the literal is matched by
+        one ``SELECT`` of the rows' keys, tagged with the index of the
+        column, and the ``SELECT``\ s are combined with ``UNION ALL`` into
+        as few queries as :data:`_UNION_CHUNK_SIZE` allows.  Since the
+        ``SELECT``\ s of a ``UNION`` must agree on their columns' types, each
+        key column is assigned to a slot of the same type, and the slots
+        that are not assigned in a ``SELECT`` are null.
+
+        """
+
+        object_sql_types = \
+            _common.sql_literal_types_from_rdf(object_pattern.datatype)
+        object_sql_literal = _common.sql_literal_from_rdf(object_pattern)
+
+        slots = []
+        slots_by_type = {}
+        tags = []
+        for table_iri, mapper in self._orm_mappers.items():
+            pkey_cols = mapper.primary_key
+
+            table_slots = []
+            table_slots_counts = {}
+            for col in pkey_cols:
+                type_ = col.type.__class__
+                n = table_slots_counts.get(type_, 0)
+                type_slots = slots_by_type.setdefault(type_, [])
+                if n == len(type_slots):
+                    type_slots.append(len(slots))
+                    slots.append(col.type)
+                table_slots.append(type_slots[n])
+                table_slots_counts[type_] = n + 1
+
+            cols_props = self._orm_columns_properties[table_iri]
+            for col in mapper.columns:
+                if isinstance(col.type, object_sql_types):
+                    tags.append((table_iri,
+                                 self._literal_property_iri(table_iri,
+                                                            col.name),
+                                 pkey_cols, table_slots,
+                                 cols_props[col.name].class_attribute))
+
+        selects = []
+        for tag, (table_iri, _, pkey_cols, table_slots, attr) \
+                in enumerate(tags):
+            slots_cols = [_sqla.cast(_sqla.null(), type_) for type_ in slots]
+            for col, slot in zip(pkey_cols, table_slots):
+                slots_cols[slot] = col
+            selects.append(_sqla.select([_sqla.literal(tag).label('tag')]
+                                        + [col.label('k{}'.format(slot))
+                                           for slot, col
+                                           in enumerate(slots_cols)])
+                                .where(attr == object_sql_literal))
+
+        for i in range(0, len(selects), _UNION_CHUNK_SIZE):
+            selects_chunk = selects[i:i + _UNION_CHUNK_SIZE]
+            if len(selects_chunk) > 1:
+                query = _sqla.union_all(*selects_chunk)
+            else:
+                query = selects_chunk[0]
+
+            for row in self._query_rows(self._orm.query(query.alias())):
+                table_iri, predicate_iri, _, table_slots, _ = tags[row[0]]
+                yield (self._orm_row_node_funcs[table_iri]
+                        ([row[1 + slot] for slot in table_slots]),
+                       predicate_iri, object_pattern)
+
+    def _literal_property_iri(self, table_iri, colname):
+        return _rdf.URIRef(u'{}#{}'.format(table_iri,
+                                           _common.iri_safe(colname)))
+
+    def _map_all_tables(self):
+        with self._orm_mapping_lock:
+            if self._orm_unmapped_tables:
+                self._map_tables(self._orm_unmapped_tables.keys())
+            if self._orm_inbound_refs_stale:
+                self._orm_inbound_refs_stale = False
+                self._orm_inbound_refs\
+                    .update(self._compile_inbound_refs().items())
+
+    def _map_orm_classes(self, classes_items):
+
+        """Index the mappings of ORM classes
+
+        The classes' tables, and the tables that their relationships
+        reference, must not have been indexed yet.
+
+        """
+
+        mappers_items = []
+        colprops_items = []
+        cols_datatypes_items = []
+        rels_items = []
+        predicates_items = []
+        bnode_tables = set()
+        for table_iri, class_ in classes_items:
+            class_mapper = _sqla.inspect(class_)
+            props = _orm_column_property_by_name(mapper=class_mapper)
+
+            mappers_items.append((table_iri, class_mapper))
+            colprops_items.append((table_iri, props))
+            cols_datatypes_items\
+             .append((table_iri,
+                      {colname: _common.canon_rdf_datatype_from_sql
+                                 (prop.columns[0].type)
+                       for colname, prop in props.items()}))
+            rels_items\
+             .append((table_iri,
+                      _orm_relationship_by_local_column_names
+                       (mapper=class_mapper)))
+            if class_mapper.has_pseudo_primary_key:
+                bnode_tables.add(table_iri)
+
+            for colname, prop in props.items():
+                sql_type = prop.columns[0].type
+                predicates_items\
+                 .append((self._literal_property_iri(table_iri, colname),
+                          _PredicateInfo
+                           (attr=prop.class_attribute,
+                            table_iri=table_iri,
+                            sql_type=sql_type,
+                            rdf_datatypes=
+                                _common.rdf_datatypes_from_sql(sql_type),
+                            rdf_literal_from_sql=
+                                _common.rdf_literal_from_sql_func
+                                 (sql_type),
+                            object_table_iri=None,
+                            object_key_attrs=None)))
+            for rel in rels_items[-1][1].values():
+                predicates_items\
+                 .append((self._ref_property_iri
+                           (table_iri,
+                            _orm_relationship_local_column_names(rel)),
+                          _PredicateInfo
+                           (attr=rel.class_attribute,
+                            table_iri=table_iri,
+                            sql_type=None,
+                            rdf_datatypes=(),
+                            rdf_literal_from_sql=None,
+                            object_table_iri=
+                                self._table_iri(rel.target.name),
+                            object_key_attrs=
+                                _orm_relationship_object_key_attrs
+                                 (rel, props))))
+        self._orm_mappers.update(mappers_items)
+        self._orm_columns_properties.update(colprops_items)
+        self._orm_columns_rdf_datatypes.update(cols_datatypes_items)
+        self._orm_relationships.update(rels_items)
+        self._orm_bnode_tables.update(bnode_tables)
+        self._orm_predicates.update(predicates_items)
+
+        row_str_funcs = [(table_iri, self._compile_row_str_func(table_iri))
+                         for table_iri, _ in mappers_items]
+        self._orm_row_node_funcs\
+            .update((table_iri,
+                     _row_node_func(row_str_func,
+                                    table_iri in self._orm_bnode_tables))
+                    for table_iri, row_str_func in row_str_funcs)
+        self._orm_row_ntriples_funcs\
+            .update((table_iri,
+                     _row_ntriples_func(row_str_func,
+                                        table_iri in self._orm_bnode_tables))
+                    for table_iri, row_str_func in row_str_funcs)
+        self._orm_projectors\
+            .update((table_iri, self._compile_table_projector(table_iri))
+                    for table_iri, _ in mappers_items)
+
+    def _map_predicate_table(self, predicate_iri):
+        table_iri, _, _ = predicate_iri.rpartition('#')
+        if table_iri:
+            self._map_table(_rdf.URIRef(table_iri))
+
+    def _map_table(self, table_iri):
+        with self._orm_mapping_lock:
+            if table_iri in self._orm_unmapped_tables:
+                self._map_tables((table_iri,))
+
+    def _map_tables(self, tables_iris):
+
+        """Reflect and map tables on demand
+
+        The tables that the tables' foreign keys reference are reflected and
+        mapped along with them, transitively.
+
+        """
+
+        metadata = self._rdb_metadata
+        tablesnames = [self._orm_unmapped_tables[table_iri]
+                       for table_iri in tables_iris]
+        metadata.reflect(bind=self._rdb,
+                         only=[tablename for tablename in tablesnames
+                               if tablename not in metadata.tables])
+
+        tables = []
+        tables_pending = [metadata.tables[tablename]
+                          for tablename in tablesnames]
+        while tables_pending:
+            table = tables_pending.pop()
+            if table in self._orm_classes_by_table or table in tables:
+                continue
+            tables.append(table)
+            self._orm_unmapped_tables.pop(self._table_iri(table.name), None)
+            tables_pending.extend(fkey.column.table
+                                  for fkey in table.foreign_keys)
+
+        classes = _dm.orm_map_tables(self.OrmBase, tables,
+                                     self._orm_classes_by_table)
+        classes_items = [(self._table_iri(class_.__table__.name), class_)
+                         for class_ in classes]
+        self._orm_classes.update(classes_items)
+        self._map_orm_classes(classes_items)
+        self._orm_inbound_refs_stale = True
+
+    def _node_object_triples(self, object_node):
+
+        if object_node in self._orm_mappers:
+            return self._table_type_triples(object_node)
+
+        try:
+            object_table_iri, object_pkey = self._parse_row_node(object_node)
+        except (TypeError, ValueError):
+            return ()
+
+        # only the tables that reference the object's table can match
+        return self._tables_triples(self._orm_inbound_refs
+                                        .get(object_table_iri, {})
+                                        .keys(),
+                                    _partial(self._table_inbound_triples,
+                                             object_node=object_node,
+                                             object_table_iri=
+                                                 object_table_iri,
+                                             object_pkey=object_pkey))
+
+    def _null_columns_statement(self, table_iri, cols, criteria):
+
+        """The statement that sets columns to null in the matching rows
+
+        :return:
+            An ``UPDATE`` statement, or :obj:`None` if the columns cannot be
+            set to null and no row matches.
+
+        :raise ValueError:
+            Raised if the columns cannot be set to null and a row matches.
+
+        """
+
+        mapper = self._orm_mappers[table_iri]
+        if mapper.has_pseudo_primary_key:
+            # a pseudo primary key's columns are marked as not nullable, but
+            # they can be set to null if they were nullable
+            nullable_colnames = \
+                mapper.local_table.primary_key.nullable_columns_names
+            required_cols = [col for col in cols
+                             if not col.nullable
+                                and col.name not in nullable_colnames]
+        else:
+            pkey_colkeys = set(col.key for col in mapper.primary_key)
+            required_cols = [col for col in cols
+                             if col.key in pkey_colkeys or not col.nullable]
+        if required_cols:
+            query = _sqla.select([_sqla.exists()
+                                       .where(_sqla.and_(*criteria))])
+            if self._orm.execute(query).scalar():
+                raise ValueError('cannot remove the values of the key or'
+                                  ' non-nullable columns {} of table {!r}'
+                                  .format([col.name for col in required_cols],
+                                          table_iri))
+            return None
+
+        return _where(mapper.local_table.update(), criteria)\
+                .values({col.key: None for col in cols})
+
+    def _objects_choices_triples(self, subject_pattern, predicate_pattern,
+                                 objects):
+
+        if not isinstance(predicate_pattern, _rdf.URIRef) \
+               or predicate_pattern == _rdf.RDF.type:
+            return self._choices_triples((subject_pattern, predicate_pattern,
+                                          None),
+                                         2, objects)
+
+        try:
+            predicate_info = self._predicate_info(predicate_pattern)
+        except ValueError:
+            return ()
+        predicate_attr = predicate_info.attr
+        table_iri = predicate_info.table_iri
+
+        criteria = []
+        if subject_pattern is not None:
+            try:
+                subject_table_iri, subject_pkey = \
+                    self._parse_row_node(subject_pattern)
+            except (TypeError, ValueError, KeyError):
+                return ()
+            if subject_table_iri != table_iri:
+                return ()
+            criteria.extend(attr == value
+                            for attr, value in subject_pkey.items())
+
+        if predicate_info.object_table_iri is not None:
+            if predicate_info.object_key_attrs is None:
+                return self._choices_triples((subject_pattern,
+                                              predicate_pattern, None),
+                                             2, objects)
+
+            # the objects' keys are matched in the foreign key columns
+            objects_criteria = \
+                [criteria_
+                 for table_iri_, criteria_
+                 in self._subjects_criteria
+                     (objects, _KEYS_CHUNK_SIZE,
+                      key_attrs_by_table_iri=
+                          {predicate_info.object_table_iri:
+                               predicate_info.object_key_attrs})
+                 if table_iri_ == predicate_info.object_table_iri]
+
+        else:
+            values = list(set(_common.sql_literal_from_rdf(object_)
+                              for object_ in objects
+                              if isinstance(object_, _rdf.Literal)
+                                 and object_.datatype
+                                      in predicate_info.rdf_datatypes))
+            objects_criteria = \
+                [(predicate_attr.in_(values[i:i + _KEYS_CHUNK_SIZE]),)
+                 for i in range(0, len(values), _KEYS_CHUNK_SIZE)]
+
+        return (triple
+                for objects_criteria_ in objects_criteria
+                for triple
+                in self._table_predicate_triples
+                    (table_iri, predicate_pattern, None,
+                     criteria=(criteria + list(objects_criteria_))))
+
+    def _parallel_tables_triples(self, tables_iris, table_triples_func):
+
+        tables_iris_pending = _queue.Queue()
+        for table_iri in tables_iris:
+            tables_iris_pending.put(table_iri)
+        results = _queue.Queue(maxsize=self._table_queue_size)
+        stopping = _threading.Event()
+
+        def put_result(result):
+            while not stopping.is_set():
+                try:
+                    results.put(result, timeout=_PARALLEL_POLL_INTERVAL)
+                except _queue.Full:
+                    continue
+                else:
+                    return True
+            return False
+
+        def work():
+            orm = _sqla_orm.Session(bind=self._rdb)
+            try:
+                while not stopping.is_set():
+                    try:
+                        table_iri = tables_iris_pending.get_nowait()
+                    except _queue.Empty:
+                        break
+
+                    batch = []
+                    for triple in table_triples_func(table_iri, orm=orm):
+                        batch.append(triple)
+                        if len(batch) == _PARALLEL_TRIPLES_BATCH_SIZE:
+                            if not put_result(batch):
+                                return
+                            batch = []
+                    if batch and not put_result(batch):
+                        return
+            except Exception:
+                put_result(_WorkerError(_sys.exc_info()))
+            finally:
+                orm.close()
+                put_result(None)
+
+        nworkers = min(self._table_workers, tables_iris_pending.qsize())
+        workers = [_threading.Thread(target=work,
+                                     name='DirectMapping table worker {}'
+                                           .format(i))
+                   for i in range(nworkers)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        try:
+            nworkers_running = nworkers
+            while nworkers_running:
+                result = results.get()
+                if result is None:
+                    nworkers_running -= 1
+                elif isinstance(result, _WorkerError):
+                    raise result.exc_info[0], result.exc_info[1], \
+                          result.exc_info[2]
+                else:
+                    for triple in result:
+                        yield triple
+        finally:
+            stopping.set()
+            for worker in workers:
+                worker.join()
+
+    def _parse_row_node(self, node):
+
+        try:
+            table_iri_str, _, pkeyspec = node.rpartition('/')
+        except AttributeError:
+            raise TypeError(u'invalid row node {!r}: not a string'
+                             .format(node))
+
+        if not table_iri_str or '=' not in pkeyspec:
+            raise ValueError\
+                   (u'invalid row node {!r}: does not match format {!r}'
+                     .format(node, 'table/colname=value[;colname=value]...'))
+
+        table_iri = _rdf.URIRef(table_iri_str)
+
+        if table_iri in self._orm_bnode_tables:
+            if not isinstance(node, _rdf.BNode):
+                raise ValueError('invalid node type {!r} for blank node table'
+                                  ' {!r}: not blank node'
+                                  .format(node.__class__, table_iri))
+        else:
+            if not isinstance(node, _rdf.URIRef):
+                raise ValueError('invalid node type {!r} for IRI node table'
+                                  ' {!r}: not IRI node'
+                                  .format(node.__class__, table_iri))
+
+        pkey = {}
+        cols_props = self._orm_columns_properties[table_iri]
+        cols_datatypes = self._orm_columns_rdf_datatypes[table_iri]
+        mapper = self._orm_mappers[table_iri]
+        # the nulls of a pseudo primary key's nullable columns are formatted
+        # as "None", which is a string but no other type's lexical value
+        null_colnames = \
+            mapper.local_table.primary_key.nullable_columns_names \
+                if mapper.has_pseudo_primary_key else ()
+        for name_irisafe, value_irisafe in (item.split('=')
+                                            for item in pkeyspec.split(';')):
+            colname = _pct_decoded(name_irisafe)
+            value_str = _pct_decoded(value_irisafe)
+            if colname in null_colnames and value_str == u'None' \
+                   and cols_datatypes[colname] != _rdf.XSD.string:
+                value = None
+            else:
+                value = _common.sql_literal_from_rdf\
+                         (_rdf.Literal(value_str,
+                                       datatype=cols_datatypes[colname]))
+            pkey[cols_props[colname].class_attribute] = value
+
+        return table_iri, pkey
+
+    def _pattern_triples(self, (subject_pattern, predicate_pattern,
+                                object_pattern)):
+
+        if subject_pattern is None:
+            if predicate_pattern is None:
+                if isinstance(object_pattern, _rdf.Literal):
+                    triples = self._literal_object_triples(object_pattern)
+                elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
+                    triples = self._node_object_triples(object_pattern)
+                else:
+                    triples = \
+                        self._tables_triples\
+                         (self._orm_classes.keys(),
+                          _partial(self._table_allpredicates_triples,
+                                   object_pattern=object_pattern))
+                for triple in triples:
+                    yield triple, None
+
+            elif predicate_pattern == _rdf.RDF.type:
+                if object_pattern is None:
+                    for triple \
+                            in self._tables_triples(self._orm_classes.keys(),
+                                                    self._table_type_triples):
+                        yield triple, None
+                elif isinstance(object_pattern, _rdf.URIRef):
+                    for triple in self._table_type_triples(object_pattern):
+                        yield triple, None
+                else:
+                    return
+
+            elif isinstance(predicate_pattern, _rdf.URIRef):
+                try:
+                    predicate_info = self._predicate_info(predicate_pattern)
+                except ValueError:
+                    return
+                subject_table_iri = predicate_info.table_iri
+
+                for triple in self._table_predicate_triples(subject_table_iri,
+                                                            predicate_pattern,
+                                                            object_pattern):
+                    yield triple, None
+
+            else:
+                return
+
+        elif isinstance(subject_pattern, (_rdf.URIRef, _rdf.BNode)):
+            for triple in self._subject_triples(subject_pattern,
+                                                predicate_pattern,
+                                                object_pattern):
+                yield triple, None
+
+        else:
+            return
+
+    def _pending_node_key_values(self, node):
+        # the nodes of the rows that are being buffered are parsed once
+        pending_nodes = self._session_state.pending_nodes
+        try:
+            table_iri, values = pending_nodes[node]
+        except KeyError:
+            table_iri, values = pending_nodes[node] = \
+                self._row_node_key_values(node)
+        return table_iri, dict(values)
+
+    def _postgresql_tables_len_estimates(self):
+
+        default_schema = self._rdb.dialect.default_schema_name
+        tables_iris_by_key = \
+            {(mapper.local_table.schema or default_schema,
+              mapper.local_table.name):
+                 table_iri
+             for table_iri, mapper in self._orm_mappers.items()}
+        schemas = list(set(schema for schema, _ in tables_iris_by_key))
+        if not schemas:
+            return {}
+
+        rows_counts = {}
+        for schema, tablename, rows_count \
+                in self._orm.execute(_sqla.text(_POSTGRESQL_ROWS_COUNTS_SQL),
+                                     {'schemas': schemas}):
+            try:
+                table_iri = tables_iris_by_key[(schema, tablename)]
+            except KeyError:
+                continue
+            if rows_count >= 0:
+                # a negative count means that the table was never analyzed
+                rows_counts[table_iri] = rows_count
+
+        null_fracs = {}
+        for schema, tablename, colname, null_frac \
+                in self._orm.execute(_sqla.text(_POSTGRESQL_NULL_FRACS_SQL),
+                                     {'schemas': schemas}):
+            try:
+                table_iri = tables_iris_by_key[(schema, tablename)]
+            except KeyError:
+                continue
+            null_fracs[(table_iri, colname)] = null_frac
+
+        estimates = {}
+        for table_iri, rows_count in rows_counts.items():
+            mapper = self._orm_mappers[table_iri]
+            nonnull_frac = \
+                1 + sum(1 - null_fracs.get((table_iri, col.name), 0)
+                        for col in mapper.columns) \
+                  + sum(1 - max(null_fracs.get((table_iri, colname), 0)
+                                for colname in colnames)
+                        for colnames in self._orm_relationships[table_iri])
+            estimates[table_iri] = rows_count * nonnull_frac
+        return estimates
+
+    def _predicates_choices_triples(self, subject_pattern, predicates,
+                                    object_pattern):
+
+        if object_pattern is not None:
+            return self._choices_triples((subject_pattern, None,
+                                          object_pattern),
+                                         1, predicates)
+
+        type_ = _rdf.RDF.type in predicates
+        literal_props_by_table_iri = {}
+        ref_props_by_table_iri = {}
+        for predicate in set(predicates):
+            if predicate == _rdf.RDF.type:
+                continue
+            try:
+                predicate_info = self._predicate_info(predicate)
+            except (TypeError, ValueError):
+                continue
+            table_iri = predicate_info.table_iri
+            predicate_prop = predicate_info.attr.property
+            if predicate_info.object_table_iri is not None:
+                ref_props_by_table_iri.setdefault(table_iri, [])\
+                 .append(predicate_prop)
+            else:
+                literal_props_by_table_iri.setdefault(table_iri, [])\
+                 .append(predicate_prop)
+
+        def table_triples(table_iri, criteria=(), orm=None):
+            return self._table_props_triples\
+                    (table_iri,
+                     literal_props_by_table_iri.get(table_iri, ()),
+                     ref_props_by_table_iri.get(table_iri, ()),
+                     type_=type_, criteria=criteria, orm=orm)
+
+        if subject_pattern is None:
+            if type_:
+                tables_iris = self._orm_classes.keys()
+            else:
+                tables_iris = set(literal_props_by_table_iri.keys()
+                                  + ref_props_by_table_iri.keys())
+            return self._tables_triples(tables_iris, table_triples)
+
+        try:
+            subject_table_iri, subject_pkey = \
+                self._parse_row_node(subject_pattern)
+        except (TypeError, ValueError, KeyError):
+            return ()
+        if not type_ \
+               and subject_table_iri not in literal_props_by_table_iri \
+               and subject_table_iri not in ref_props_by_table_iri:
+            return ()
+        return table_triples(subject_table_iri,
+                             criteria=[attr == value
+                                       for attr, value
+                                       in subject_pkey.items()])
+
+    def _predicate_info(self, iri):
+
+        try:
+            return self._orm_predicates[iri]
+        except (KeyError, TypeError):
+            pass
+
+        # non-canonical forms, such as a reference property IRI whose column
+        # names are permuted
+        try:
+            table_iri_str, _, colspec = iri.partition('#')
+        except AttributeError:
+            raise TypeError(u'invalid predicate IRI {!r}: not a string'
+                             .format(iri))
+
+        if not table_iri_str or not colspec:
+            raise ValueError(u'invalid predicate IRI {!r}:'
                               u' does not match either format {!r}'
                               .format(iri,
                                       ('table#colname',
@@ -492,15 +2356,23 @@ class DirectMapping(_rdf.store.Store):
                 prop = self._orm_relationships[table_iri][cols]
             except KeyError:
                 raise ValueError('unknown reference property {!r}'.format(iri))
+            canon_iri = \
+                self._ref_property_iri(table_iri,
+                                       _orm_relationship_local_column_names
+                                        (prop))
 
         else:
             col = _pct_decoded(colspec)
             try:
-                prop = self._orm_columns_properties[table_iri][col]
+                self._orm_columns_properties[table_iri][col]
             except KeyError:
                 raise ValueError('unknown literal property {!r}'.format(iri))
+            canon_iri = self._literal_property_iri(table_iri, col)
 
-        return prop.class_attribute
+        return self._orm_predicates[canon_iri]
+
+    def _predicate_orm_attr(self, iri):
+        return self._predicate_info(iri).attr
 
     def _prefixed_iri(self, rel_iri):
 
@@ -551,45 +2423,234 @@ class DirectMapping(_rdf.store.Store):
 
         return _sqla.create_engine(*rdb_args, **rdb_kwargs)
 
-    def _ref_property_iri(self, table_iri, fkey_colnames):
-        return _rdf.URIRef(u'{}#ref-{}'
-                            .format(table_iri,
-                                    ';'.join(_common.iri_safe(colname)
-                                             for colname
-                                             in fkey_colnames)))
-
-    def _row_bnode_from_sql(self, table_iri, pkey_items):
-        return _rdf.BNode(self._row_str_from_sql(table_iri, pkey_items))
+    def _query_rows(self, query):
+        if self._stream_results:
+            return query.yield_per(self._stream_batch_size)
+        else:
+            return query.all()
 
-    def _row_iri_from_sql(self, table_iri, pkey_items):
-        return _rdf.URIRef(self._row_str_from_sql(table_iri, pkey_items))
+    def _ref_local_values(self, rel, object_node):
 
-    def _row_node_from_sql(self, table_iri, pkey_items):
-        return self._row_node_from_sql_func(table_iri)(pkey_items)
+        """The values of a reference's columns that reference a row
 
-    def _row_node_from_sql_func(self, table_iri):
-        if table_iri in self._orm_bnode_tables:
-            return _partial(self._row_bnode_from_sql, table_iri)
-        else:
-            return _partial(self._row_iri_from_sql, table_iri)
+        :return:
+            The reference's local columns and their values, or :obj:`None`
+            if the *object_node* is not a row that the reference can
+            reference.  The values are read from the object's key if the
+            reference is to its primary key, and otherwise queried.
+        :rtype: ~[(:class:`sqlalchemy.Column`, object)] or null
 
-    def _row_str_from_sql(self, table_iri, pkey_items):
-        return u'{}/{}'\
-                .format(table_iri,
-                        ';'.join(u'{}={}'
-                                  .format(_common.iri_safe(col.name),
-                                          _common.iri_safe
-                                           (_common.rdf_literal_from_sql
-                                             (value, sql_type=col.type)))
-                                 for col, value in pkey_items))
+        """
 
-    def _subject_triples(self, subject_node, predicate_pattern,
-                         object_pattern):
+        try:
+            object_table_iri, object_pkey = self._parse_row_node(object_node)
+        except (TypeError, ValueError, KeyError):
+            return None
+        if object_table_iri != self._table_iri(rel.target.name):
+            return None
 
+        local_cols, remote_cols = zip(*rel.local_remote_pairs)
+        object_pkey_by_colname = {attr.property.columns[0].name: value
+                                  for attr, value in object_pkey.items()}
         try:
-            subject_table_iri, subject_pkey = \
-                self._parse_row_node(subject_node)
-        except (TypeError, ValueError):
+            return zip(local_cols, [object_pkey_by_colname[col.name]
+                                    for col in remote_cols])
+        except KeyError:
+            pass
+
+        query = _sqla.select(list(remote_cols))\
+                     .where(_sqla.and_(*(attr == value
+                                         for attr, value
+                                         in object_pkey.items())))
+        remote_values = self._orm.execute(query).first()
+        if remote_values is None:
+            return None
+        return zip(local_cols, remote_values)
+
+    def _ref_object_query(self, query, predicate_info, object_node):
+
+        """Filter a query of a reference's subjects by the referenced row
+
+        :return:
+            The filtered *query*, or :obj:`None` if the *object_node* cannot
+            be referenced by the reference.
+
+        """
+
+        try:
+            object_table_iri, object_pkey = self._parse_row_node(object_node)
+        except (TypeError, ValueError):
+            return None
+        if object_table_iri != predicate_info.object_table_iri:
+            return None
+
+        if predicate_info.object_key_attrs is not None:
+            # the foreign key holds the object's key
+            object_pkey_by_colname = {attr.property.columns[0].name: value
+                                      for attr, value in object_pkey.items()}
+            object_table = predicate_info.attr.property.target
+            try:
+                return query.filter(*(attr == object_pkey_by_colname[col.name]
+                                      for col, attr
+                                      in zip(object_table.primary_key.columns,
+                                             predicate_info.object_key_attrs)))
+            except KeyError:
+                return None
+
+        object_alias = _sqla_orm.aliased(self._orm_classes[object_table_iri])
+        return query.join(object_alias, predicate_info.attr)\
+                    .filter(*(getattr(object_alias, attr.key) == value
+                              for attr, value in object_pkey.items()))
+
+    def _ref_objects_query(self, query, predicate_info):
+
+        """Restrict a query of a reference's subjects to the referencing rows
+
+        :return:
+            The restricted *query* and the attributes of the referenced
+            rows' keys.  The keys are read from the foreign key columns if
+            they reference the primary key, or else from the joined
+            referenced table.
+        :rtype: (:class:`sqlalchemy.orm.Query`, ~[object])
+
+        """
+
+        if predicate_info.object_key_attrs is not None:
+            return (query.filter(*(attr != None
+                                   for attr
+                                   in predicate_info.object_key_attrs)),
+                    predicate_info.object_key_attrs)
+
+        object_table_iri = predicate_info.object_table_iri
+        object_alias = _sqla_orm.aliased(self._orm_classes[object_table_iri])
+        object_cols_props = self._orm_columns_properties[object_table_iri]
+        return (query.join(object_alias, predicate_info.attr),
+                [getattr(object_alias, object_cols_props[col.name].key)
+                 for col in predicate_info.attr.property.target.primary_key
+                                                               .columns])
+
+    def _ref_property_iri(self, table_iri, fkey_colnames):
+        return _rdf.URIRef(u'{}#ref-{}'
+                            .format(table_iri,
+                                    ';'.join(_common.iri_safe(colname)
+                                             for colname
+                                             in fkey_colnames)))
+
+    def _row_bnode_from_sql(self, table_iri, pkey_items):
+        return _rdf.BNode(self._row_str_from_sql(table_iri, pkey_items))
+
+    def _row_iri_from_sql(self, table_iri, pkey_items):
+        return _rdf.URIRef(self._row_str_from_sql(table_iri, pkey_items))
+
+    def _row_node_from_sql(self, table_iri, pkey_items):
+        return self._row_node_from_sql_func(table_iri)(pkey_items)
+
+    def _row_node_from_sql_func(self, table_iri):
+        if table_iri in self._orm_bnode_tables:
+            return _partial(self._row_bnode_from_sql, table_iri)
+        else:
+            return _partial(self._row_iri_from_sql, table_iri)
+
+    def _row_str_from_sql(self, table_iri, pkey_items):
+        return u'{}/{}'\
+                .format(table_iri,
+                        ';'.join(u'{}={}'
+                                  .format(_common.iri_safe(col.name),
+                                          _common.iri_safe
+                                           (_common.rdf_literal_from_sql
+                                             (value, sql_type=col.type)))
+                                 for col, value in pkey_items))
+
+    def _row_node_key_values(self, node):
+
+        """The table and key values of a row node
+
+        :return:
+            The IRI of the row's table and a mapping of the keys of the
+            table's primary key columns to their values.
+        :rtype: (:class:`rdflib.URIRef`, {:obj:`str`: object})
+
+        :raise ValueError:
+            Raised if *node* is not a row node of this store or does not
+            specify exactly the key columns of its table.
+
+        """
+
+        try:
+            table_iri, pkey = self._parse_row_node(node)
+        except (KeyError, TypeError):
+            raise ValueError('invalid row node {!r}: not a row of a table'
+                              .format(node))
+
+        values = {attr.property.columns[0].key: value
+                  for attr, value in pkey.items()}
+        pkey_colkeys = \
+            set(col.key for col in self._orm_mappers[table_iri].primary_key)
+        if set(values) != pkey_colkeys:
+            raise ValueError('invalid row node {!r}: expecting the key'
+                              ' columns {}'
+                              .format(node, sorted(pkey_colkeys)))
+        return table_iri, values
+
+    def _schema_fingerprint(self):
+
+        """A digest of the database's catalog, or null if not supported
+
+        The digest covers the definitions of the tables, columns,
+        constraints, and indexes in the default schema, along with the
+        versions of the dialect and of SQLAlchemy, which determine the
+        reflected metadata.
+
+        """
+
+        dialect = self._rdb.dialect
+        try:
+            catalog_sqls = _SCHEMA_FINGERPRINT_SQLS[dialect.name]
+        except KeyError:
+            return None
+
+        digest = _hashlib.sha1(repr((dialect.name,
+                                     dialect.server_version_info,
+                                     _sqla.__version__)))
+        for catalog_sql in catalog_sqls:
+            for row in self._rdb.execute(_sqla.text(catalog_sql)):
+                digest.update(repr(tuple(row)))
+        return digest.hexdigest()
+
+    def _sqlite_tables_len_estimates(self):
+
+        if not self._orm.execute(_sqla.text(_SQLITE_STAT1_EXISTS_SQL)).first():
+            return {}
+
+        tables_iris_by_name = {mapper.local_table.name: table_iri
+                               for table_iri, mapper
+                               in self._orm_mappers.items()
+                               if mapper.local_table.schema is None}
+
+        rows_counts = {}
+        for tablename, stat \
+                in self._orm.execute(_sqla.text(_SQLITE_STAT1_SQL)):
+            try:
+                table_iri = tables_iris_by_name[tablename]
+                rows_count = int(stat.split()[0])
+            except (KeyError, AttributeError, IndexError, ValueError):
+                continue
+            rows_counts[table_iri] = max(rows_counts.get(table_iri, 0),
+                                         rows_count)
+
+        # SQLite keeps no statistics of nulls
+        return {table_iri: rows_count
+                           * (1 + len(self._orm_mappers[table_iri].columns)
+                              + len(self._orm_relationships[table_iri]))
+                for table_iri, rows_count in rows_counts.items()}
+
+    def _subject_triples(self, subject_node, predicate_pattern,
+                         object_pattern):
+
+        try:
+            subject_table_iri, subject_pkey = \
+                self._parse_row_node(subject_node)
+        except (TypeError, ValueError):
             return
         subject_class = self._orm_classes[subject_table_iri]
         subject_cols_props = \
@@ -624,19 +2685,32 @@ class DirectMapping(_rdf.store.Store):
                     query = query.add_columns(predicate_attr)
 
                 for predicate_prop in subject_rels:
+                    object_key_attrs = \
+                        _orm_relationship_object_key_attrs(predicate_prop,
+                                                           subject_cols_props)
+                    if object_key_attrs is not None:
+                        # the foreign key holds the object's key
+                        query = query.add_columns(*object_key_attrs)
+                        continue
+
                     object_table = predicate_prop.target
                     object_table_iri = self._table_iri(object_table.name)
+                    object_alias = \
+                        _sqla_orm.aliased(self._orm_classes[object_table_iri])
                     object_cols_props = \
                         self._orm_columns_properties[object_table_iri]
                     object_pkey_attrs = \
-                        [object_cols_props[col.name].class_attribute
+                        [getattr(object_alias, object_cols_props[col.name].key)
                          for col
                          in object_table.primary_key.columns]
 
-                    query = query.outerjoin(predicate_prop.class_attribute)\
+                    query = query.outerjoin(object_alias,
+                                            predicate_prop.class_attribute)\
                                  .add_columns(*object_pkey_attrs)
 
                 query_result_values = query.first()
+                if query_result_values is None:
+                    return
                 query_result_values_pending = _deque(query_result_values)
                 subject_cols_values = \
                     [query_result_values_pending.popleft()
@@ -676,8 +2750,8 @@ class DirectMapping(_rdf.store.Store):
                     predicate_iri = \
                         self._ref_property_iri\
                          (subject_table_iri,
-                          (col.name
-                           for col in predicate_prop.local_columns))
+                          _orm_relationship_local_column_names
+                           (predicate_prop))
 
                     yield (subject_node,
                            predicate_iri,
@@ -693,25 +2767,31 @@ class DirectMapping(_rdf.store.Store):
                 object_sql_types = \
                     _common.sql_literal_types_from_rdf\
                      (object_pattern.datatype)
+                object_sql_literal = \
+                    _common.sql_literal_from_rdf(object_pattern)
 
+                # one flag for each compatible column, all in one query
+                predicates_iris = []
+                matches = []
                 for predicate_col in subject_mapper.columns:
-                    predicate_sql_type = predicate_col.type
-                    if isinstance(predicate_sql_type, object_sql_types):
+                    if isinstance(predicate_col.type, object_sql_types):
                         predicate_colname = predicate_col.name
-                        predicate_prop = \
-                            subject_cols_props[predicate_colname]
-                        predicate_attr = predicate_prop.class_attribute
-                        object_sql_literal = \
-                            _common.sql_literal_from_rdf(object_pattern)
-                        query_cand = \
-                            query.filter(predicate_attr
-                                          == object_sql_literal)
-
-                        if self._orm.query(query_cand.exists()).scalar():
-                            predicate_iri = \
-                                self._literal_property_iri\
-                                 (subject_table_iri, predicate_colname)
-                            yield (subject_node, predicate_iri, object_pattern)
+                        predicate_attr = \
+                            subject_cols_props[predicate_colname]\
+                             .class_attribute
+                        predicates_iris.append(self._literal_property_iri
+                                                (subject_table_iri,
+                                                 predicate_colname))
+                        matches.append(predicate_attr == object_sql_literal)
+                if not matches:
+                    return
+
+                for predicate_iri, match \
+                        in zip(predicates_iris,
+                               query.with_entities(*_matches_flags(matches))
+                                    .first()):
+                    if match:
+                        yield (subject_node, predicate_iri, object_pattern)
 
             elif isinstance(object_pattern, _rdf.URIRef):
                 # IRI, *, IRI
@@ -728,396 +2808,1473 @@ class DirectMapping(_rdf.store.Store):
                     return
 
                 subject_rels = self._orm_relationships[subject_table_iri]
-                object_cols_props = \
-                    self._orm_columns_properties[object_table_iri]
+                object_class = self._orm_classes[object_table_iri]
+                object_pkey_by_colname = \
+                    {attr.property.columns[0].name: value
+                     for attr, value in object_pkey.items()}
+
+                # one flag for each reference to the object's table, all in
+                # one query that compares the foreign key columns with the
+                # object's key, or else joins each referenced row separately
+                predicates_iris = []
+                matches = []
+                for predicate_prop in subject_rels.values():
+                    object_table = predicate_prop.target
+                    if self._table_iri(object_table.name) != object_table_iri:
+                        continue
+
+                    object_key_attrs = \
+                        _orm_relationship_object_key_attrs(predicate_prop,
+                                                           subject_cols_props)
+                    if object_key_attrs is not None:
+                        try:
+                            match = \
+                                _sqla.and_(*(attr
+                                             == object_pkey_by_colname
+                                                 [col.name]
+                                             for col, attr
+                                             in zip(object_table.primary_key
+                                                                .columns,
+                                                    object_key_attrs)))
+                        except KeyError:
+                            continue
+                    else:
+                        object_alias = _sqla_orm.aliased(object_class)
+                        query = query.outerjoin(object_alias,
+                                                predicate_prop.class_attribute)
+                        match = _sqla.and_(*(getattr(object_alias, attr.key)
+                                             == value
+                                             for attr, value
+                                             in object_pkey.items()))
+
+                    predicates_iris\
+                     .append(self._ref_property_iri
+                              (subject_table_iri,
+                               _orm_relationship_local_column_names
+                                (predicate_prop)))
+                    matches.append(match)
+                if not matches:
+                    return
+
+                for predicate_iri, match \
+                        in zip(predicates_iris,
+                               query.with_entities(*_matches_flags(matches))
+                                    .first()):
+                    if match:
+                        yield (subject_node, predicate_iri, object_pattern)
+
+            else:
+                return
+
+        elif predicate_pattern == _rdf.RDF.type:
+            if object_pattern is None \
+                   or (isinstance(object_pattern, _rdf.URIRef)
+                       and object_pattern == subject_table_iri):
+                if self._orm.query(query.exists()).scalar():
+                    yield (subject_node, _rdf.RDF.type, subject_table_iri)
+
+        elif isinstance(predicate_pattern, _rdf.URIRef):
+            try:
+                predicate_info = self._predicate_info(predicate_pattern)
+            except ValueError:
+                return
+            if predicate_info.table_iri != subject_table_iri:
+                return
+            predicate_attr = predicate_info.attr
+
+            if predicate_info.object_table_iri is not None:
+                if object_pattern is None:
+                    # IRI, ref IRI, *
+
+                    object_node_from_sql = \
+                        self._orm_row_node_funcs\
+                         [predicate_info.object_table_iri]
+
+                    query, object_pkey_attrs = \
+                        self._ref_objects_query(query, predicate_info)
+                    query = query.with_entities(*object_pkey_attrs)
+                    for object_pkey_values in self._query_rows(query):
+                        yield (subject_node,
+                               predicate_pattern,
+                               object_node_from_sql(object_pkey_values))
+
+                elif isinstance(object_pattern, _rdf.URIRef):
+                    # IRI, ref IRI, IRI
+
+                    query = self._ref_object_query(query, predicate_info,
+                                                   object_pattern)
+                    if query is None:
+                        return
+
+                    if self._orm.query(query.exists()).scalar():
+                        yield (subject_node, predicate_pattern, object_pattern)
+                    else:
+                        return
+
+                else:
+                    return
+
+            else:
+                if object_pattern is None:
+                    # IRI, non-ref IRI, *
+                    query = query.with_entities(predicate_attr)\
+                                 .filter(predicate_attr != None)
+                    for value, in self._query_rows(query):
+                        yield (subject_node, predicate_pattern,
+                               predicate_info.rdf_literal_from_sql(value))
+
+                elif isinstance(object_pattern, _rdf.Literal):
+                    # IRI, non-ref IRI, literal
+
+                    if object_pattern.datatype \
+                           not in predicate_info.rdf_datatypes:
+                        return
+
+                    object_sql_literal = \
+                        _common.sql_literal_from_rdf(object_pattern)
+                    query = \
+                        query.filter(predicate_attr != None,
+                                     predicate_attr == object_sql_literal)
+
+                    if self._orm.query(query.exists()).scalar():
+                        yield (subject_node, predicate_pattern, object_pattern)
+
+                else:
+                    return
+
+        else:
+            return
+
+    def _table_key_range_criteria(self, table_iri, key_range):
+
+        if key_range is None:
+            return ()
+
+        criteria = []
+        key_cols, key_nullables = self._table_keyset_columns(table_iri)
+        key_lower, key_upper = key_range
+        if key_lower is not None:
+            criteria.append(_keyset_after(key_cols, key_nullables, key_lower,
+                                          inclusive=True))
+        if key_upper is not None:
+            criteria.append(_keyset_before(key_cols, key_nullables,
+                                           key_upper))
+        return criteria
+
+    def _table_key_unique(self, table_iri):
+
+        # the rows of a table without a primary key can be duplicates unless
+        # its pseudo primary key is a unique index on columns that are not
+        # nullable
+        mapper = self._orm_mappers[table_iri]
+        if not mapper.has_pseudo_primary_key:
+            return True
+
+        pkey = mapper.local_table.primary_key
+        if pkey.nullable_columns_names:
+            return False
+        pkey_colnames = set(col.name for col in pkey.columns)
+        return any(index.unique
+                   and set(col.name for col in index.columns)
+                        == pkey_colnames
+                   for index in mapper.local_table.indexes)
+
+    def _table_keyset_columns(self, table_iri):
+
+        mapper = self._orm_mappers[table_iri]
+        pkey_cols = tuple(mapper.primary_key)
+
+        if not mapper.has_pseudo_primary_key:
+            return pkey_cols, (False,) * len(pkey_cols)
+
+        nullable_colnames = \
+            mapper.local_table.primary_key.nullable_columns_names
+        if not nullable_colnames:
+            return pkey_cols, (False,) * len(pkey_cols)
+
+        # a pseudo primary key on nullable columns does not identify rows, so
+        # the remaining columns are appended to keep the seek key total
+        key_cols = pkey_cols + tuple(col for col in mapper.columns
+                                     if col not in pkey_cols)
+        return key_cols, tuple(col.name in nullable_colnames
+                               or not col.primary_key and col.nullable
+                               for col in key_cols)
+
+    def _table_len_select(self, table_iri):
+
+        mapper = self._orm_mappers[table_iri]
+        cols_props = self._orm_columns_properties[table_iri]
+        rels = self._orm_relationships[table_iri]
+
+        # sum:
+        #   * 1 for each class statement (1 for each row, including those
+        #     whose pseudo primary key columns are null)
+        #   * 1 for each literal property statement (1 for each non-null
+        #     attribute of each row)
+        #   * 1 for each reference property statement (1 for each totally
+        #     non-null foreign key value tuple of each row)
+        return _sqla.select\
+                ([(_sqla.func.count()
+                   + _reduce
+                      (_add,
+                       (_sqlaf.sum
+                         (_sqla.case(((prop.class_attribute == None,
+                                       _sqla.literal(0)),),
+                                     else_=_sqla.literal(1)))
+                        for prop in cols_props.values()),
+                       _sqla.literal(0))
+                   + _reduce
+                      (_add,
+                       (_sqlaf.sum
+                         (_sqla.case
+                           (((_reduce
+                               (_sqla.and_,
+                                (cols_props[colname].class_attribute != None
+                                 for colname in colnames),
+                                _sqla.literal(True)),
+                              _sqla.literal(1)),
+                             ),
+                            else_=_sqla.literal(0)))
+                        for colnames in rels.keys()),
+                       _sqla.literal(0)))
+                  .label('len')])\
+                .select_from(mapper.local_table)
+
+    def _table_inbound_triples(self, table_iri, object_node,
+                               object_table_iri, object_pkey, orm=None,
+                               criteria=()):
+
+        table_refs = \
+            self._orm_inbound_refs.get(object_table_iri, {}).get(table_iri, ())
+        if not table_refs:
+            return
+
+        subject_pkey_cols = self._orm_mappers[table_iri].primary_key
+        subject_node_from_sql = self._orm_row_node_funcs[table_iri]
+        object_pkey_by_colname = {attr.property.columns[0].name: value
+                                  for attr, value in object_pkey.items()}
+
+        for ref in table_refs:
+            query = (orm or self._orm).query(*subject_pkey_cols)\
+                                      .filter(*criteria)
+
+            if ref.local_attr_by_remote_colname is not None:
+                # the foreign key holds the object's key
+                try:
+                    query = \
+                        query.filter(*(attr == object_pkey_by_colname[colname]
+                                       for colname, attr
+                                       in ref.local_attr_by_remote_colname
+                                              .items()))
+                except KeyError:
+                    return
+            else:
+                object_alias = \
+                    _sqla_orm.aliased(self._orm_classes[object_table_iri])
+                query = query.join(object_alias, ref.attr)\
+                             .filter(*(getattr(object_alias, attr.key)
+                                        == value
+                                       for attr, value
+                                       in object_pkey.items()))
+
+            for subject_pkey_values in self._table_rows(table_iri, query):
+                yield (subject_node_from_sql(subject_pkey_values),
+                       ref.predicate_iri, object_node)
+
+    def _row_ntriples_sql(self, table_iri, key_exprs, nullable=False):
+
+        """An SQL expression of the N-Triples node of a row, or null
+
+        The node is rendered only from integer keys, whose values need no
+        percent-encoding.  If *nullable*, a null key nullifies the node;
+        otherwise, the nulls of a pseudo primary key's nullable columns are
+        formatted as in the row's node.
+
+        """
+
+        mapper = self._orm_mappers[table_iri]
+        key_cols = mapper.primary_key
+        key_exprs = list(key_exprs)
+        if not all(isinstance(_sql_expr_type(expr), _sqla.Integer)
+                   for expr in key_exprs):
+            return None
+        # a pseudo primary key's columns are marked as not nullable, but
+        # their nullability is kept by the constraint
+        nullable_colnames = \
+            mapper.local_table.primary_key.nullable_columns_names \
+                if mapper.has_pseudo_primary_key and not nullable else ()
+
+        if table_iri in self._orm_bnode_tables:
+            prefix, suffix = u'_:{}/'.format(table_iri), None
+        else:
+            prefix, suffix = u'<{}/'.format(table_iri), u'>'
+
+        parts = [prefix]
+        for i, (col, expr) in enumerate(zip(key_cols, key_exprs)):
+            parts.append(u'{}{}='.format(u';' if i else u'',
+                                         _common.iri_safe(col.name)))
+            value_sql = _sqla.cast(expr, _sqla.Unicode)
+            if col.name in nullable_colnames:
+                value_sql = _sqlaf.coalesce(value_sql, u'None')
+            parts.append(value_sql)
+        if suffix is not None:
+            parts.append(suffix)
+        return _sql_concat(*parts)
+
+    def _table_iri(self, tablename):
+        return self._prefixed_iri(_common.iri_safe(tablename))
+
+    def _subjects_choices_triples(self, subjects, predicate_pattern,
+                                  object_pattern):
+
+        if predicate_pattern is not None \
+               and predicate_pattern != _rdf.RDF.type:
+            try:
+                predicate_table_iri = \
+                    self._predicate_info(predicate_pattern).table_iri
+            except (TypeError, ValueError):
+                return
+
+        for table_iri, criteria in self._subjects_criteria(subjects,
+                                                           _KEYS_CHUNK_SIZE):
+            if predicate_pattern is None:
+                triples = \
+                    self._table_allpredicates_triples(table_iri,
+                                                      object_pattern,
+                                                      criteria=criteria)
+            elif predicate_pattern == _rdf.RDF.type:
+                if object_pattern is not None and object_pattern != table_iri:
+                    continue
+                triples = self._table_type_triples(table_iri,
+                                                   criteria=criteria)
+            elif table_iri == predicate_table_iri:
+                triples = self._table_predicate_triples(table_iri,
+                                                        predicate_pattern,
+                                                        object_pattern,
+                                                        criteria=criteria)
+            else:
+                continue
+
+            for triple in triples:
+                yield triple
+
+    def _subjects_criteria(self, subjects, chunk_size,
+                           key_attrs_by_table_iri=None):
+
+        pkeys_values_by_table_iri = {}
+        for subject in subjects:
+            try:
+                table_iri, pkey = self._parse_row_node(subject)
+                pkey_values = \
+                    tuple(pkey[attr]
+                          for attr in self._table_pkey_attrs(table_iri))
+            except (TypeError, ValueError, KeyError):
+                continue
+            pkeys_values_by_table_iri.setdefault(table_iri, set())\
+             .add(pkey_values)
+
+        for table_iri, pkeys_values in pkeys_values_by_table_iri.items():
+            try:
+                pkey_attrs = key_attrs_by_table_iri[table_iri]
+            except (TypeError, KeyError):
+                pkey_attrs = self._table_pkey_attrs(table_iri)
+            pkeys_values = list(pkeys_values)
+            for chunk_start in range(0, len(pkeys_values), chunk_size):
+                chunk = pkeys_values[chunk_start:chunk_start + chunk_size]
+                yield table_iri, (_keys_in(pkey_attrs, chunk),)
+
+    def _table_allpredicates_triples(self, table_iri, object_pattern,
+                                     orm=None, criteria=()):
+
+        subject_mapper = self._orm_mappers[table_iri]
+        subject_pkey_cols = subject_mapper.primary_key
+        subject_node_from_sql = self._row_node_from_sql_func(table_iri)
+
+        query = (orm or self._orm).query(*subject_pkey_cols)\
+                                  .filter(*criteria)
+
+        if object_pattern is None:
+            # *(IRI), *, *
+            for triple in self._table_props_triples(table_iri,
+                                                    criteria=criteria,
+                                                    orm=orm):
+                yield triple
+
+        elif isinstance(object_pattern, _rdf.Literal):
+            # *(IRI), *, literal
+
+            subject_cols_props = \
+                self._orm_columns_properties[table_iri]
+            object_sql_types = \
+                _common.sql_literal_types_from_rdf(object_pattern.datatype)
+
+            for predicate_col in subject_mapper.columns:
+                predicate_sql_type = predicate_col.type
+                if isinstance(predicate_sql_type, object_sql_types):
+                    predicate_colname = predicate_col.name
+                    predicate_iri = \
+                        self._literal_property_iri(table_iri,
+                                                   predicate_colname)
+                    predicate_prop = subject_cols_props[predicate_colname]
+                    predicate_attr = predicate_prop.class_attribute
+                    object_sql_literal = \
+                        _common.sql_literal_from_rdf(object_pattern)
+                    query_cand = \
+                        query.filter(predicate_attr == object_sql_literal)
+
+                    for subject_pkey_values \
+                            in self._table_rows(table_iri, query_cand):
+                        yield (subject_node_from_sql(zip(subject_pkey_cols,
+                                                         subject_pkey_values)),
+                               predicate_iri, object_pattern)
+
+        elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
+            # *(IRI), *, IRI
+
+            if object_pattern == table_iri:
+                for subject_pkey_values in self._table_rows(table_iri, query):
+                    yield (subject_node_from_sql(zip(subject_pkey_cols,
+                                                     subject_pkey_values)),
+                           _rdf.RDF.type, table_iri)
+                return
+
+            try:
+                object_table_iri, object_pkey = \
+                    self._parse_row_node(object_pattern)
+            except (TypeError, ValueError):
+                return
+
+            for triple in self._table_inbound_triples(table_iri,
+                                                      object_pattern,
+                                                      object_table_iri,
+                                                      object_pkey,
+                                                      orm=orm,
+                                                      criteria=criteria):
+                yield triple
+
+        else:
+            return
+
+    def _table_pkey_attrs(self, table_iri):
+        cols_props = self._orm_columns_properties[table_iri]
+        return tuple(cols_props[col.name].class_attribute
+                     for col in self._orm_mappers[table_iri].primary_key)
+
+    def _table_predicate_triples(self, table_iri, predicate_iri,
+                                 object_pattern, criteria=()):
+
+        subject_mapper = self._orm_mappers[table_iri]
+        subject_pkey_cols = subject_mapper.primary_key
+        subject_pkey_len = len(subject_pkey_cols)
+        subject_node_from_sql = self._orm_row_node_funcs[table_iri]
+        try:
+            predicate_info = self._predicate_info(predicate_iri)
+        except ValueError:
+            return
+        predicate_attr = predicate_info.attr
+
+        query = self._orm.query(*subject_pkey_cols).filter(*criteria)
+
+        if predicate_info.object_table_iri is not None:
+            if object_pattern is None:
+                # *, ref IRI, *
+
+                object_node_from_sql = \
+                    self._orm_row_node_funcs[predicate_info.object_table_iri]
+
+                query, object_pkey_attrs = \
+                    self._ref_objects_query(query, predicate_info)
+                query = query.add_columns(*object_pkey_attrs)
+
+                for result_values in self._table_rows(table_iri, query):
+                    yield (subject_node_from_sql
+                            (result_values[:subject_pkey_len]),
+                           predicate_iri,
+                           object_node_from_sql
+                            (result_values[subject_pkey_len:]))
+
+            elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
+                # *, ref IRI, node
+
+                query = self._ref_object_query(query, predicate_info,
+                                               object_pattern)
+                if query is None:
+                    return
+
+                for subject_pkey_values in self._table_rows(table_iri, query):
+                    yield (subject_node_from_sql(subject_pkey_values),
+                           predicate_iri,
+                           object_pattern)
+
+            else:
+                return
+
+        else:
+            query = query.add_columns(predicate_attr)\
+                         .filter(predicate_attr != None)
+
+            if isinstance(object_pattern, _rdf.Literal):
+                # *(IRI), non-ref IRI, literal
+
+                if object_pattern.datatype \
+                       not in predicate_info.rdf_datatypes:
+                    return
+
+                object_sql_literal = \
+                    _common.sql_literal_from_rdf(object_pattern)
+                query = query.filter(predicate_attr == object_sql_literal)
+
+            if object_pattern is None \
+                 or isinstance(object_pattern, _rdf.Literal):
+                # *(IRI), non-ref IRI, *
+                query = query.add_columns(predicate_attr)
+                rdf_literal_from_sql = predicate_info.rdf_literal_from_sql
+                for result_values in self._table_rows(table_iri, query):
+                    yield (subject_node_from_sql
+                            (result_values[:subject_pkey_len]),
+                           predicate_iri,
+                           rdf_literal_from_sql(result_values[-1]))
+
+            else:
+                return
+
+    def _table_python_ntriples(self, table_iri, criteria=()):
+        projector = self._orm_projectors[table_iri]
+        query = self._table_props_query(projector, criteria=criteria)
+        row_ntriples = projector.row_ntriples
+        for row in self._table_rows(table_iri, query):
+            yield row_ntriples(row)
+
+    def _table_removal_statements(self, table_iri, predicate_pattern,
+                                  object_pattern, criteria=()):
+
+        """The statements that remove the matching triples of a table
+
+        .. seealso:: :meth:`remove`
+
+        :raise ValueError:
+            Raised if a matching value cannot be set to null.
+
+        """
+
+        mapper = self._orm_mappers[table_iri]
+        table = mapper.local_table
+        criteria = list(criteria)
+
+        if predicate_pattern is None:
+            if object_pattern is None \
+                   or (isinstance(object_pattern, _rdf.URIRef)
+                       and object_pattern == table_iri):
+                # *, *, * or *, *, class IRI
+                return [_where(table.delete(), criteria)]
+
+            elif isinstance(object_pattern, _rdf.Literal):
+                # *, *, literal
+
+                object_sql_types = \
+                    _common.sql_literal_types_from_rdf(object_pattern.datatype)
+                object_sql_literal = \
+                    _common.sql_literal_from_rdf(object_pattern)
+
+                statements = \
+                    [self._null_columns_statement
+                      (table_iri, (col,),
+                       criteria + [col == object_sql_literal])
+                     for col in mapper.columns
+                     if isinstance(col.type, object_sql_types)]
+
+            elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
+                # *, *, node
+
+                try:
+                    object_table_iri, _ = \
+                        self._parse_row_node(object_pattern)
+                except (TypeError, ValueError, KeyError):
+                    return []
+
+                statements = []
+                for ref in self._orm_inbound_refs.get(object_table_iri, {})\
+                                                 .get(table_iri, ()):
+                    local_values = \
+                        self._ref_local_values(ref.attr.property,
+                                               object_pattern)
+                    if local_values is None:
+                        continue
+                    statements.append(self._null_columns_statement
+                                       (table_iri,
+                                        [col for col, _ in local_values],
+                                        criteria
+                                         + [col == value
+                                            for col, value in local_values]))
+
+            else:
+                return []
+
+        elif predicate_pattern == _RDF_TYPE:
+            if object_pattern is None \
+                   or (isinstance(object_pattern, _rdf.URIRef)
+                       and object_pattern == table_iri):
+                # *, rdf:type, *
+                return [_where(table.delete(), criteria)]
+            return []
+
+        else:
+            try:
+                predicate_info = self._predicate_info(predicate_pattern)
+            except (TypeError, ValueError):
+                return []
+            if predicate_info.table_iri != table_iri:
+                return []
+
+            if predicate_info.object_table_iri is not None:
+                rel = predicate_info.attr.property
+
+                if object_pattern is None:
+                    # *, ref IRI, *
+                    cols = [col for col, _ in rel.local_remote_pairs]
+                    criteria.extend(col != None for col in cols)
+
+                elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
+                    # *, ref IRI, node
+                    local_values = self._ref_local_values(rel,
+                                                          object_pattern)
+                    if local_values is None:
+                        return []
+                    cols = [col for col, _ in local_values]
+                    criteria.extend(col == value
+                                    for col, value in local_values)
+
+                else:
+                    return []
+
+            else:
+                col, = predicate_info.attr.property.columns
+                cols = (col,)
+
+                if object_pattern is None:
+                    # *, non-ref IRI, *
+                    criteria.append(col != None)
+
+                elif isinstance(object_pattern, _rdf.Literal):
+                    # *, non-ref IRI, literal
+                    if object_pattern.datatype \
+                           not in predicate_info.rdf_datatypes:
+                        return []
+                    criteria.append(col == _common.sql_literal_from_rdf
+                                            (object_pattern))
+
+                else:
+                    return []
+
+            statements = [self._null_columns_statement(table_iri, cols,
+                                                       criteria)]
+
+        return [statement for statement in statements
+                if statement is not None]
+
+    def _table_rows(self, table_iri, query):
+        if self._keyset_page_size is not None:
+            return self._keyset_rows(table_iri, query)
+        else:
+            return self._query_rows(query)
+
+    def _table_sql_ntriples(self, table_iri, criteria=()):
+
+        """The N-Triples statements of a table's rows, rendered in SQL
+
+        The query concatenates each statement whose terms the database can
+        format as :meth:`table_ntriples` does: the nodes of rows with
+        integer keys, and the literals of boolean, date, integer, and string
+        columns.  The other statements are formatted from the
+        rows' values.  If all of a table's statements are rendered, each
+        row's text is concatenated by the query as a whole.
+
+        """
+
+        dialect_name = self._rdb.dialect.name
+        projector = self._orm_projectors[table_iri]
+        pkey_len = len(projector.pkey_cols)
+        subject_sql = self._row_ntriples_sql(table_iri, projector.pkey_cols)
+        type_suffix = u' <{}> <{}> .\n'.format(_rdf.RDF.type, table_iri)
+
+        # the fragments that follow the subject in each statement, as
+        # (SQL expression or null, start, stop, fallback function) items
+        items = []
+        i = pkey_len
+        for attr, predicate_iri in zip(projector.literal_attrs,
+                                       projector.literal_predicates_iris):
+            predicate = u'<{}> '.format(predicate_iri)
+            sql_type = self._predicate_info(predicate_iri).sql_type
+            object_sql = _sql_ntriples_literal(attr, sql_type, dialect_name)
+            fragment_sql = \
+                _sql_concat(predicate, object_sql, u' .\n') \
+                    if object_sql is not None else None
+            items.append((fragment_sql, i, i + 1,
+                          _partial(_literal_ntriples_fragment, predicate,
+                                   _common.ntriples_literal_from_sql_func
+                                    (sql_type))))
+            i += 1
+        for (_, object_pkey_attrs), predicate_iri \
+                in zip(projector.refs, projector.ref_predicates_iris):
+            predicate = u'<{}> '.format(predicate_iri)
+            object_table_iri = \
+                self._predicate_info(predicate_iri).object_table_iri
+            object_sql = self._row_ntriples_sql(object_table_iri,
+                                                object_pkey_attrs,
+                                                nullable=True)
+            fragment_sql = \
+                _sql_concat(predicate, object_sql, u' .\n') \
+                    if object_sql is not None else None
+            items.append((fragment_sql, i, i + len(object_pkey_attrs),
+                          _partial(_ref_ntriples_fragment, predicate,
+                                   self._orm_row_ntriples_funcs
+                                        [object_table_iri])))
+            i += len(object_pkey_attrs)
+
+        query = self._table_props_query(projector, criteria=criteria)
+
+        if subject_sql is not None \
+               and all(fragment_sql is not None
+                       for fragment_sql, _, _, _ in items):
+            row_sql = \
+                _sql_concat(subject_sql, type_suffix,
+                            *(_sqlaf.coalesce(_sql_concat(subject_sql, u' ',
+                                                          fragment_sql),
+                                              u'')
+                              for fragment_sql, _, _, _ in items))
+            for row in self._table_rows(table_iri,
+                                        query.with_entities(row_sql)):
+                yield row[0]
+            return
+
+        row_items = []
+        j = i
+        if subject_sql is not None:
+            query = query.add_columns(subject_sql)
+            subject_index = j
+            j += 1
+        for fragment_sql, start, stop, fragment_from_sql in items:
+            if fragment_sql is not None:
+                query = query.add_columns(fragment_sql)
+                row_items.append((j, None))
+                j += 1
+            else:
+                row_items.append((None, (start, stop, fragment_from_sql)))
+
+        subject_ntriples_from_sql = self._orm_row_ntriples_funcs[table_iri]
+        for row in self._table_rows(table_iri, query):
+            if subject_sql is not None:
+                subject = row[subject_index]
+            else:
+                subject = subject_ntriples_from_sql(row[:pkey_len])
+            statements = [subject + type_suffix]
+            for index, fallback in row_items:
+                if index is not None:
+                    fragment = row[index]
+                else:
+                    start, stop, fragment_from_sql = fallback
+                    fragment = fragment_from_sql(row[start:stop])
+                if fragment is not None:
+                    statements.append(subject + u' ' + fragment)
+            yield u''.join(statements)
+
+    def _tables_len(self, tables_iris):
+
+        selects = [self._table_len_select(table_iri)
+                   for table_iri in tables_iris]
+        if not selects:
+            return 0
+
+        lens = _sqla.union_all(*selects).alias()
+        return int(self._orm.query(_sqlaf.coalesce(_sqlaf.sum(lens.c.len), 0))
+                            .scalar())
+
+    def _tables_triples(self, tables_iris, table_triples_func):
+        if self._table_workers > 1:
+            return self._parallel_tables_triples(tables_iris,
+                                                 table_triples_func)
+        else:
+            return (triple
+                    for table_iri in tables_iris
+                    for triple in table_triples_func(table_iri))
+
+    def _table_props_triples(self, table_iri, literal_props=None,
+                             ref_props=None, type_=True, criteria=(),
+                             orm=None):
+
+        if literal_props is None and ref_props is None:
+            projector = self._orm_projectors[table_iri]
+        else:
+            projector = self._compile_table_projector(table_iri,
+                                                      literal_props=
+                                                          literal_props,
+                                                      ref_props=ref_props)
+
+        query = self._table_props_query(projector, type_=type_,
+                                        criteria=criteria, orm=orm)
+        row_triples = projector.row_triples
+        for row in self._table_rows(table_iri, query):
+            for triple in row_triples(row, type_=type_):
+                yield triple
+
+    def _table_props_query(self, projector, type_=True, criteria=(),
+                           orm=None):
+
+        query = (orm or self._orm).query(*projector.pkey_cols)\
+                                  .filter(*criteria)\
+                                  .add_columns(*projector.literal_attrs)
+        for rel_attr, object_pkey_attrs in projector.refs:
+            if rel_attr is not None:
+                query = query.outerjoin(rel_attr)
+            query = query.add_columns(*object_pkey_attrs)
+
+        if not type_:
+            # only the rows with at least one of the properties are described
+            query = \
+                query.filter(_sqla.or_(*([attr != None
+                                          for attr in projector.literal_attrs]
+                                         + [_sqla.and_(*(attr != None
+                                                         for attr
+                                                         in object_pkey_attrs))
+                                            for _, object_pkey_attrs
+                                            in projector.refs])))
+
+        return query
+
+    def _table_type_triples(self, table_iri, orm=None, criteria=()):
+
+        try:
+            table_orm_mapper = self._orm_mappers[table_iri]
+        except KeyError:
+            return
+
+        subject_pkey_cols = table_orm_mapper.primary_key
+        subject_node_from_sql = self._orm_row_node_funcs[table_iri]
+
+        query = (orm or self._orm).query(*subject_pkey_cols)\
+                                  .filter(*criteria)
+        for subject_pkey_values in self._table_rows(table_iri, query):
+            yield (subject_node_from_sql(subject_pkey_values),
+                   _rdf.RDF.type, table_iri)
+
+    def _unprefixed_iri(self, iri):
+
+        if self.base_iri is not None:
+            base_iri_match = \
+                _re.match('{}(.*)'.format(_re.escape(self.base_iri)))
+            if base_iri_match:
+                return _rdf.URIRef(base_iri_match.group(1))
+
+        return _rdf.URIRef(iri)
+
+    def _update_row_values(self, table_iri, values, subject, predicate,
+                           object, node_key_values):
+
+        """Map a triple onto the values of its subject's row
+
+        :param dict values:
+            The values of the subject's row, which are updated with the
+            triple's.
+
+        :param node_key_values:
+            A function that maps a row node onto its table and key values,
+            such as :meth:`_row_node_key_values`.
+        :type node_key_values:
+            :class:`rdflib.term.Node`
+            -> (:class:`rdflib.URIRef`, {:obj:`str`: object})
+
+        :raise ValueError:
+            Raised if the triple is not in the direct mapping of the
+            subject's table.
+
+        """
+
+        if predicate == _RDF_TYPE:
+            if object != table_iri:
+                raise ValueError('invalid class {!r} of row {!r}: expecting'
+                                  ' {!r}'
+                                  .format(object, subject, table_iri))
+            return
+
+        predicate_info = self._predicate_info(predicate)
+        if predicate_info.table_iri != table_iri:
+            raise ValueError('invalid predicate {!r} of row {!r}: not a'
+                              ' property of table {!r}'
+                              .format(predicate, subject, table_iri))
+
+        if predicate_info.object_table_iri is None:
+            if not isinstance(object, _rdf.Literal) \
+                   or object.datatype not in predicate_info.rdf_datatypes:
+                raise ValueError('invalid object {!r} of literal property'
+                                  ' {!r}: expecting a literal of one of the'
+                                  ' datatypes {}'
+                                  .format(object, predicate,
+                                          predicate_info.rdf_datatypes))
+            col, = predicate_info.attr.property.columns
+            object_values = {col.key: _common.sql_literal_from_rdf(object)}
+
+        else:
+            if predicate_info.object_key_attrs is None:
+                raise ValueError('cannot map reference property {!r}: it does'
+                                  ' not reference a primary key'
+                                  .format(predicate))
+            object_table_iri, object_key_values = node_key_values(object)
+            if object_table_iri != predicate_info.object_table_iri:
+                raise ValueError('invalid object {!r} of reference property'
+                                  ' {!r}: not a row of table {!r}'
+                                  .format(object, predicate,
+                                          predicate_info.object_table_iri))
+            object_pkey_cols = \
+                predicate_info.attr.property.target.primary_key.columns
+            object_values = \
+                {attr.property.columns[0].key: object_key_values[col.key]
+                 for attr, col in zip(predicate_info.object_key_attrs,
+                                      object_pkey_cols)}
+
+        for colkey, value in object_values.items():
+            if colkey in values and values[colkey] != value:
+                raise ValueError('invalid object {!r} of predicate {!r}:'
+                                  ' conflicts with the key of row {!r}'
+                                  .format(object, predicate, subject))
+        values.update(object_values)
+
+
+PatternCacheStats = _namedtuple('PatternCacheStats',
+                                ('hits', 'misses', 'evictions', 'entries',
+                                 'bytes'))
+
+
+_logger = _log.getLogger(__name__)
+
+_InboundRef = _namedtuple('_InboundRef',
+                          ('attr', 'predicate_iri',
+                           'local_attr_by_remote_colname'))
+
+# the names of the key parameters of :meth:`DirectMapping.flush`\ 's updates,
+# which must differ from the names of the tables' columns
+_KEY_BINDPARAM_FORMAT = 'rdb2rdf_key_{}'
+
+_KEYS_CHUNK_SIZE = 500
+
+_LEN_MODES = ('exact', 'approximate')
+
+_NTRIPLES_ESCAPES = ((u'\\', u'\\\\'), (u'\n', u'\\n'), (u'"', u'\\"'),
+                     (u'\r', u'\\r'))
+
+_PARALLEL_POLL_INTERVAL = 0.1
+
+_PARALLEL_TRIPLES_BATCH_SIZE = 256
+
+_POSTGRESQL_NULL_FRACS_SQL = \
+    '''SELECT schemaname, tablename, attname, null_frac
+       FROM pg_catalog.pg_stats
+       WHERE schemaname = ANY(:schemas)'''
+
+_POSTGRESQL_ROWS_COUNTS_SQL = \
+    '''SELECT n.nspname, c.relname, c.reltuples
+       FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+       WHERE n.nspname = ANY(:schemas)'''
+
+_PredicateInfo = _namedtuple('_PredicateInfo',
+                             ('attr', 'table_iri', 'sql_type', 'rdf_datatypes',
+                              'rdf_literal_from_sql', 'object_table_iri',
+                              'object_key_attrs'))
+
+_RDF_TYPE = _rdf.RDF.type
+
+_SCHEMA_FINGERPRINT_SQLS = \
+    {'postgresql':
+         ('''SELECT c.relname, c.relkind, a.attnum, a.attname,
+                    pg_catalog.format_type(a.atttypid, a.atttypmod),
+                    a.attnotnull, pg_catalog.pg_get_expr(d.adbin, d.adrelid)
+             FROM pg_catalog.pg_attribute a
+                  JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+                  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                  LEFT JOIN pg_catalog.pg_attrdef d
+                   ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+             WHERE n.nspname = current_schema() AND a.attnum > 0
+                   AND NOT a.attisdropped
+                   AND c.relkind IN ('r', 'v', 'm', 'f')
+             ORDER BY c.relname, a.attnum''',
+          '''SELECT c.relname, o.conname,
+                    pg_catalog.pg_get_constraintdef(o.oid)
+             FROM pg_catalog.pg_constraint o
+                  JOIN pg_catalog.pg_class c ON c.oid = o.conrelid
+                  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+             WHERE n.nspname = current_schema()
+             ORDER BY c.relname, o.conname''',
+          '''SELECT tablename, indexname, indexdef
+             FROM pg_catalog.pg_indexes
+             WHERE schemaname = current_schema()
+             ORDER BY tablename, indexname'''),
+     'sqlite':
+         ('''SELECT type, name, tbl_name, sql
+             FROM sqlite_master
+             ORDER BY type, name''',),
+     }
+
+_SQL_RENDERING_DIALECTS = ('postgresql', 'sqlite')
+
+_SQLITE_STAT1_EXISTS_SQL = \
+    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+
+_SQLITE_STAT1_SQL = 'SELECT tbl, stat FROM sqlite_stat1'
+
+_UNION_CHUNK_SIZE = 100
+
+
+class _LazyIndex(_Mapping):
+
+    """A mapping whose items are loaded on demand
+
+    Looking up a missing key calls *load_key* with the key before trying
+    again, and iterating calls *load_all* first.
+
+    """
+
+    def __init__(self, load_key, load_all):
+        self._items = {}
+        self._load_key = load_key
+        self._load_all = load_all
+
+    def __getitem__(self, key):
+        try:
+            return self._items[key]
+        except KeyError:
+            self._load_key(key)
+            return self._items[key]
+
+    def __iter__(self):
+        self._load_all()
+        return iter(self._items)
+
+    def __len__(self):
+        self._load_all()
+        return len(self._items)
+
+    def update(self, items):
+        self._items.update(items)
+
+
+class _LazySet(_Set):
+
+    """A set whose items are loaded on demand
+
+    .. seealso:: :class:`_LazyIndex`
 
-                for predicate_prop in subject_rels.values():
-                    query_cand = \
-                        query.join(predicate_prop.class_attribute)\
-                             .filter(*(attr == value
-                                       for attr, value
-                                       in object_pkey.items()))
-                    if self._orm.query(query_cand.exists()).scalar():
-                        predicate_iri = \
-                            self._ref_property_iri\
-                             (subject_table_iri,
-                              (col.name
-                               for col in predicate_prop.local_columns))
-                        yield (subject_node, predicate_iri, object_pattern)
+    """
 
-            else:
-                return
+    def __init__(self, load_key, load_all):
+        self._items = set()
+        self._load_key = load_key
+        self._load_all = load_all
 
-        elif predicate_pattern == _rdf.RDF.type:
-            if object_pattern is None \
-                   or (isinstance(object_pattern, _rdf.URIRef)
-                       and object_pattern == subject_table_iri):
-                if self._orm.query(query.exists()).scalar():
-                    yield (subject_node, _rdf.RDF.type, subject_table_iri)
+    def __contains__(self, key):
+        if key not in self._items:
+            self._load_key(key)
+        return key in self._items
 
-        elif isinstance(predicate_pattern, _rdf.URIRef):
-            try:
-                predicate_attr = \
-                    self._predicate_orm_attr(predicate_pattern)
-            except ValueError:
-                return
-            predicate_prop = predicate_attr.property
+    def __iter__(self):
+        self._load_all()
+        return iter(self._items)
 
-            if isinstance(predicate_prop, _sqla_orm.RelationshipProperty):
-                if object_pattern is None:
-                    # IRI, ref IRI, *
+    def __len__(self):
+        self._load_all()
+        return len(self._items)
 
-                    object_table = predicate_prop.target
-                    object_table_iri = self._table_iri(object_table.name)
-                    object_pkey_cols = object_table.primary_key.columns
+    def update(self, items):
+        self._items.update(items)
 
-                    query = \
-                        query.join(predicate_attr)\
-                             .with_entities(*object_pkey_cols)
-                    for object_pkey_values in query.all():
-                        yield (subject_node,
-                               predicate_pattern,
-                               self._row_iri_from_sql(object_table_iri,
-                                                      zip(object_pkey_cols,
-                                                          object_pkey_values)))
 
-                elif isinstance(object_pattern, _rdf.URIRef):
-                    # IRI, ref IRI, IRI
+class _PatternCache(object):
 
-                    try:
-                        object_table_iri, object_pkey = \
-                            self._parse_row_node(object_pattern)
-                    except (TypeError, ValueError):
-                        return
+    """A least-recently-used cache of the results of triple patterns
 
-                    object_cols_props = \
-                        self._orm_columns_properties[object_table_iri]
+    The size of a result is approximated by the sizes of its triples and
+    their terms, counting terms that are shared among triples once per
+    triple.
 
-                    query = query.join(predicate_attr)\
-                                 .filter(*(attr == value
-                                           for attr, value
-                                           in object_pkey.items()))
+    """
 
-                    if self._orm.query(query.exists()).scalar():
-                        yield (subject_node, predicate_pattern, object_pattern)
-                    else:
-                        return
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = _OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
 
-                else:
-                    return
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        # results that are being filled were matched before the clearing
+        self._generation += 1
 
-            else:
-                predicate_col, = predicate_attr.property.columns
+    def fill(self, pattern, triples):
 
-                if object_pattern is None:
-                    # IRI, non-ref IRI, *
-                    query = query.with_entities(predicate_attr)\
-                                 .filter(predicate_attr != None)
-                    for value, in query.all():
-                        yield (subject_node, predicate_pattern,
-                               _common.rdf_literal_from_sql
-                                (value, sql_type=predicate_col.type))
+        """Cache a result as it is consumed
 
-                elif isinstance(object_pattern, _rdf.Literal):
-                    # IRI, non-ref IRI, literal
+        :param pattern:
+            The pattern.
+        :type pattern: (object, object, object)
 
-                    if object_pattern.datatype \
-                           not in _common.rdf_datatypes_from_sql\
-                                   (predicate_col.type):
-                        return
+        :param triples:
+            The result, as yielded by :meth:`DirectMapping.triples`.
+        :type triples: ~[((object, object, object), null)]
 
-                    object_sql_literal = \
-                        _common.sql_literal_from_rdf(object_pattern)
-                    query = \
-                        query.filter(predicate_attr != None,
-                                     predicate_attr == object_sql_literal)
+        :return:
+            The result.
+        :rtype: ~[((object, object, object), null)]
 
-                    if self._orm.query(query.exists()).scalar():
-                        yield (subject_node, predicate_pattern, object_pattern)
+        """
 
+        generation = self._generation
+        cached = []
+        nbytes = 0
+        for triple, context in triples:
+            if cached is not None:
+                nbytes += _getsizeof(triple) \
+                          + sum(_getsizeof(term) for term in triple)
+                if nbytes <= self.max_bytes:
+                    cached.append(triple)
                 else:
-                    return
+                    cached = None
+            yield triple, context
+
+        if cached is not None and generation == self._generation:
+            self._put(pattern, tuple(cached), nbytes)
+
+    def get(self, pattern):
+        try:
+            triples, nbytes = self._entries.pop(pattern)
+        except KeyError:
+            self._misses += 1
+            return None
+        self._entries[pattern] = (triples, nbytes)
+        self._hits += 1
+        return triples
 
+    def stats(self):
+        return PatternCacheStats(hits=self._hits, misses=self._misses,
+                                 evictions=self._evictions,
+                                 entries=len(self._entries),
+                                 bytes=self._bytes)
+
+    def _put(self, pattern, triples, nbytes):
+
+        try:
+            _, replaced_nbytes = self._entries.pop(pattern)
+        except KeyError:
+            pass
         else:
-            return
+            self._bytes -= replaced_nbytes
 
-    def _table_iri(self, tablename):
-        return self._prefixed_iri(_common.iri_safe(tablename))
+        while self._entries \
+                and (len(self._entries) >= self.max_entries
+                     or self._bytes + nbytes > self.max_bytes):
+            _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+            self._bytes -= evicted_nbytes
+            self._evictions += 1
 
-    def _table_allpredicates_triples(self, table_iri, object_pattern):
+        self._entries[pattern] = (triples, nbytes)
+        self._bytes += nbytes
 
-        subject_mapper = self._orm_mappers[table_iri]
-        subject_pkey_cols = subject_mapper.primary_key
-        subject_node_from_sql = self._row_node_from_sql_func(table_iri)
 
-        query = self._orm.query(*subject_pkey_cols)
+class _SessionState(object):
 
-        if object_pattern is None:
-            # *(IRI), *, *
+    """The state of a :class:`DirectMapping`\ 's transaction
 
-            subject_mapper = self._orm_mappers[table_iri]
-            subject_cols = subject_mapper.columns
-            subject_cols_props = self._orm_columns_properties[table_iri]
-            subject_rels = self._orm_relationships[table_iri].values()
+    This is the cached length, the pattern cache, and the buffered rows of
+    :meth:`DirectMapping.add`\ ed triples, which are kept until the
+    transaction ends.
 
-            query = query.with_entities()
+    .. seealso:: :class:`_ThreadSessionState`
 
-            for predicate_col in subject_cols:
-                predicate_prop = subject_cols_props[predicate_col.name]
-                predicate_attr = predicate_prop.class_attribute
+    """
 
-                query = query.add_columns(predicate_attr)
+    def __init__(self, cache_patterns=False, pattern_cache_size=None,
+                 pattern_cache_bytes=None):
+        self.len = None
+        self.pattern_cache = \
+            _PatternCache(pattern_cache_size, pattern_cache_bytes) \
+                if cache_patterns else None
+        self.pending_rows = {}
+        self.pending_rows_len = 0
+        self.pending_nodes = {}
 
-            for predicate_prop in subject_rels:
-                object_table = predicate_prop.target
-                object_table_iri = self._table_iri(object_table.name)
-                object_cols_props = \
-                    self._orm_columns_properties[object_table_iri]
-                predicate_attr = predicate_prop.class_attribute
+    def clear_pending(self):
+        self.pending_rows = {}
+        self.pending_rows_len = 0
+        self.pending_nodes = {}
 
-                query = \
-                    query.outerjoin(predicate_attr)\
-                         .add_columns(*(object_cols_props[col.name]
-                                         .class_attribute
-                                        for col
-                                        in object_table.primary_key.columns))
 
-            for query_result_values in query.all():
-                query_result_values_pending = _deque(query_result_values)
-                subject_cols_values = [query_result_values_pending.popleft()
-                                       for _ in range(len(subject_cols))]
-                subject_pkey_values = (subject_cols_values[i]
-                                       for i, col in enumerate(subject_cols)
-                                       if col in subject_pkey_cols)
-                subject_node = subject_node_from_sql(zip(subject_pkey_cols,
-                                                         subject_pkey_values))
+class _TableProjector(object):
 
-                yield (subject_node, _rdf.RDF.type, table_iri)
+    """A compiled projection of a table's rows onto triples
 
-                for predicate_col, object_value in zip(subject_cols,
-                                                       subject_cols_values):
+    Each row is a tuple of the table's key values, the values of the
+    literal properties, and the key values of the referenced rows.  The
+    offsets of the values in a row, the predicate IRIs, and the conversions
+    of the values to RDF terms are all resolved when the projector is
+    compiled.
 
-                    if object_value is None:
-                        continue
+    .. seealso:: :meth:`DirectMapping._compile_table_projector`
 
-                    predicate_iri = \
-                        self._literal_property_iri(table_iri,
-                                                   predicate_col.name)
+    """
 
-                    yield (subject_node, predicate_iri,
-                           _common.rdf_literal_from_sql
-                            (object_value, sql_type=predicate_col.type))
+    def __init__(self, table_iri, pkey_cols, literal_attrs, refs,
+                 subject_node_from_sql, literal_items, ref_items,
+                 subject_ntriples_from_sql, ntriples_literal_items,
+                 ntriples_ref_items):
+        self.table_iri = table_iri
+        self.pkey_cols = pkey_cols
+        self.literal_attrs = literal_attrs
+        self.refs = refs
+        self._subject_node_from_sql = subject_node_from_sql
+        self._subject_pkey_len = len(pkey_cols)
+        self._literal_items = tuple(literal_items)
+        self._ref_items = tuple(ref_items)
+        self.literal_predicates_iris = \
+            tuple(predicate_iri for _, predicate_iri, _ in self._literal_items)
+        self.ref_predicates_iris = \
+            tuple(predicate_iri for _, _, predicate_iri, _ in self._ref_items)
+        self._type_iri = _rdf.RDF.type
+        self._subject_ntriples_from_sql = subject_ntriples_from_sql
+        self._ntriples_literal_items = tuple(ntriples_literal_items)
+        self._ntriples_ref_items = tuple(ntriples_ref_items)
+        self._ntriples_type_suffix = \
+            u'<{}> <{}> .\n'.format(_rdf.RDF.type, table_iri)
+
+    def row_ntriples(self, row, type_=True):
+
+        """The N-Triples statements of a row's triples
+
+        The statements are in the same order as the triples of
+        :meth:`row_triples`, each terminated by a newline.  Characters
+        outside ASCII are not escaped.
+
+        :rtype: :obj:`unicode`
 
-                for predicate_prop in subject_rels:
-                    object_table = predicate_prop.target
-                    object_pkey_cols = object_table.primary_key.columns
-                    object_pkey_values = \
-                        [query_result_values_pending.popleft()
-                         for _ in range(len(object_pkey_cols))]
+        """
 
-                    if any(value is None for value in object_pkey_values):
-                        continue
+        subject = \
+            self._subject_ntriples_from_sql(row[:self._subject_pkey_len]) \
+            + u' '
+        statements = []
 
-                    predicate_iri = \
-                        self._ref_property_iri\
-                         (table_iri,
-                          (col.name for col in predicate_prop.local_columns))
+        if type_:
+            statements.append(subject + self._ntriples_type_suffix)
 
-                    yield (subject_node,
-                           predicate_iri,
-                           self._row_node_from_sql\
-                            (self._table_iri(object_table.name),
-                             zip(object_pkey_cols, object_pkey_values)))
+        for i, predicate, ntriples_literal_from_sql \
+                in self._ntriples_literal_items:
+            value = row[i]
+            if value is not None:
+                statements.append(subject + predicate
+                                  + ntriples_literal_from_sql(value)
+                                  + u' .\n')
 
-        elif isinstance(object_pattern, _rdf.Literal):
-            # *(IRI), *, literal
+        for start, stop, predicate, object_ntriples_from_sql \
+                in self._ntriples_ref_items:
+            object_pkey_values = row[start:stop]
+            if any(value is None for value in object_pkey_values):
+                continue
+            statements.append(subject + predicate
+                              + object_ntriples_from_sql(object_pkey_values)
+                              + u' .\n')
 
-            subject_cols_props = \
-                self._orm_columns_properties[table_iri]
-            object_sql_types = \
-                _common.sql_literal_types_from_rdf(object_pattern.datatype)
+        return u''.join(statements)
 
-            for predicate_col in subject_mapper.columns:
-                predicate_sql_type = predicate_col.type
-                if isinstance(predicate_sql_type, object_sql_types):
-                    predicate_colname = predicate_col.name
-                    predicate_iri = \
-                        self._literal_property_iri(table_iri,
-                                                   predicate_colname)
-                    predicate_prop = subject_cols_props[predicate_colname]
-                    predicate_attr = predicate_prop.class_attribute
-                    object_sql_literal = \
-                        _common.sql_literal_from_rdf(object_pattern)
-                    query_cand = \
-                        query.filter(predicate_attr == object_sql_literal)
+    def row_triples(self, row, type_=True):
 
-                    for subject_pkey_values in query_cand.all():
-                        yield (subject_node_from_sql(zip(subject_pkey_cols,
-                                                         subject_pkey_values)),
-                               predicate_iri, object_pattern)
+        subject_node = \
+            self._subject_node_from_sql(row[:self._subject_pkey_len])
 
-        elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
-            # *(IRI), *, IRI
+        if type_:
+            yield (subject_node, self._type_iri, self.table_iri)
 
-            if object_pattern == table_iri:
-                for subject_pkey_values in query.all():
-                    yield (subject_node_from_sql(zip(subject_pkey_cols,
-                                                     subject_pkey_values)),
-                           _rdf.RDF.type, table_iri)
-                return
+        for i, predicate_iri, rdf_literal_from_sql in self._literal_items:
+            value = row[i]
+            if value is not None:
+                yield (subject_node, predicate_iri, rdf_literal_from_sql(value))
 
-            try:
-                object_table_iri, object_pkey = \
-                    self._parse_row_node(object_pattern)
-            except (TypeError, ValueError):
-                return
+        for start, stop, predicate_iri, object_node_from_sql \
+                in self._ref_items:
+            object_pkey_values = row[start:stop]
+            if any(value is None for value in object_pkey_values):
+                continue
+            yield (subject_node, predicate_iri,
+                   object_node_from_sql(object_pkey_values))
 
-            subject_rels = self._orm_relationships[table_iri]
-            object_cols_props = self._orm_columns_properties[object_table_iri]
 
-            for predicate_prop in subject_rels.values():
-                predicate_iri = \
-                    self._ref_property_iri(table_iri,
-                                           (col.name
-                                            for col
-                                            in predicate_prop.local_columns))
+class _ThreadSessionState(_threading.local, _SessionState):
 
-                query_cand = \
-                    query.join(predicate_prop.class_attribute)\
-                         .filter(*(attr == value
-                                   for attr, value in object_pkey.items()))
-                for subject_pkey_values in query_cand.all():
-                    yield (subject_node_from_sql(zip(subject_pkey_cols,
-                                                     subject_pkey_values)),
-                           predicate_iri, object_pattern)
+    """The state of a thread-safe :class:`DirectMapping`\ 's transactions
 
-        else:
-            return
+    Each thread sees its own :class:`_SessionState`, which is initialized
+    with the same arguments when the thread first uses it.
 
-    def _table_predicate_triples(self, table_iri, predicate_iri,
-                                 object_pattern):
+    """
 
-        subject_mapper = self._orm_mappers[table_iri]
-        subject_pkey_cols = subject_mapper.primary_key
-        subject_pkey_len = len(subject_pkey_cols)
-        subject_node_from_sql = self._row_node_from_sql_func(table_iri)
+
+class _WorkerError(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def _dump_schema_cache(path, fingerprint, metadata):
+
+    # the file is replaced atomically, so that concurrent processes never
+    # read a partial cache
+    try:
+        fd, tmp_path = \
+            _tempfile.mkstemp(dir=(_os.path.dirname(_os.path.abspath(path))),
+                              prefix='.{}.'.format(_os.path.basename(path)))
         try:
-            predicate_attr = self._predicate_orm_attr(predicate_iri)
-        except ValueError:
-            return
-        predicate_prop = predicate_attr.property
+            with _os.fdopen(fd, 'wb') as file_:
+                _pickle.dump((fingerprint, metadata), file_,
+                             _pickle.HIGHEST_PROTOCOL)
+            _os.rename(tmp_path, path)
+        except:
+            _os.remove(tmp_path)
+            raise
+    except (EnvironmentError, _pickle.PicklingError) as exc:
+        _logger.warning('cannot write schema cache {!r}: {}'
+                         .format(path, exc))
 
-        query = self._orm.query(*subject_pkey_cols)
 
-        if isinstance(predicate_prop, _sqla_orm.RelationshipProperty):
-            if object_pattern is None:
-                # *, ref IRI, *
+def _keyset_after(cols, nullables, values, inclusive=False):
 
-                object_table = predicate_prop.target
-                object_pkey_cols = object_table.primary_key.columns
-                object_node_from_sql = \
-                    self._row_node_from_sql_func\
-                     (self._table_iri(object_table.name))
+    """A clause that selects the rows whose key follows the given one
 
-                query = query.join(predicate_attr)\
-                             .add_columns(*object_pkey_cols)
+    Keys are ordered lexicographically as by :func:`_keyset_order_by`, with
+    nulls following all other values in the *nullables* columns.
 
-                for result_values in query.all():
-                    subject_pkey_values = result_values[:subject_pkey_len]
-                    object_pkey_values = result_values[subject_pkey_len:]
-                    yield (subject_node_from_sql(zip(subject_pkey_cols,
-                                                     subject_pkey_values)),
-                           predicate_iri,
-                           object_node_from_sql(zip(object_pkey_cols,
-                                                    object_pkey_values)))
+    """
 
-            elif isinstance(object_pattern, (_rdf.URIRef, _rdf.BNode)):
-                # *, ref IRI, node
+    clauses = []
+    for i, (col, nullable, value) in enumerate(zip(cols, nullables, values)):
+        if value is None:
+            continue
+        elif nullable:
+            col_after = _sqla.or_(col > value, col == None)
+        else:
+            col_after = col > value
+        clauses.append(_sqla.and_(*([col_ == value_
+                                     for col_, value_
+                                     in zip(cols[:i], values[:i])]
+                                    + [col_after])))
+    if inclusive:
+        clauses.append(_sqla.and_(*(col == value
+                                    for col, value in zip(cols, values))))
+    return _sqla.or_(*clauses)
 
-                try:
-                    object_table_iri, object_pkey = \
-                        self._parse_row_node(object_pattern)
-                except (TypeError, ValueError):
-                    return
 
-                query = query.join(predicate_attr)\
-                             .filter(*(attr == value
-                                       for attr, value
-                                       in object_pkey.items()))
+def _keyset_before(cols, nullables, values):
 
-                for subject_pkey_values in query.all():
-                    yield (subject_node_from_sql(zip(subject_pkey_cols,
-                                                     subject_pkey_values)),
-                           predicate_iri,
-                           object_pattern)
+    """A clause that selects the rows whose key precedes the given one
 
-            else:
-                return
+    .. seealso:: :func:`_keyset_after`
+
+    """
 
+    clauses = []
+    for i, (col, nullable, value) in enumerate(zip(cols, nullables, values)):
+        if value is None:
+            if not nullable:
+                continue
+            col_before = col != None
         else:
-            predicate_col, = predicate_attr.property.columns
-            object_sql_type = predicate_col.type
+            col_before = col < value
+        clauses.append(_sqla.and_(*([col_ == value_
+                                     for col_, value_
+                                     in zip(cols[:i], values[:i])]
+                                    + [col_before])))
+    return _sqla.or_(*clauses)
 
-            query = query.add_columns(predicate_attr)\
-                         .filter(predicate_attr != None)
 
-            if isinstance(object_pattern, _rdf.Literal):
-                # *(IRI), non-ref IRI, literal
+def _keys_in(cols, keys):
 
-                if object_pattern.datatype \
-                       not in _common.rdf_datatypes_from_sql(object_sql_type):
-                    return
+    """A clause that selects the rows whose key is one of the given ones
 
-                object_sql_literal = \
-                    _common.sql_literal_from_rdf(object_pattern)
-                query = query.filter(predicate_attr == object_sql_literal)
+    Composite keys are matched by a disjunction of conjunctions rather than
+    a tuple ``IN`` comparison, which not all databases support.
 
-            if object_pattern is None \
-                 or isinstance(object_pattern, _rdf.Literal):
-                # *(IRI), non-ref IRI, *
-                query = query.add_columns(predicate_attr)
-                for result_values in query.all():
-                    yield (subject_node_from_sql
-                            (zip(subject_pkey_cols,
-                                 result_values[:subject_pkey_len])),
-                           predicate_iri,
-                           _common.rdf_literal_from_sql
-                            (result_values[-1], sql_type=predicate_col.type))
+    """
 
-            else:
-                return
+    if len(cols) == 1:
+        col, = cols
+        return col.in_([value for value, in keys])
+    else:
+        return _sqla.or_(*(_sqla.and_(*(col == value
+                                        for col, value in zip(cols, key)))
+                           for key in keys))
 
-    def _table_type_triples(self, table_iri):
 
-        try:
-            table_orm_mapper = self._orm_mappers[table_iri]
-        except KeyError:
-            return
+def _keyset_order_by(cols, nullables):
+    order_by = []
+    for col, nullable in zip(cols, nullables):
+        if nullable:
+            order_by.append(_sqla.case(((col == None, _sqla.literal(1)),),
+                                       else_=_sqla.literal(0)))
+        order_by.append(col)
+    return order_by
 
-        subject_pkey_cols = table_orm_mapper.primary_key
-        subject_node_from_sql = self._row_node_from_sql_func(table_iri)
 
-        query = self._orm.query(*subject_pkey_cols)
-        for subject_pkey_values in query.all():
-            yield (subject_node_from_sql(zip(subject_pkey_cols,
-                                             subject_pkey_values)),
-                   _rdf.RDF.type, table_iri)
+def _load_schema_cache(path, fingerprint):
 
-    def _unprefixed_iri(self, iri):
+    try:
+        with open(path, 'rb') as file_:
+            cached_fingerprint, metadata = _pickle.load(file_)
+    except EnvironmentError:
+        return None
+    except Exception as exc:
+        # a cache written by other versions of the libraries may fail to
+        # unpickle in any number of ways
+        _logger.warning('cannot read schema cache {!r}: {}'
+                         .format(path, exc))
+        return None
 
-        if self.base_iri is not None:
-            base_iri_match = \
-                _re.match('{}(.*)'.format(_re.escape(self.base_iri)))
-            if base_iri_match:
-                return _rdf.URIRef(base_iri_match.group(1))
+    if cached_fingerprint != fingerprint:
+        return None
+    return metadata
 
-        return _rdf.URIRef(iri)
+
+def _matches_flags(clauses):
+    # the rows may not be unique if the table has a pseudo primary key, so
+    # the flags are aggregated over them
+    return [_sqlaf.max(_sqla.case(((clause, _sqla.literal(1)),),
+                                  else_=_sqla.literal(0)))
+            for clause in clauses]
 
 
 def _orm_column_property_by_name(mapper):
     return _frozendict((prop.key, prop) for prop in mapper.column_attrs)
 
 
+def _orm_relationship_object_key_attrs(rel, cols_props):
+
+    """The local attributes that hold a referenced row's key
+
+    :return:
+        The attributes of the *rel*'s local columns, in the order of the
+        referenced table's primary key columns, or :obj:`None` if the
+        *rel* does not reference the primary key.
+
+    """
+
+    local_attr_by_remote_colname = \
+        {remote_col.name: cols_props[local_col.name].class_attribute
+         for local_col, remote_col in rel.local_remote_pairs}
+    pkey_colnames = [col.name for col in rel.target.primary_key.columns]
+    if set(local_attr_by_remote_colname) != set(pkey_colnames):
+        return None
+    return tuple(local_attr_by_remote_colname[colname]
+                 for colname in pkey_colnames)
+
+
 def _orm_relationship_by_local_column_names(mapper):
     return _frozendict((frozenset(col.name for col in rel.local_columns),
                         rel)
@@ -1125,9 +4282,132 @@ def _orm_relationship_by_local_column_names(mapper):
                        if not rel.collection_class)
 
 
+def _orm_relationship_local_column_names(rel):
+
+    """The names of a relationship's local columns
+
+    :return:
+        The names, in the order of the columns of the foreign key constraint
+        from which *rel* is mapped, which is the order of the column names in
+        the IRI of its reference property.
+
+    """
+
+    table = rel.parent.local_table
+    local_colnames = frozenset(col.name for col in rel.local_columns)
+    for constraint in table.constraints:
+        if isinstance(constraint, _sqla.ForeignKeyConstraint) \
+               and constraint.referred_table is rel.target:
+            colnames = tuple(col.name for col in constraint.columns)
+            if frozenset(colnames) == local_colnames:
+                return colnames
+    return tuple(col.name for col in table.columns
+                 if col.name in local_colnames)
+
+
 def _orm_relationship_remote_column_name_by_local_name(mapper):
     return _frozendict((rel, _frozendict((local_col.name, remote_col.name)
                                          for local_col, remote_col
                                          in rel.local_remote_pairs))
                         for rel in mapper.relationships
                         if not rel.collection_class)
+
+
+def _row_node_func(row_str_func, bnode):
+    node_class = _rdf.BNode if bnode else _rdf.URIRef
+
+    def row_node_from_sql(values):
+        return node_class(row_str_func(values))
+
+    return row_node_from_sql
+
+
+def _row_ntriples_func(row_str_func, bnode):
+    # the same formats as :meth:`rdflib.BNode.n3` and :meth:`rdflib.URIRef.n3`
+    format = u'_:{}' if bnode else u'<{}>'
+
+    def row_ntriples_from_sql(values):
+        return format.format(row_str_func(values))
+
+    return row_ntriples_from_sql
+
+
+def _literal_ntriples_fragment(predicate, ntriples_literal_from_sql,
+                               (value,)):
+    if value is None:
+        return None
+    return predicate + ntriples_literal_from_sql(value) + u' .\n'
+
+
+def _ref_ntriples_fragment(predicate, object_ntriples_from_sql,
+                           object_pkey_values):
+    if any(value is None for value in object_pkey_values):
+        return None
+    return predicate + object_ntriples_from_sql(object_pkey_values) \
+           + u' .\n'
+
+
+def _sql_concat(*parts):
+    return _reduce(_add,
+                   (_sqla.literal(part, _sqla.Unicode)
+                        if isinstance(part, basestring) else part
+                    for part in parts))
+
+
+def _sql_expr_type(expr):
+    if hasattr(expr, '__clause_element__'):
+        expr = expr.__clause_element__()
+    return expr.type
+
+
+def _sql_ntriples_literal(expr, sql_type, dialect_name):
+
+    """An SQL expression of the N-Triples literal of a value, or null
+
+    The expression yields the same text as
+    :func:`rdb2rdf._common.ntriples_literal_from_sql_func` for the values
+    of boolean, date, integer, and string columns, and null for null
+    values.  Values of other types are not rendered.
+
+    """
+
+    if isinstance(sql_type, _sqla.Boolean):
+        lexical = _sqla.case([(expr == None, _sqla.null()),
+                              (expr, u'true')],
+                             else_=u'false')
+        datatype = _rdf.XSD.boolean
+    elif isinstance(sql_type, _sqla.Integer):
+        lexical = _sqla.cast(expr, _sqla.Unicode)
+        datatype = _rdf.XSD.integer
+    elif isinstance(sql_type, _sqla.String):
+        lexical = _sqla.cast(expr, _sqla.Unicode)
+        for char, escape in _NTRIPLES_ESCAPES:
+            lexical = _sqlaf.replace(lexical, char, escape)
+        datatype = None
+    elif isinstance(sql_type, _sqla.Date):
+        if dialect_name == 'postgresql':
+            lexical = _sqlaf.to_char(expr, u'YYYY-MM-DD')
+        else:
+            # SQLAlchemy stores SQLite dates as ISO 8601 text
+            lexical = _sqla.cast(expr, _sqla.Unicode)
+        datatype = _rdf.XSD.date
+    else:
+        return None
+
+    if datatype is None:
+        return _sql_concat(u'"', lexical, u'"')
+    else:
+        return _sql_concat(u'"', lexical, u'"^^<{}>'.format(datatype))
+
+
+def _sorted_tables(tables):
+    # the tables in the order of their foreign keys, except for those that
+    # form cycles
+    return [table for table, _ in _sort_tables_and_constraints(tables)
+            if table is not None]
+
+
+def _where(statement, criteria):
+    for criterion in criteria:
+        statement = statement.where(criterion)
+    return statement
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Test fixtures"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import sqlalchemy as _sqla
+
+
+def fixture_rdb(path=None):
+
+    """A SQLite database of a small schema that covers the mapping's cases
+
+    The schema has composite primary and foreign keys, a table without a
+    primary key whose rows include duplicates and nulls, null foreign keys,
+    and a self-referencing foreign key.  The keyless table's nulls are in
+    its integer column, since a null in a text column of a pseudo primary
+    key is formatted in the row's node like the string ``'None'``.
+
+    :param path:
+        The path of the database file.  The default is an in-memory
+        database, which is not shared between connections.
+    :type path: :obj:`str` or null
+
+    :rtype: :class:`sqlalchemy.engine.Engine`
+
+    """
+
+    rdb = _sqla.create_engine('sqlite:///{}'.format(path) if path
+                              else 'sqlite://')
+    for sql in _FIXTURE_SQLS:
+        rdb.execute(sql)
+    return rdb
+
+
+_FIXTURE_SQLS = \
+    ('CREATE TABLE dept (id INTEGER PRIMARY KEY, name TEXT)',
+     'CREATE TABLE emp (id INTEGER PRIMARY KEY, name TEXT,'
+      ' dept_id INTEGER REFERENCES dept (id),'
+      ' boss_id INTEGER REFERENCES emp (id))',
+     'CREATE TABLE proj (a INTEGER, b TEXT, name TEXT, PRIMARY KEY (a, b))',
+     'CREATE TABLE task (id INTEGER PRIMARY KEY, pb TEXT, pa INTEGER,'
+      ' FOREIGN KEY (pa, pb) REFERENCES proj (a, b))',
+     'CREATE TABLE tag (a INTEGER, b TEXT)',
+     "INSERT INTO dept VALUES (1, 'R&D'), (2, NULL), (3, 'Ops')",
+     "INSERT INTO emp VALUES (1, 'Ann', 1, NULL), (2, 'Bob', 1, 1),"
+      " (3, 'Cy', NULL, 2), (4, 'Di', 3, 1)",
+     "INSERT INTO proj VALUES (1, 'x', 'p'), (1, 'y', NULL), (2, 'x', 'r')",
+     "INSERT INTO task VALUES (1, 'x', 1), (2, 'y', 1), (3, NULL, NULL),"
+      " (4, 'x', 2), (5, 'x', 1)",
+     "INSERT INTO tag VALUES (1, 'x'), (1, 'x'), (NULL, 'y'), (NULL, 'y'),"
+      " (2, 'z')")
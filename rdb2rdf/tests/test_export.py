@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`rdb2rdf.export`"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import io as _io
+import os as _os
+import shutil as _shutil
+import tempfile as _tempfile
+import unittest as _unittest
+
+import rdflib as _rdf
+import sqlalchemy as _sqla
+
+from .. import export as _export
+from .. import stores as _stores
+from . import _common as _tests_common
+
+
+class TestExportNtriples(_unittest.TestCase):
+
+    def test_rdflib_serializer(self):
+        rdb = _tests_common.fixture_rdb()
+        rdb.execute(u"INSERT INTO emp VALUES (5, 'Zo\xeb \"Z\"\\\n', NULL, 5)")
+        store = _store(rdb)
+        graph = _rdf.Graph()
+        for triple, _ in store.triples((None, None, None)):
+            graph.add(triple)
+
+        file_ = _io.BytesIO()
+        ntriples = _export.export_ntriples(store, file_)
+
+        self.assertEqual(ntriples, len(store))
+        self.assertEqual(set(file_.getvalue().splitlines()),
+                         set(line
+                             for line
+                             in graph.serialize(format='nt').splitlines()
+                             if line))
+
+
+class TestExportTablePartitions(_unittest.TestCase):
+
+    def setUp(self):
+        self._dir = _tempfile.mkdtemp()
+        self.addCleanup(_shutil.rmtree, self._dir)
+
+    def test_composite_foreign_key(self):
+
+        rdb = _sqla.create_engine('sqlite:///{}'
+                                   .format(_os.path.join(self._dir,
+                                                         'db.sqlite')))
+        for sql in ('CREATE TABLE proj (a INTEGER, b TEXT, name TEXT,'
+                     ' PRIMARY KEY (a, b))',
+                    'CREATE TABLE task (id INTEGER PRIMARY KEY, pb TEXT,'
+                     ' pa INTEGER,'
+                     ' FOREIGN KEY (pa, pb) REFERENCES proj (a, b))',
+                    "INSERT INTO proj VALUES (1, 'x', 'p'), (2, 'y', 'q')",
+                    "INSERT INTO task VALUES (1, 'x', 1), (2, 'y', 2),"
+                     " (3, NULL, NULL), (4, 'x', 1), (5, 'y', 2),"
+                     " (6, 'x', 1)"):
+            rdb.execute(sql)
+        store = _store(rdb)
+        task_iri = _rdf.URIRef(_BASE_IRI + 'task')
+
+        file_ = _io.BytesIO()
+        _export.export_ntriples(store, file_, tables_iris=(task_iri,))
+        store.close()
+
+        paths = [_os.path.join(self._dir, '{}.nt'.format(i))
+                 for i in range(3)]
+        ntriples = _export.export_table_partitions(rdb, task_iri, paths,
+                                                   base_iri=_BASE_IRI)
+
+        partitions_text = b''.join(_io.open(path, 'rb').read()
+                                   for path in paths)
+        self.assertEqual(sum(ntriples), partitions_text.count(b'\n'))
+        self.assertEqual(sorted(partitions_text.splitlines()),
+                         sorted(file_.getvalue().splitlines()))
+        self.assertEqual(partitions_text.count(b'<{}#ref-pa;pb>'
+                                                .format(task_iri)),
+                         5)
+
+    def test_tables(self):
+
+        rdb = _tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                      'db.sqlite'))
+        store = _store(rdb)
+        tables_iris = store.orm_classes.keys()
+        store.close()
+
+        for table_iri in tables_iris:
+            store = _store(rdb)
+            file_ = _io.BytesIO()
+            _export.export_ntriples(store, file_, tables_iris=(table_iri,))
+            store.close()
+
+            for npaths in (1, 2, 4):
+                paths = [_os.path.join(self._dir, '{}.nt'.format(i))
+                         for i in range(npaths)]
+                _export.export_table_partitions(rdb, table_iri, paths,
+                                                base_iri=_BASE_IRI)
+                partitions_text = b''.join(_io.open(path, 'rb').read()
+                                           for path in paths)
+                self.assertEqual(sorted(partitions_text.splitlines()),
+                                 sorted(file_.getvalue().splitlines()))
+
+
+_BASE_IRI = 'http://example.com/db/'
+
+
+def _store(rdb):
+    store = _stores.DirectMapping(base_iri=_BASE_IRI)
+    store.open(rdb)
+    return store
+
+
+if __name__ == '__main__':
+    _unittest.main()
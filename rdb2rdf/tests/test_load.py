@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`rdb2rdf.load`"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import io as _io
+import unittest as _unittest
+
+import rdflib as _rdf
+import sqlalchemy as _sqla
+
+from .. import export as _export
+from .. import load as _load
+from .. import stores as _stores
+
+
+class TestLoadNtriples(_unittest.TestCase):
+
+    def test_round_trip(self):
+
+        rdb = _rdb()
+        for sql in ("INSERT INTO dept VALUES (1, 'R&D'), (2, NULL)",
+                    u"INSERT INTO emp VALUES (1, 'Zoë \"Z\"\n', 1,"
+                     u" '2014-01-02'),"
+                     u" (2, 'Bob', NULL, NULL)",
+                    "INSERT INTO tag VALUES (1, 'x'), (1, 'x'), (NULL, 'y'),"
+                     " (2, 'None'), (2, NULL), (NULL, NULL)",
+                    "INSERT INTO proj VALUES (1, 'a', 2.0), (2, 'c/d', 1.5),"
+                     " (3, 'e f/', NULL)"):
+            rdb.execute(sql)
+        file_ = _io.BytesIO()
+        _export.export_ntriples(_store(rdb), file_)
+
+        loaded_rdb = _rdb()
+        nrows, ntriples = \
+            _load.load_ntriples(_store(loaded_rdb),
+                                _io.BytesIO(file_.getvalue()), batch_size=2)
+
+        self.assertEqual(nrows, 13)
+        self.assertEqual(ntriples, file_.getvalue().count('\n'))
+        for tablename in _TABLES_NAMES:
+            self.assertEqual(_table_rows(loaded_rdb, tablename),
+                             _table_rows(rdb, tablename))
+
+
+class TestNTriplesParser(_unittest.TestCase):
+
+    def test_bnodes(self):
+        parser = _load._NTriplesParser()
+        self.assertEqual(parser.statement('_:http://example.com/db/tag/a=1;b=x'
+                                           ' <http://example.com/db/tag#b>'
+                                           ' _:b0 .',
+                                          1),
+                         (_rdf.BNode(u'http://example.com/db/tag/a=1;b=x'),
+                          _rdf.URIRef(u'http://example.com/db/tag#b'),
+                          _rdf.BNode(u'b0')))
+
+    def test_escapes(self):
+        parser = _load._NTriplesParser()
+        subject, _, object = \
+            parser.statement(r'<http://example.com/\u00E9>'
+                             r' <http://example.com/p>'
+                             r' "\t\b\n\r\f\"\'\\ \u00e9 \U0001F600" .',
+                             1)
+        self.assertEqual(subject, _rdf.URIRef(u'http://example.com/\xe9'))
+        self.assertEqual(object,
+                         _rdf.Literal(u'\t\b\n\r\f"\'\\ \xe9 \U0001f600'))
+        self.assertRaises(ValueError, parser.statement,
+                          r'<http://example.com/s> <http://example.com/p>'
+                          r' "\q" .',
+                          2)
+
+    def test_invalid_statement(self):
+        parser = _load._NTriplesParser()
+        for line in ('<http://example.com/s> <http://example.com/p> .',
+                     '<http://example.com/s> <http://example.com/p> "o"',
+                     '"s" <http://example.com/p> "o" .'):
+            self.assertRaises(ValueError, parser.statement, line, 1)
+
+    def test_literals(self):
+        parser = _load._NTriplesParser()
+        prefix = '<http://example.com/s> <http://example.com/p> '
+        self.assertEqual(parser.statement(prefix + '"1"^^<{}> .'
+                                                    .format(_rdf.XSD.integer),
+                                          1)[2],
+                         _rdf.Literal(1))
+        self.assertEqual(parser.statement(prefix + '"x"@en-GB . # comment',
+                                          2)[2],
+                         _rdf.Literal(u'x', lang='en-GB'))
+        self.assertEqual(parser.statement(prefix + '"Zo\xc3\xab" .', 3)[2],
+                         _rdf.Literal(u'Zo\xeb'))
+
+    def test_skipped_lines(self):
+        parser = _load._NTriplesParser()
+        for lineno, line in enumerate(('', '  \n', '# comment\n'), 1):
+            self.assertIsNone(parser.statement(line, lineno))
+
+
+_BASE_IRI = 'http://example.com/db/'
+
+_SCHEMA_SQLS = ('CREATE TABLE dept (id INTEGER PRIMARY KEY, name TEXT)',
+                'CREATE TABLE emp (id INTEGER PRIMARY KEY, name TEXT,'
+                 ' dept_id INTEGER REFERENCES dept (id), hired DATE)',
+                'CREATE TABLE tag (a INTEGER, b TEXT)',
+                'CREATE TABLE proj (a INTEGER, b TEXT, cost FLOAT,'
+                 ' PRIMARY KEY (a, b))')
+
+_TABLES_NAMES = ('dept', 'emp', 'proj', 'tag')
+
+
+def _rdb():
+    rdb = _sqla.create_engine('sqlite://')
+    for sql in _SCHEMA_SQLS:
+        rdb.execute(sql)
+    return rdb
+
+
+def _store(rdb):
+    store = _stores.DirectMapping(base_iri=_BASE_IRI)
+    store.open(rdb)
+    return store
+
+
+def _table_rows(rdb, tablename):
+    return sorted(tuple(row)
+                  for row in rdb.execute('SELECT * FROM {}'
+                                          .format(tablename)))
+
+
+if __name__ == '__main__':
+    _unittest.main()
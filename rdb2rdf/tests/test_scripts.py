@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`rdb2rdf.scripts`"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import gzip as _gzip
+import io as _io
+import os as _os
+import shutil as _shutil
+import tempfile as _tempfile
+import unittest as _unittest
+
+import rdflib as _rdf
+import rdflib.compare as _rdf_compare
+
+from .. import export as _export
+from .. import stores as _stores
+from ..scripts import dump as _dump
+from . import _common as _tests_common
+
+
+class TestDump(_unittest.TestCase):
+
+    def setUp(self):
+
+        self._dir = _tempfile.mkdtemp()
+        self.addCleanup(_shutil.rmtree, self._dir)
+
+        self._url = 'sqlite:///{}'.format(_os.path.join(self._dir,
+                                                        'db.sqlite'))
+        rdb = _tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                      'db.sqlite'))
+        store = _stores.DirectMapping(base_iri=_BASE_IRI)
+        store.open(rdb)
+        file_ = _io.BytesIO()
+        _export.export_ntriples(store, file_)
+        self._graph = _rdf.Graph()
+        for triple, _ in store.triples((None, None, None)):
+            self._graph.add(triple)
+        store.close()
+        self._lines = sorted(file_.getvalue().splitlines())
+
+    def test_filters(self):
+        path = _os.path.join(self._dir, 'db.nt')
+        _dump.main(['rdb2rdf-dump', self._url, '-b', _BASE_IRI, '-o', path,
+                    '-q', '-i', 'e*', '-i', 't*', '-x', 'tag'])
+        with _io.open(path, 'rb') as file_:
+            lines = sorted(file_.read().splitlines())
+        self.assertEqual(lines,
+                         [line for line in self._lines
+                          if line.startswith(('<{}emp/'.format(_BASE_IRI),
+                                              '<{}task/'.format(_BASE_IRI)))])
+
+        self.assertRaises(SystemExit, _dump.main,
+                          ['rdb2rdf-dump', self._url, '-o', path, '-q', '-i',
+                           'nope'])
+
+    def test_formats(self):
+        path = _os.path.join(self._dir, 'db.ttl')
+        _dump.main(['rdb2rdf-dump', self._url, '-b', _BASE_IRI, '-o', path,
+                    '-q', '-f', 'turtle'])
+        graph = _rdf.Graph()
+        graph.parse(path, format='turtle')
+        self.assertTrue(_rdf_compare.isomorphic(graph, self._graph))
+
+    def test_ntriples(self):
+        for args, filename in (((), 'db.nt'),
+                               (('--sql-rendering',), 'db.nt'),
+                               (('-j', '3'), 'db.nt'),
+                               (('-j', '2', '--batch-size', '1'), 'db.nt.gz'),
+                               (('-z', 'gzip'), 'db.nt')):
+            path = _os.path.join(self._dir, filename)
+            _dump.main(['rdb2rdf-dump', self._url, '-b', _BASE_IRI, '-o',
+                        path, '-q'] + list(args))
+            open_ = _gzip.open if path.endswith('.gz') or 'gzip' in args \
+                        else _io.open
+            with open_(path, 'rb') as file_:
+                self.assertEqual(sorted(file_.read().splitlines()),
+                                 self._lines)
+
+
+_BASE_IRI = 'http://example.com/db/'
+
+
+if __name__ == '__main__':
+    _unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`rdb2rdf.sparql`"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import unittest as _unittest
+
+import rdflib as _rdf
+import rdflib.plugins.sparql as _rdf_sparql
+
+from .. import sparql as _sparql
+from .. import stores as _stores
+from . import _common as _tests_common
+
+
+class TestEvaluate(_unittest.TestCase):
+
+    def setUp(self):
+        _rdf_sparql.CUSTOM_EVALS['rdb2rdf_dm'] = _sparql.evaluate
+        self.addCleanup(_rdf_sparql.CUSTOM_EVALS.pop, 'rdb2rdf_dm')
+
+        self._store = _stores.DirectMapping(base_iri=_BASE_IRI)
+        self._store.open(_tests_common.fixture_rdb())
+        self._graph = _rdf.Graph(self._store)
+        self._memory_graph = _rdf.Graph()
+        for triple, _ in self._store.triples((None, None, None)):
+            self._memory_graph.add(triple)
+
+    def test_bgp_solutions(self):
+        e, b, n = _rdf.Variable('e'), _rdf.Variable('b'), _rdf.Variable('n')
+        patterns = ((e, _rdf.URIRef(_BASE_IRI + 'emp#ref-boss_id'), b),
+                    (b, _rdf.URIRef(_BASE_IRI + 'emp#name'), n),
+                    (e, _rdf.URIRef(_BASE_IRI + 'emp#dept_id'),
+                     _rdf.Literal(1)))
+        self.assertEqual(sorted(sorted((unicode(var), value)
+                                       for var, value in solution.items())
+                                for solution
+                                in self._store.bgp_solutions(patterns)),
+                         sorted(sorted(row.asdict().items())
+                                for row
+                                in self._memory_graph
+                                       .query(_select(patterns, (e, b, n)))))
+
+    def test_queries(self):
+        for query in \
+                ('SELECT ?t ?b WHERE {{ ?t a <{0}tag> . ?t <{0}tag#b> ?b }}',
+                 'SELECT ?e ?n ?bn WHERE {{ ?e <{0}emp#ref-boss_id> ?b .'
+                  ' ?b <{0}emp#name> ?bn . ?e <{0}emp#name> ?n }}',
+                 'SELECT ?t ?pn WHERE {{ ?t <{0}task#ref-pa;pb>'
+                  ' [ <{0}proj#name> ?pn ] }}',
+                 'SELECT ?e WHERE {{ ?e a <{0}emp> .'
+                  ' ?e <{0}emp#ref-dept_id> <{0}dept/id=1> }}',
+                 'SELECT ?d ?p WHERE {{ ?e <{0}emp#ref-dept_id> ?d .'
+                  ' ?d <{0}dept#name> "R&D" . ?t <{0}task#pa> ?p }}'):
+            query = query.format(_BASE_IRI)
+            self.assertEqual(sorted(self._graph.query(query)),
+                             sorted(self._memory_graph.query(query)))
+
+
+_BASE_IRI = 'http://example.com/db/'
+
+
+def _select(patterns, vars):
+    return u'SELECT {} WHERE {{ {} }}'\
+            .format(u' '.join(var.n3() for var in vars),
+                    u' . '.join(u' '.join(term.n3() for term in pattern)
+                                for pattern in patterns))
+
+
+if __name__ == '__main__':
+    _unittest.main()
@@ -0,0 +1,801 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`rdb2rdf.stores`"""
+
+__copyright__ = "Copyright (C) 2014 Ivan D Vasin"
+__docformat__ = "restructuredtext"
+
+import os as _os
+import shutil as _shutil
+import tempfile as _tempfile
+import threading as _threading
+import unittest as _unittest
+
+import rdflib as _rdf
+import sqlalchemy as _sqla
+
+from .. import stores as _stores
+from . import _common as _tests_common
+
+
+class TestAdd(_unittest.TestCase):
+
+    def test_add_n(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        subject = _rdf.URIRef(_BASE_IRI + 'dept/id=3')
+        store.addN(((subject, _rdf.RDF.type, _rdf.URIRef(_BASE_IRI + 'dept'),
+                     None),
+                    (subject, _rdf.URIRef(_BASE_IRI + 'dept#name'),
+                     _rdf.Literal(u'c'), None)))
+        store.commit()
+        self.assertEqual(rdb.execute('SELECT * FROM dept ORDER BY id')
+                            .fetchall(),
+                         [(1, u'a'), (2, u'b'), (3, u'c')])
+
+    def test_commit(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        subject = _rdf.URIRef(_BASE_IRI + 'emp/id=3')
+        store.add((subject, _rdf.RDF.type, _rdf.URIRef(_BASE_IRI + 'emp')))
+        store.add((subject, _rdf.URIRef(_BASE_IRI + 'emp#name'),
+                   _rdf.Literal(u'z')))
+        store.add((subject, _rdf.URIRef(_BASE_IRI + 'emp#ref-dept_id'),
+                   _rdf.URIRef(_BASE_IRI + 'dept/id=2')))
+        store.add((_rdf.URIRef(_BASE_IRI + 'dept/id=1'),
+                   _rdf.URIRef(_BASE_IRI + 'dept#name'), _rdf.Literal(u'A')))
+        store.commit()
+        self.assertEqual(rdb.execute('SELECT * FROM dept ORDER BY id')
+                            .fetchall(),
+                         [(1, u'A'), (2, u'b')])
+        self.assertEqual(rdb.execute('SELECT * FROM emp ORDER BY id')
+                            .fetchall(),
+                         [(1, u'x', 1), (2, u'y', 2), (3, u'z', 2)])
+
+    def test_invalid_triple(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        subject = _rdf.URIRef(_BASE_IRI + 'dept/id=1')
+        self.assertRaises(ValueError, store.add,
+                          (subject, _rdf.URIRef(_BASE_IRI + 'dept#size'),
+                           _rdf.Literal(1)))
+        self.assertRaises(ValueError, store.add,
+                          (subject, _rdf.URIRef(_BASE_IRI + 'dept#name'),
+                           _rdf.Literal(u'A')),
+                          context=_rdf.Graph(identifier='http://example.com/'))
+        store.commit()
+        self.assertEqual(rdb.execute('SELECT * FROM dept ORDER BY id')
+                            .fetchall(),
+                         [(1, u'a'), (2, u'b')])
+
+    def test_pending_rows_matched(self):
+        store = _store(_dept_rdb())
+        dept_iri = _rdf.URIRef(_BASE_IRI + 'dept')
+        subject = _rdf.URIRef(_BASE_IRI + 'dept/id=3')
+        store.add((subject, _rdf.URIRef(_BASE_IRI + 'dept#name'),
+                   _rdf.Literal(u'New')))
+        self.assertIn(subject,
+                      set(s for s, _, _ in store.describe_many([subject])))
+        self.assertIn(subject,
+                      set(s for s, _, _ in store.table_triples(dept_iri)))
+        self.assertIn(subject.n3(), u''.join(store.table_ntriples(dept_iri)))
+        self.assertEqual(store.table_key_ranges(dept_iri, 3),
+                         [(None, (2,)), ((2,), (3,)), ((3,), None)])
+
+    def test_rollback(self):
+        store = _store(_emp_rdb())
+        dept_iri = _rdf.URIRef(_BASE_IRI + 'dept')
+        subject = _rdf.URIRef(_BASE_IRI + 'dept/id=3')
+        store.add((subject, _rdf.RDF.type, dept_iri))
+        store.rollback()
+        self.assertNotIn(subject,
+                         set(s for (s, _, _), _
+                             in store.triples((None, _rdf.RDF.type,
+                                               dept_iri))))
+        self.assertEqual(store._orm.execute('SELECT count(*) FROM dept')
+                                   .scalar(),
+                         2)
+
+    def test_write_batch_size(self):
+        store = _store(_emp_rdb(), write_batch_size=2)
+        dept_iri = _rdf.URIRef(_BASE_IRI + 'dept')
+        for id in (3, 4, 5):
+            store.add((_rdf.URIRef(_BASE_IRI + 'dept/id={}'.format(id)),
+                       _rdf.RDF.type, dept_iri))
+        self.assertEqual(store._orm.execute('SELECT count(*) FROM dept')
+                                   .scalar(),
+                         4)
+        store.rollback()
+        self.assertEqual(store._orm.execute('SELECT count(*) FROM dept')
+                                   .scalar(),
+                         2)
+
+
+class TestDescribeMany(_unittest.TestCase):
+
+    def test_chunks(self):
+        store = _store(_tests_common.fixture_rdb())
+        subjects = sorted(set(s for s, _, _ in _triples(store)))
+        expected = set(triple
+                       for subject in subjects
+                       for triple in _triples(store, (subject, None, None)))
+        for chunk_size in (1, 2, 500):
+            self.assertEqual(set(store.describe_many
+                                  (subjects
+                                   + [_rdf.URIRef(_BASE_IRI + 'emp/id=9'),
+                                      _rdf.URIRef('http://example.com/')],
+                                   chunk_size=chunk_size)),
+                             expected)
+
+
+class TestKeysetPagination(_unittest.TestCase):
+
+    def test_duplicate_rows(self):
+        rdb = _rdb('CREATE TABLE tag (a INTEGER, b TEXT)',
+                   "INSERT INTO tag VALUES (1, 'x'), (1, 'x'), (1, 'x'),"
+                    " (2, 'y'), (2, 'y'), (NULL, 'z'), (NULL, 'z'),"
+                    " (NULL, NULL), (NULL, NULL)")
+        self.assertEqual(_table_rows(rdb), _table_rows(rdb, page_size=2))
+        self.assertEqual(_table_rows(rdb), _table_rows(rdb, page_size=1))
+
+    def test_unique_key(self):
+        rdb = _rdb('CREATE TABLE tag (a INTEGER PRIMARY KEY, b TEXT)',
+                   "INSERT INTO tag VALUES (1, 'x'), (2, 'x'), (3, NULL)")
+        self.assertEqual(_table_rows(rdb), _table_rows(rdb, page_size=2))
+
+
+class TestLazyMapping(_unittest.TestCase):
+
+    def test_patterns(self):
+        rdb = _tests_common.fixture_rdb()
+        default_store = _store(rdb)
+        emp_iri = _rdf.URIRef(_BASE_IRI + 'emp')
+        task_iri = _rdf.URIRef(_BASE_IRI + 'task')
+        for pattern in ((None, _rdf.URIRef(_BASE_IRI + 'proj#name'), None),
+                        (None, _rdf.URIRef(_BASE_IRI + 'task#ref-pa;pb'),
+                         None),
+                        (None, _rdf.RDF.type, task_iri),
+                        (None, None, _rdf.Literal(1)),
+                        (None, None, _rdf.URIRef(_BASE_IRI + 'emp/id=1'))):
+            self.assertEqual(_triples(_store(rdb, lazy=True), pattern),
+                             _triples(default_store, pattern))
+
+    def test_subjects(self):
+
+        rdb = _tests_common.fixture_rdb()
+        default_store = _store(rdb)
+        store = _store(rdb, lazy=True)
+        tables_iris = [_rdf.URIRef(_BASE_IRI + tablename)
+                       for tablename in ('dept', 'emp', 'proj', 'tag', 'task')]
+        self.assertEqual(sorted(store._orm_unmapped_tables), tables_iris)
+
+        pattern = (_rdf.URIRef(_BASE_IRI + 'emp/id=2'), None, None)
+        self.assertEqual(_triples(store, pattern),
+                         _triples(default_store, pattern))
+        self.assertEqual(sorted(store._orm_unmapped_tables),
+                         [_rdf.URIRef(_BASE_IRI + tablename)
+                          for tablename in ('proj', 'tag', 'task')])
+
+        pattern = (_rdf.URIRef(_BASE_IRI + 'task/id=1'), None, None)
+        self.assertEqual(_triples(store, pattern),
+                         _triples(default_store, pattern))
+        self.assertEqual(sorted(store._orm_unmapped_tables),
+                         [_rdf.URIRef(_BASE_IRI + 'tag')])
+
+        self.assertEqual(_triples(store), _triples(default_store))
+        self.assertEqual(sorted(store.orm_classes), tables_iris)
+        self.assertFalse(store._orm_unmapped_tables)
+
+
+class TestLen(_unittest.TestCase):
+
+    def test_null_pseudo_key(self):
+        rdb = _rdb('CREATE TABLE tag (a INTEGER, b TEXT)',
+                   "INSERT INTO tag VALUES (1, 'x'), (NULL, 'y'),"
+                    " (NULL, NULL)")
+        store = _store(rdb)
+        self.assertEqual(len(store), len(list(store.triples((None, None,
+                                                             None)))))
+
+
+class TestPatternCache(_unittest.TestCase):
+
+    def setUp(self):
+        self._dir = _tempfile.mkdtemp()
+        self.addCleanup(_shutil.rmtree, self._dir)
+
+    def test_writes(self):
+
+        # the same writes are made through a store that caches patterns and
+        # through one that does not, each on its own copy of the database
+        store = _store(_tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                               'a.sqlite')),
+                       cache_patterns=True)
+        default_store = \
+            _store(_tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                           'b.sqlite')))
+        stores = (store, default_store)
+
+        dept_name_iri = _rdf.URIRef(_BASE_IRI + 'dept#name')
+        patterns = ((None, None, None),
+                    (_rdf.URIRef(_BASE_IRI + 'dept/id=2'), None, None),
+                    (None, dept_name_iri, None),
+                    (None, None, _rdf.Literal(u'R&D')),
+                    (None, _rdf.RDF.type, _rdf.URIRef(_BASE_IRI + 'dept')))
+
+        def assert_triples():
+            for pattern in patterns:
+                expected = _triples(default_store, pattern)
+                self.assertEqual(_triples(store, pattern), expected)
+                self.assertEqual(_triples(store, pattern), expected)
+
+        assert_triples()
+        stats = store.pattern_cache_stats
+        self.assertEqual((stats.hits, stats.misses),
+                         (len(patterns), len(patterns)))
+
+        for store_ in stores:
+            store_.add((_rdf.URIRef(_BASE_IRI + 'dept/id=2'), dept_name_iri,
+                        _rdf.Literal(u'Lab')))
+        assert_triples()
+
+        for store_ in stores:
+            store_.commit()
+        assert_triples()
+
+        for store_ in stores:
+            store_.remove((_rdf.URIRef(_BASE_IRI + 'dept/id=1'),
+                           dept_name_iri, _rdf.Literal(u'R&D')))
+            store_.add((_rdf.URIRef(_BASE_IRI + 'dept/id=4'), dept_name_iri,
+                        _rdf.Literal(u'Lab')))
+        assert_triples()
+
+        for store_ in stores:
+            store_.rollback()
+        assert_triples()
+
+        stats = store.pattern_cache_stats
+        self.assertEqual((stats.hits, stats.misses),
+                         (5 * len(patterns), 5 * len(patterns)))
+
+
+class TestRemove(_unittest.TestCase):
+
+    def test_invalid_pattern(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        self.assertRaises(ValueError, store.remove,
+                          (_rdf.URIRef(_BASE_IRI + 'dept/id=1'),
+                           _rdf.URIRef(_BASE_IRI + 'dept#id'),
+                           _rdf.Literal(1)))
+        self.assertRaises(ValueError, store.remove,
+                          (None, _rdf.URIRef(_BASE_IRI + 'emp#name'), None))
+        self.assertRaises(ValueError, store.remove,
+                          (None, None, _rdf.Literal(u'x')))
+        self.assertRaises(ValueError, store.remove, (None, None, None),
+                          context=_rdf.Graph(identifier='http://example.com/'))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb),
+                         ([(1, u'a'), (2, u'b')],
+                          [(1, u'x', 1), (2, u'y', 2)]))
+
+    def test_literal(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        name_iri = _rdf.URIRef(_BASE_IRI + 'dept#name')
+        store.remove((_rdf.URIRef(_BASE_IRI + 'dept/id=1'), name_iri,
+                      _rdf.Literal(u'a')))
+        store.remove((_rdf.URIRef(_BASE_IRI + 'dept/id=2'), name_iri,
+                      _rdf.Literal(u'a')))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb)[0], [(1, None), (2, u'b')])
+
+    def test_null_predicate(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        store.remove((None, None, _rdf.URIRef(_BASE_IRI + 'dept/id=2')))
+        store.remove((None, None, _rdf.Literal(u'a')))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb),
+                         ([(1, None), (2, u'b')],
+                          [(1, u'x', 1), (2, u'y', None)]))
+
+    def test_null_subject(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        store.remove((None, _rdf.URIRef(_BASE_IRI + 'dept#name'), None))
+        store.remove((None, _rdf.RDF.type, _rdf.URIRef(_BASE_IRI + 'emp')))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb), ([(1, None), (2, None)], []))
+
+    def test_null_triple(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        store.remove((None, None, None))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb), ([], []))
+
+    def test_pseudo_key_values(self):
+        rdb = _rdb('CREATE TABLE tag (a INTEGER, b TEXT)',
+                   'CREATE TABLE code (a INTEGER NOT NULL, b TEXT)',
+                   "INSERT INTO tag VALUES (1, 'x'), (2, 'y')",
+                   "INSERT INTO code VALUES (1, 'x')")
+        store = _store(rdb)
+        store.remove((None, _rdf.URIRef(_BASE_IRI + 'tag#b'),
+                      _rdf.Literal(u'x')))
+        store.remove((None, None, _rdf.Literal(u'y')))
+        self.assertRaises(ValueError, store.remove,
+                          (None, _rdf.URIRef(_BASE_IRI + 'code#a'),
+                           _rdf.Literal(1)))
+        store.commit()
+        self.assertEqual(rdb.execute('SELECT a, b FROM tag ORDER BY a')
+                            .fetchall(),
+                         [(1, None), (2, None)])
+        self.assertEqual(rdb.execute('SELECT a, b FROM code').fetchall(),
+                         [(1, u'x')])
+
+    def test_reference(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        store.remove((_rdf.URIRef(_BASE_IRI + 'emp/id=1'),
+                      _rdf.URIRef(_BASE_IRI + 'emp#ref-dept_id'),
+                      _rdf.URIRef(_BASE_IRI + 'dept/id=1')))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb)[1],
+                         [(1, u'x', None), (2, u'y', 2)])
+
+    def test_row_type(self):
+        rdb = _emp_rdb()
+        store = _store(rdb)
+        store.remove((_rdf.URIRef(_BASE_IRI + 'emp/id=1'), _rdf.RDF.type,
+                      _rdf.URIRef(_BASE_IRI + 'emp')))
+        store.remove((_rdf.URIRef(_BASE_IRI + 'emp/id=2'), _rdf.RDF.type,
+                      _rdf.URIRef(_BASE_IRI + 'dept')))
+        store.commit()
+        self.assertEqual(_emp_rdb_rows(rdb)[1], [(2, u'y', 2)])
+
+
+class TestSchemaCache(_unittest.TestCase):
+
+    def setUp(self):
+        self._dir = _tempfile.mkdtemp()
+        self.addCleanup(_shutil.rmtree, self._dir)
+
+    def test_hit_and_miss(self):
+
+        rdb = _tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                      'db.sqlite'))
+        cache_path = _os.path.join(self._dir, 'schema.pickle')
+        expected = _triples(_store(rdb))
+
+        # a miss writes the cache, which is replaced by renaming a new file
+        self.assertEqual(_triples(_store(rdb, schema_cache=cache_path)),
+                         expected)
+        cache_stat = _os.stat(cache_path)
+
+        self.assertEqual(_triples(_store(rdb, schema_cache=cache_path)),
+                         expected)
+        self.assertEqual(_os.stat(cache_path).st_ino, cache_stat.st_ino)
+
+        rdb.execute('CREATE TABLE extra (id INTEGER PRIMARY KEY)')
+        rdb.execute('INSERT INTO extra VALUES (1)')
+        store = _store(rdb, schema_cache=cache_path)
+        self.assertNotEqual(_os.stat(cache_path).st_ino, cache_stat.st_ino)
+        self.assertIn(_rdf.URIRef(_BASE_IRI + 'extra'), store.orm_classes)
+        self.assertEqual(_triples(store), _triples(_store(rdb)))
+
+        with open(cache_path, 'wb') as file_:
+            file_.write(b'garbage')
+        self.assertEqual(_triples(_store(rdb, schema_cache=cache_path)),
+                         _triples(store))
+
+
+class TestStreamResults(_unittest.TestCase):
+
+    def test_triples(self):
+        rdb = _tests_common.fixture_rdb()
+        default_store = _store(rdb)
+        store = _store(rdb, stream_results=True, stream_batch_size=2)
+        self.assertEqual(_triples(store), _triples(default_store))
+        for table_iri in store.orm_classes:
+            pattern = (None, _rdf.RDF.type, table_iri)
+            self.assertEqual(_triples(store, pattern),
+                             _triples(default_store, pattern))
+
+
+class TestTableNtriples(_unittest.TestCase):
+
+    def test_sql_rendering_null_pseudo_key(self):
+        for sqls in (('CREATE TABLE tag (a INTEGER, b INTEGER)',
+                      'INSERT INTO tag VALUES (1, 2), (NULL, 3),'
+                       ' (NULL, NULL)'),
+                     ('CREATE TABLE tag (a INTEGER, b TEXT)',
+                      "INSERT INTO tag VALUES (1, 'x'), (NULL, 'y')")):
+            store = _store(_rdb(*sqls))
+            table_iri, = store.orm_classes.keys()
+            self.assertEqual(u''.join(store.table_ntriples(table_iri)),
+                             u''.join(store.table_ntriples
+                                       (table_iri, sql_rendering=True)))
+
+    def test_sql_rendering_references(self):
+        store = _store(_rdb('CREATE TABLE dept (id INTEGER PRIMARY KEY,'
+                             ' name TEXT)',
+                            'CREATE TABLE emp (id INTEGER PRIMARY KEY,'
+                             ' dept_id INTEGER REFERENCES dept (id))',
+                            "INSERT INTO dept VALUES (1, 'a'), (2, NULL)",
+                            'INSERT INTO emp VALUES (1, 1), (2, NULL)'))
+        for table_iri in store.orm_classes.keys():
+            self.assertEqual(u''.join(store.table_ntriples(table_iri)),
+                             u''.join(store.table_ntriples
+                                       (table_iri, sql_rendering=True)))
+
+
+class TestTableTriples(_unittest.TestCase):
+
+    def test_subjects(self):
+        store = _store(_tests_common.fixture_rdb())
+        for table_iri in store.orm_classes:
+            triples = sorted(store.table_triples(table_iri))
+            subjects = set(s for s, _, _ in triples)
+            self.assertEqual(subjects,
+                             set(s for s, _, _
+                                 in _triples(store, (None, _rdf.RDF.type,
+                                                     table_iri))))
+            self.assertEqual(set(triples),
+                             set(triple
+                                 for subject in subjects
+                                 for triple
+                                 in _triples(store, (subject, None, None))))
+            self.assertEqual(sorted(triple
+                                    for key_range
+                                    in store.table_key_ranges(table_iri, 3)
+                                    for triple
+                                    in store.table_triples
+                                        (table_iri, key_range=key_range)),
+                             triples)
+
+
+class TestTableWorkers(_unittest.TestCase):
+
+    def setUp(self):
+        self._dir = _tempfile.mkdtemp()
+        self.addCleanup(_shutil.rmtree, self._dir)
+
+    def test_triples(self):
+        rdb = _tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                      'db.sqlite'))
+        default_store = _store(rdb)
+        store = _store(rdb, table_workers=3, table_queue_size=1)
+        for pattern in ((None, None, None), (None, _rdf.RDF.type, None),
+                        (None, None, _rdf.Literal(u'x'))):
+            self.assertEqual(_triples(store, pattern),
+                             _triples(default_store, pattern))
+
+
+class TestThreadSafe(_unittest.TestCase):
+
+    def setUp(self):
+        self._dir = _tempfile.mkdtemp()
+        self.addCleanup(_shutil.rmtree, self._dir)
+
+    def test_commit(self):
+
+        rdb = _tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                      'db.sqlite'))
+        store = _store(rdb, thread_safe=True)
+        self.addCleanup(store.close)
+        dept_name_iri = _rdf.URIRef(_BASE_IRI + 'dept#name')
+        committed_triple = (_rdf.URIRef(_BASE_IRI + 'dept/id=4'),
+                            dept_name_iri, _rdf.Literal(u'Lab'))
+        pending_triple = (_rdf.URIRef(_BASE_IRI + 'dept/id=5'),
+                          dept_name_iri, _rdf.Literal(u'Lab'))
+        pattern = (None, dept_name_iri, _rdf.Literal(u'Lab'))
+
+        def add_committed():
+            store.add(committed_triple)
+            store.commit()
+
+        _run_threads((add_committed,))
+        self.assertEqual(_triples(store, pattern), [committed_triple])
+
+        store.add(pending_triple)
+        results = []
+
+        def match():
+            results.append(_triples(store, pattern))
+            store.rollback()
+
+        _run_threads((match,))
+        self.assertEqual(results, [[committed_triple]])
+        self.assertEqual(_triples(store, pattern),
+                         [committed_triple, pending_triple])
+
+    def test_triples(self):
+
+        rdb = _tests_common.fixture_rdb(_os.path.join(self._dir,
+                                                      'db.sqlite'))
+        patterns = ((None, None, None),
+                    (_rdf.URIRef(_BASE_IRI + 'emp/id=2'), None, None),
+                    (None, _rdf.URIRef(_BASE_IRI + 'task#ref-pa;pb'), None),
+                    (None, None, _rdf.Literal(1)))
+        default_store = _store(rdb)
+        expected = [_triples(default_store, pattern) for pattern in patterns]
+        default_store.close()
+
+        store = _store(rdb, thread_safe=True)
+        self.addCleanup(store.close)
+        results = [None] * (2 * len(patterns))
+
+        def match(i):
+            results[i] = _triples(store, patterns[i % len(patterns)])
+            store.rollback()
+
+        _run_threads([lambda i=i: match(i) for i in range(len(results))])
+        self.assertEqual(results, 2 * expected)
+
+
+class TestTriples(_unittest.TestCase):
+
+    def test_literal_objects(self):
+        store = _store(_tests_common.fixture_rdb())
+        all_triples = _triples(store)
+        for object in set(o for _, _, o in all_triples
+                          if isinstance(o, _rdf.Literal)) \
+                      | set((_rdf.Literal(u'nothing'), _rdf.Literal(9),
+                             _rdf.Literal(1.5))):
+            self.assertEqual(_triples(store, (None, None, object)),
+                             [triple for triple in all_triples
+                              if triple[2] == object])
+
+    def test_node_objects(self):
+        store = _store(_tests_common.fixture_rdb())
+        all_triples = _triples(store)
+        for object in set(s for s, _, _ in all_triples) \
+                      | set(o for _, _, o in all_triples
+                            if not isinstance(o, _rdf.Literal)) \
+                      | set((_rdf.URIRef(_BASE_IRI + 'emp/id=9'),
+                             _rdf.URIRef(_BASE_IRI + 'proj/a=9;b=x'))):
+            self.assertEqual(_triples(store, (None, None, object)),
+                             [triple for triple in all_triples
+                              if triple[2] == object])
+
+    def test_predicates(self):
+        store = _store(_tests_common.fixture_rdb())
+        all_triples = _triples(store)
+        for predicate in set(p for _, p, _ in all_triples):
+            self.assertEqual(_triples(store, (None, predicate, None)),
+                             [triple for triple in all_triples
+                              if triple[1] == predicate])
+
+        # a reference property IRI whose column names are permuted matches
+        # the same references
+        self.assertEqual([(s, o)
+                          for s, _, o
+                          in _triples(store,
+                                      (None,
+                                       _rdf.URIRef(_BASE_IRI
+                                                   + 'task#ref-pb;pa'),
+                                       None))],
+                         [(s, o)
+                          for s, _, o
+                          in _triples(store,
+                                      (None,
+                                       _rdf.URIRef(_BASE_IRI
+                                                   + 'task#ref-pa;pb'),
+                                       None))])
+        for predicate in ('emp#nope', 'emp#ref-nope', 'nope#name'):
+            self.assertEqual(_triples(store,
+                                      (None, _rdf.URIRef(_BASE_IRI
+                                                         + predicate),
+                                       None)),
+                             [])
+
+    def test_reference_properties(self):
+        store = _store(_tests_common.fixture_rdb())
+        all_triples = _triples(store)
+        nodes = set(s for s, _, _ in all_triples) \
+                | set((_rdf.URIRef(_BASE_IRI + 'emp/id=9'),))
+        for predicate in set(p for _, p, _ in all_triples
+                             if u'#ref-' in p):
+            for subject in [None] + sorted(nodes):
+                for object in [None] + sorted(nodes):
+                    self.assertEqual(_triples(store,
+                                              (subject, predicate, object)),
+                                     [triple for triple in all_triples
+                                      if triple[1] == predicate
+                                         and subject in (None, triple[0])
+                                         and object in (None, triple[2])])
+
+    def test_subject_missing(self):
+        store = _store(_emp_rdb())
+        subject = _rdf.URIRef(_BASE_IRI + 'emp/id=3')
+        self.assertEqual(list(store.triples((subject, None, None))), [])
+        self.assertEqual(list(store.triples((subject, None,
+                                             _rdf.URIRef(_BASE_IRI
+                                                         + 'dept/id=1')))),
+                         [])
+
+    def test_subject_objects(self):
+        store = _store(_tests_common.fixture_rdb())
+        all_triples = set(_triples(store))
+        objects = set(o for _, _, o in all_triples) \
+                  | set((_rdf.Literal(u'nothing'), _rdf.Literal(9),
+                         _rdf.URIRef(_BASE_IRI + 'emp/id=9')))
+        for subject in set(s for s, _, _ in all_triples):
+            for object in objects:
+                self.assertEqual(set(_triples(store,
+                                              (subject, None, object))),
+                                 set(triple for triple in all_triples
+                                     if triple[0] == subject
+                                        and triple[2] == object))
+
+    def test_subject_references(self):
+        store = _store(_rdb('CREATE TABLE emp (id INTEGER PRIMARY KEY,'
+                             ' boss_id INTEGER REFERENCES emp (id))',
+                            'CREATE TABLE dept (id INTEGER PRIMARY KEY,'
+                             ' code TEXT UNIQUE)',
+                            'CREATE TABLE unit (id INTEGER PRIMARY KEY,'
+                             ' dept_code TEXT REFERENCES dept (code))',
+                            'INSERT INTO emp VALUES (1, NULL), (2, 1)',
+                            "INSERT INTO dept VALUES (1, 'x')",
+                            "INSERT INTO unit VALUES (1, 'x'), (2, NULL)"))
+        all_triples = set(triple
+                          for triple, _ in store.triples((None, None, None)))
+        for subject in set(s for s, _, _ in all_triples):
+            self.assertEqual(set(triple
+                                 for triple, _
+                                 in store.triples((subject, None, None))),
+                             set(triple for triple in all_triples
+                                 if triple[0] == subject))
+            for object in set(o for s, _, o in all_triples
+                              if s == subject
+                                 and isinstance(o, _rdf.URIRef)):
+                self.assertEqual(set(triple
+                                     for triple, _
+                                     in store.triples((subject, None,
+                                                       object))),
+                                 set(triple for triple in all_triples
+                                     if triple[0] == subject
+                                        and triple[2] == object))
+
+
+class TestTriplesChoices(_unittest.TestCase):
+
+    def setUp(self):
+        # a chunk boundary within each table's alternatives
+        self.addCleanup(setattr, _stores, '_KEYS_CHUNK_SIZE',
+                        _stores._KEYS_CHUNK_SIZE)
+        _stores._KEYS_CHUNK_SIZE = 2
+
+    def test_objects(self):
+        store = _store(_tests_common.fixture_rdb())
+        for predicate, objects in \
+                (('emp#name', [_rdf.Literal(u'Ann'), _rdf.Literal(u'Cy'),
+                               _rdf.Literal(u'Di'), _rdf.Literal(u'Zed')]),
+                 ('emp#ref-boss_id', [_rdf.URIRef(_BASE_IRI + 'emp/id=1'),
+                                      _rdf.URIRef(_BASE_IRI + 'emp/id=2'),
+                                      _rdf.URIRef(_BASE_IRI + 'emp/id=3')]),
+                 ('task#ref-pa;pb',
+                  [_rdf.URIRef(_BASE_IRI + 'proj/a=1;b=x'),
+                   _rdf.URIRef(_BASE_IRI + 'proj/a=1;b=y'),
+                   _rdf.URIRef(_BASE_IRI + 'proj/a=2;b=x')])):
+            predicate = _rdf.URIRef(_BASE_IRI + predicate)
+            self.assertEqual(_choices_triples(store,
+                                              (None, predicate, objects)),
+                             _alternatives_triples(store,
+                                                   (None, predicate,
+                                                    objects)))
+
+    def test_predicates(self):
+        store = _store(_tests_common.fixture_rdb())
+        predicates = [_rdf.URIRef(_BASE_IRI + predicate)
+                      for predicate in ('emp#name', 'emp#ref-boss_id',
+                                        'emp#ref-dept_id', 'proj#name',
+                                        'task#ref-pa;pb', 'tag#b')] \
+                     + [_rdf.RDF.type]
+        for subject in (None, _rdf.URIRef(_BASE_IRI + 'emp/id=2')):
+            self.assertEqual(_choices_triples(store,
+                                              (subject, predicates, None)),
+                             _alternatives_triples(store,
+                                                   (subject, predicates,
+                                                    None)))
+
+    def test_subjects(self):
+        store = _store(_tests_common.fixture_rdb())
+        subjects = sorted(set(s for s, _, _ in _triples(store))) \
+                   + [_rdf.URIRef(_BASE_IRI + 'emp/id=9')]
+        for predicate in (None, _rdf.RDF.type,
+                          _rdf.URIRef(_BASE_IRI + 'emp#ref-boss_id'),
+                          _rdf.URIRef(_BASE_IRI + 'task#ref-pa;pb'),
+                          _rdf.URIRef(_BASE_IRI + 'tag#a')):
+            self.assertEqual(_choices_triples(store,
+                                              (subjects, predicate, None)),
+                             _alternatives_triples(store,
+                                                   (subjects, predicate,
+                                                    None)))
+
+
+_BASE_IRI = 'http://example.com/db/'
+
+
+def _alternatives_triples(store, pattern):
+    choices_index, choices = \
+        next((i, choices) for i, choices in enumerate(pattern)
+             if isinstance(choices, list))
+    triples = set()
+    for choice in choices:
+        choice_pattern = list(pattern)
+        choice_pattern[choices_index] = choice
+        triples.update(_triples(store, tuple(choice_pattern)))
+    return triples
+
+
+def _choices_triples(store, pattern):
+    return set(triple for triple, _ in store.triples_choices(pattern))
+
+
+def _dept_rdb():
+    return _rdb('CREATE TABLE dept (id INTEGER PRIMARY KEY, name TEXT)',
+                "INSERT INTO dept VALUES (1, 'a'), (2, 'b')")
+
+
+def _emp_rdb():
+    return _rdb('CREATE TABLE dept (id INTEGER PRIMARY KEY, name TEXT)',
+                'CREATE TABLE emp (id INTEGER PRIMARY KEY,'
+                 ' name TEXT NOT NULL, dept_id INTEGER REFERENCES dept (id))',
+                "INSERT INTO dept VALUES (1, 'a'), (2, 'b')",
+                "INSERT INTO emp VALUES (1, 'x', 1), (2, 'y', 2)")
+
+
+def _emp_rdb_rows(rdb):
+    return tuple(rdb.execute('SELECT * FROM {} ORDER BY id'.format(tablename))
+                    .fetchall()
+                 for tablename in ('dept', 'emp'))
+
+
+def _rdb(*sqls):
+    rdb = _sqla.create_engine('sqlite://')
+    for sql in sqls:
+        rdb.execute(sql)
+    return rdb
+
+
+def _run_threads(funcs):
+
+    """Call functions in threads at once, and raise the first error"""
+
+    errors = []
+
+    def run(func):
+        try:
+            func()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [_threading.Thread(target=run, args=(func,)) for func in funcs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _store(rdb, **kwargs):
+    store = _stores.DirectMapping(base_iri=_BASE_IRI)
+    store.open(rdb, **kwargs)
+    return store
+
+
+def _table_rows(rdb, page_size=None):
+    store = _store(rdb, keyset_page_size=page_size)
+    table_iri, = store.orm_classes.keys()
+    query = store._orm.query(*store._orm_mappers[table_iri].columns)
+    return sorted(tuple(row) for row in store._table_rows(table_iri, query))
+
+
+def _triples(store, pattern=(None, None, None)):
+    return sorted(triple for triple, _ in store.triples(pattern))
+
+
+if __name__ == '__main__':
+    _unittest.main()
@@ -117,7 +117,7 @@ TROVE_CLASSIFIERS = \
 SETUP_DEPS = ()
 
 INSTALL_DEPS = ('rdflib', 'spruce-collections', 'spruce-datetime',
-                'spruce-iri', 'spruce-types', 'sqlalchemy >=0.9.1')
+                'spruce-iri', 'spruce-types', 'sqlalchemy >=1.0')
 
 EXTRAS_DEPS = {}
 
@@ -137,7 +137,7 @@ TESTS_PKG_NAME = '.'.join((ROOT_PKG_NAME, 'tests'))
 
 # entry points ----------------------------------------------------------------
 
-STD_SCRIPTS_PKG_COMMANDS = {}
+STD_SCRIPTS_PKG_COMMANDS = {'rdb2rdf-dump': 'dump', 'rdb2rdf-load': 'load'}
 
 COMMANDS = {cmd: '{}.{}:{}'.format(SCRIPTS_PKG_NAME,
                                    script if isinstance(script, basestring)
@@ -148,6 +148,8 @@ COMMANDS = {cmd: '{}.{}:{}'.format(SCRIPTS_PKG_NAME,
 
 ENTRY_POINTS = {'console_scripts': ['{} = {}'.format(name, funcpath)
                                     for name, funcpath in COMMANDS.items()],
+                'rdf.plugins.sparqleval':
+                    ('rdb2rdf_dm = rdb2rdf.sparql:evaluate',),
                 'rdf.plugins.store':
                     ('rdb2rdf_dm = rdb2rdf.stores:DirectMapping',),
                 }